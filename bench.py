@@ -0,0 +1,125 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bmp import ingest
+from bmp.bmp import PeerType
+from bmp.checks import CHECKS
+from bmp.engine import Pipeline
+from bmp.synth import AFI_IPV4, AFI_IPV6, SynthConfig, write_pcap
+
+# throughput benchmark over synthetic captures
+# for each configuration: generate the capture, then measure the ingest rate, the rate of each check alone
+# and the time and peak memory of a full run (ingest and all checks in one pass, like the tests)
+# the full run is done in a fresh process so its peak resident memory is its own
+# results are printed and appended as json lines to the output file so they can be tracked across versions
+
+DEFAULT_OUTPUT = "bench_output.txt"
+BMP_PORT = 12345
+
+CONFIGS: dict[str, SynthConfig] = {
+    "small": SynthConfig(peers={PeerType.GlobalInstance: 2}, prefixes={AFI_IPV4: 1000}),
+    "table": SynthConfig(peers={PeerType.GlobalInstance: 2}, prefixes={AFI_IPV4: 50000, AFI_IPV6: 10000}),
+    "packed": SynthConfig(peers={PeerType.GlobalInstance: 2}, prefixes={AFI_IPV4: 50000, AFI_IPV6: 10000},
+                          nlris_per_update=100),
+    # UPDATEs carrying 1000 prefixes, announced then flapped
+    "wide": SynthConfig(peers={PeerType.GlobalInstance: 2}, prefixes={AFI_IPV4: 100000, AFI_IPV6: 20000},
+                        nlris_per_update=1000, churn=0.1, churn_rounds=2),
+    "peers": SynthConfig(routers=4, peers={PeerType.GlobalInstance: 8, PeerType.RDInstance: 8,
+                                           PeerType.LocalInstance: 4, PeerType.LocRibInstance: 4},
+                         prefixes={AFI_IPV4: 1000, AFI_IPV6: 500}, stats_interval=100),
+    "churn": SynthConfig(peers={PeerType.GlobalInstance: 2, PeerType.RDInstance: 2}, prefixes={AFI_IPV4: 10000},
+                         churn=0.1, churn_rounds=10, stats_interval=100),
+}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(name: str, config: SynthConfig, directory: str, args) -> dict:
+    path = os.path.join(directory, f"{name}.pcap")
+    start = time.perf_counter()
+    messages = write_pcap(path, config, port=BMP_PORT)
+    result = {"config": name, "messages": messages, "pcap_bytes": os.path.getsize(path),
+              "generate_seconds": time.perf_counter() - start}
+
+    # ingest alone
+    start, cpu = time.perf_counter(), time.process_time()
+    packets = list(ingest.open_capture(args.backend, path, port=BMP_PORT, jobs=args.jobs))
+    seconds = time.perf_counter() - start
+    prefixes = sum(len(packet.nlri) for packet in packets if packet.nlri is not None)
+    result["prefixes"] = prefixes
+    result["ingest"] = {"seconds": seconds, "cpu_seconds": time.process_time() - cpu,
+                        "messages_per_second": len(packets) / seconds, "prefixes_per_second": prefixes / seconds}
+
+    # each check alone over the ingested packets, its rate is over the whole capture
+    result["checks"] = dict()
+    with open(os.devnull, "w") as devnull:
+        for check in CHECKS:
+            start = time.perf_counter()
+            Pipeline([check(output=devnull)]).run(packets)
+            seconds = time.perf_counter() - start
+            result["checks"][check.name] = {"seconds": seconds, "messages_per_second": len(packets) / seconds}
+    del packets
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        result["run"] = pool.submit(_full_run, path, args.backend, args.jobs).result()
+    return result
+
+
+# full streaming run, like the tests
+def _full_run(path: str, backend: str, jobs: int) -> dict:
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        Pipeline([check(output=devnull) for check in CHECKS]).run(
+            ingest.open_capture(backend, path, port=BMP_PORT, jobs=jobs))
+    return {"seconds": time.perf_counter() - start, "peak_rss_bytes": _peak_rss()}
+
+
+# ru_maxrss survives exec on Linux and would include the parent's peak, the high water mark of the process is not
+def _peak_rss() -> int:
+    try:
+        with open("/proc/self/status") as status:
+            return next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('configs', nargs='*',
+                        help=f"configurations to run, all of them by default ({', '.join(CONFIGS)})")
+    parser.add_argument('-o', '--output', type=str, default=DEFAULT_OUTPUT, help="json lines results file")
+    parser.add_argument('-b', '--backend', type=str, choices=list(ingest.BACKENDS), default="native",
+                        help="capture decoder")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="decoding processes (native backend only)")
+    parser.add_argument('-k', '--keep', type=str, help="directory to keep the generated captures in")
+    args = parser.parse_args()
+    if unknown := [name for name in args.configs if name not in CONFIGS]:
+        parser.error(f"unknown configurations {unknown}, expected some of {list(CONFIGS)}")
+
+    meta = {"revision": _git_revision(), "python": platform.python_version(), "backend": args.backend,
+            "jobs": args.jobs, "time": time.time()}
+    with tempfile.TemporaryDirectory() as directory, open(args.output, "a") as output:
+        for name in args.configs or CONFIGS:
+            result = meta | run(name, CONFIGS[name], args.keep or directory, args)
+            print(f"{name}: {result['messages']} messages, {result['prefixes']} prefixes, "
+                  f"ingest {result['ingest']['messages_per_second']:.0f} msg/s "
+                  f"{result['ingest']['prefixes_per_second']:.0f} prefixes/s, "
+                  f"run {result['run']['seconds']:.2f}s, peak rss {result['run']['peak_rss_bytes'] >> 20} MB, "
+                  + ", ".join(f"{check} {rate['messages_per_second']:.0f} msg/s"
+                              for check, rate in result["checks"].items()))
+            output.write(json.dumps(result) + "\n")
+            output.flush()
@@ -1,9 +1,17 @@
-import operator
+import socket
+import sys
+from array import array
 from dataclasses import dataclass
 from enum import Enum
+from itertools import repeat
 from types import DynamicClassAttribute
+from typing import Any, Callable, Iterator, Optional, Union, TYPE_CHECKING
 
-from pyshark.packet.layers.xml_layer import XmlLayer
+from bmp.flows import Flow
+
+# pyshark is only needed by the tshark backend
+if TYPE_CHECKING:
+    from pyshark.packet.layers.xml_layer import XmlLayer
 
 
 class IntEnum(Enum):
@@ -20,6 +28,10 @@ class IntEnum(Enum):
     def __hash__(self):
         return hash((self.name, self.value))
 
+    # pickled by name, members are looked up instead of rebuilt from their value
+    def __reduce_ex__(self, protocol):
+        return getattr, (self.__class__, self.name)
+
 
 class MessageType(IntEnum):
     RouteMonitoring = 0
@@ -28,6 +40,7 @@ class MessageType(IntEnum):
     PeerUp = 3
     Initiation = 4
     Termination = 5
+    RouteMirroring = 6
 
 
 class PeerType(IntEnum):
@@ -38,12 +51,12 @@ class PeerType(IntEnum):
 
 
 class StatisticsType(Enum):
-    Gauge = lambda p, n: True
-    Counter = lambda p, n: p <= n
+    Gauge = "gauge"
+    Counter = "counter"
 
-    @DynamicClassAttribute
-    def check(self):
-        return self.value
+    # whether a statistic can go from previous to next, gauges can take any value and counters never decrease
+    def check(self, previous: int, next: int) -> bool:
+        return self == StatisticsType.Gauge or previous <= next
 
 
 class Statistics(IntEnum):
@@ -98,30 +111,105 @@ class Statistics(IntEnum):
         return self._value_[2]
 
 
-class BmpPacket:
-    def __init__(self, capture_sequence: int, frame: int, frame_sequence: int, frame_bmp_count: int, packet: XmlLayer):
+_STATISTICS_BY_IANA: dict[int, Statistics] = {stat.iana: stat for stat in Statistics}
 
-        self.capture_sequence = capture_sequence
-        self.frame = frame
-        self.frame_sequence = frame_sequence
-        self.frame_bmp_count = frame_bmp_count
-        self.packet = packet
-        self.type = MessageType(int(self.packet.type))
+AFI_IPV4 = 1
+AFI_IPV6 = 2
+SAFI_UNICAST = 1
+SAFI_MULTICAST = 2
+SAFI_MPLS_LABEL = 4
+SAFI_MPLS_VPN = 128
+
+
+# layer made of plain field values, mimics XmlLayer for layers not produced by pyshark
+# fields maps a sanitized field name (e.g. peer_type) to the list of its values in decoding order
+# the prefixes of a BGP UPDATE are not fields, they are decoded in a batch (see NlriBatch)
+class FieldLayer:
+    __slots__ = ("fields", "nlri")
+
+    def __init__(self, fields: dict[str, list[str]], nlri: Optional["NlriBatch"] = None):
+        self.fields = fields
+        self.nlri = nlri
 
-    # transparent wrapper to avoid using packet.packet.attr
+    @property
+    def field_names(self) -> list[str]:
+        return list(self.fields)
+
+    def get_field_values(self, name: str) -> list[str]:
+        return self.fields.get(name, [])
+
+    # first value of a field, like XmlLayer does
     def __getattr__(self, item):
-        if item not in self.__dict__:
-            try:
-                return operator.attrgetter(item)(self.packet)
-            except AttributeError:
-                return None
-        else:
-            return getattr(self, item)
+        if item.startswith("__") or item in FieldLayer.__slots__:
+            raise AttributeError(item)
+        try:
+            return self.fields[item][0]
+        except KeyError:
+            raise AttributeError(item)
+
+
+def layer_fields(layer: Union["XmlLayer", FieldLayer]) -> dict[str, list[str]]:
+    if isinstance(layer, FieldLayer):
+        return layer.fields
+    # pyshark XmlLayer, keep the default value of every occurrence of each field
+    return {
+        sys.intern(layer._sanitize_field_name(name)): [field.get_default_value() for field in container.all_fields]
+        for name, container in layer._all_fields.items()
+    }
+
+
+def _int(value: str) -> int:
+    return int(value, 16) if value.startswith("0x") else int(value)
+
+
+def _bool(value: str) -> bool:
+    return value == "True" or (value != "False" and _int(value) != 0)
+
+
+# getter of the first value found among some source fields, None if the message has none of them
+def _first(*sources: str, convert: Callable[[str], Any] = str) -> Callable[[dict[str, list[str]]], Any]:
+    def _get(fields: dict[str, list[str]]):
+        for source in sources:
+            if values := fields.get(source):
+                return convert(values[0])
+        return None
+
+    return _get
 
-    # Print location of the packet to find easily in Wireshark
-    # F = Frame, P = Packet
-    def location_str(self) -> str:
-        return f"@ (F{self.frame + 1}:P{self.frame_sequence + 1}/{self.frame_bmp_count})"
+
+def _peer_timestamp(fields: dict[str, list[str]]) -> Optional[float]:
+    if (sec := fields.get("peer_timestamp_sec")) is None:
+        return None
+    return int(sec[0]) + int((fields.get("peer_timestamp_msec") or ["0"])[0]) / 1e6
+
+
+_PER_AFI_STATISTICS = (9, 10, 16, 17)
+
+
+# (statistic, afi, safi, value) of each known statistic of a report, afi and safi are None for global statistics
+def _stats(fields: dict[str, list[str]]) -> Optional[tuple[tuple[Statistics, Optional[int], Optional[int], int], ...]]:
+    if (types := fields.get("stats_type")) is None:
+        return None
+    stats = list()
+    # the values of a field are consumed in order, a field may appear several times in the same report
+    cursors: dict[str, int] = dict()
+
+    def _next(name: str) -> Optional[str]:
+        index = cursors.get(name, 0)
+        cursors[name] = index + 1
+        values = fields.get(name) or ()
+        return values[index] if index < len(values) else None
+
+    for stat_type in types:
+        stat = _STATISTICS_BY_IANA.get(int(stat_type))
+        if stat is None:
+            continue
+        afi, safi = (_next("stats_data_afi"), _next("stats_data_safi")) if stat.iana in _PER_AFI_STATISTICS \
+            else (None, None)
+        value = _next(stat.value)
+        if value is not None and value.isdigit():
+            stats.append((stat, afi and int(afi), safi and int(safi), int(value)))
+    return tuple(stats)
 
 
 class BgpPduType(IntEnum):
@@ -130,6 +218,9 @@ class BgpPduType(IntEnum):
     Update = 1
 
 
+_PDU_TYPES: dict[int, BgpPduType] = {pdu_type.value: pdu_type for pdu_type in BgpPduType}
+
+
 @dataclass()
 class Nlri:
     prefix: str
@@ -137,82 +228,290 @@ class Nlri:
     prefix_id: int
     prefix_rd: str
 
+
+# every prefix of a BGP UPDATE, withdrawn routes, NLRI, MP_REACH and MP_UNREACH, in PDU order, stored column wise
+# an UPDATE without any prefix is an End-of-RIB marker
+class NlriBatch:
+    __slots__ = ("pdu_types", "afis", "safis", "lengths", "path_ids", "addresses", "rds", "labels", "eor")
+
+    # addresses are stored left aligned in fixed size slots, IPv4 ones use the first 4 bytes
+    ADDRESS_SIZE = 16
+
+    def __init__(self):
+        self.pdu_types = array("b")
+        self.afis = array("H")
+        self.safis = array("B")
+        self.lengths = array("B")
+        self.path_ids = array("L")
+        self.addresses = bytearray()
+        # route distinguisher and label stack of each prefix, None while no prefix of the batch has one
+        self.rds: Optional[list[Optional[str]]] = None
+        self.labels: Optional[list[Optional[str]]] = None
+        # set for End-of-RIB markers, an UPDATE without prefixes is not one when its prefixes were not decoded
+        # (AFI/SAFI not supported or NLRI that does not parse)
+        self.eor = False
+
+    # address holds the significant bytes of the prefix
+    def add(self, pdu_type: int, afi: int, safi: int, length: int, path_id: int, address: bytes,
+            rd: Optional[str] = None, labels: Optional[str] = None) -> None:
+        count = len(self.lengths)
+        self.pdu_types.append(pdu_type)
+        self.afis.append(afi)
+        self.safis.append(safi)
+        self.lengths.append(length)
+        self.path_ids.append(path_id)
+        self.addresses += address
+        self.addresses += bytes(self.ADDRESS_SIZE - len(address))
+        if rd is not None and self.rds is None:
+            self.rds = [None] * count
+        if self.rds is not None:
+            self.rds.append(rd)
+        if labels is not None and self.labels is None:
+            self.labels = [None] * count
+        if self.labels is not None:
+            self.labels.append(labels)
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    # End-of-RIB (RFC 4724): an UPDATE without withdrawn routes, path attributes or NLRI, or whose only path
+    # attribute is an MP_UNREACH_NLRI holding only its AFI and SAFI
+    def mark_eor(self, fields: dict[str, list[str]]) -> None:
+        type_codes = fields.get("bgp_update_path_attribute_type_code", ())
+        self.eor = not len(self) and fields.get("bgp_update_withdrawn_routes_length", ["0"]) == ["0"] and \
+            (fields.get("bgp_update_path_attributes_length") == ["0"] or
+             (type_codes == ["15"] and fields.get("bgp_update_path_attribute_length") == ["3"]))
+
+    @property
+    def withdrawn_count(self) -> int:
+        return self.pdu_types.count(BgpPduType.Withdraw.value)
+
+    @property
+    def announced_count(self) -> int:
+        return self.pdu_types.count(BgpPduType.Update.value)
+
+    def prefix(self, index: int) -> str:
+        start = index * self.ADDRESS_SIZE
+        if self.afis[index] == AFI_IPV4:
+            return socket.inet_ntop(socket.AF_INET, self.addresses[start:start + 4])
+        return socket.inet_ntop(socket.AF_INET6, self.addresses[start:start + self.ADDRESS_SIZE])
+
+    def rd(self, index: int) -> Optional[str]:
+        return self.rds[index] if self.rds is not None else None
+
+    def nlri(self, index: int) -> Nlri:
+        return Nlri(prefix=self.prefix(index), prefix_len=self.lengths[index], prefix_id=self.path_ids[index],
+                    prefix_rd=self.rd(index))
+
+    # (pdu type, prefix, prefix length, path id, rd) of each prefix
+    def __iter__(self) -> Iterator[tuple[BgpPduType, str, int, int, Optional[str]]]:
+        rds = self.rds or repeat(None)
+        for index, pdu_type, length, path_id, rd in zip(range(len(self)), self.pdu_types, self.lengths,
+                                                        self.path_ids, rds):
+            yield _PDU_TYPES[pdu_type], self.prefix(index), length, path_id, rd
+
+    # batch of the prefix fields of a layer decoded by tshark
+    # the prefix lengths, path ids and RDs are flat lists across all prefix fields, they are matched to the prefixes
+    # in the order tshark decodes them: withdrawn routes, path attributes then NLRI
     @classmethod
-    def from_packet(cls, packet: BmpPacket):
-        withdraw_len: int = int(packet.bgp_update_withdrawn_routes_length)
-        update_len: int = int(packet.bgp_update_path_attributes_length)
-
-        # unsupported mixed packet
-        if withdraw_len != 0 and update_len != 0:
-            raise ValueError("Mixed update and withdraw in BGP PDU not supported!")
-
-        # packet is a EoR
-        if withdraw_len == 0 and update_len == 0:
-            return Nlri(prefix="EoR", prefix_len=0, prefix_rd="", prefix_id=0), BgpPduType.EoR
-
-        # packet is a withdraw
-        elif withdraw_len > 0 and update_len == 0:
-
-            return Nlri(
-                prefix=packet.bgp_withdrawn_prefix,
-                prefix_len=int(packet.bgp_prefix_length),
-                prefix_id=int(packet.bgp_nlri_path_id),
-                prefix_rd=packet.bgp_rd,
-            ), BgpPduType.Withdraw
-
-        # packet is an update
-        elif withdraw_len == 0 and update_len > 0:
-            if int(type_code := packet.bgp_update_path_attribute_type_code) == 1:
-                return Nlri(
-                    prefix=packet.bgp_nlri_prefix,
-                    prefix_len=int(packet.bgp_prefix_length),
-                    prefix_rd=packet.bgp_rd,
-                    prefix_id=int(packet.bgp_nlri_path_id or 0),
-                ), BgpPduType.Update
-
-            elif int(type_code) == 14:  # MP_REACH
-                prefix = packet.bgp_nlri_prefix or \
-                         packet.bgp_mp_reach_nlri_ipv6_prefix or \
-                         packet.bgp_mp_reach_nlri_ipv4_prefix
-
-                prefix_len = int(packet.bgp_prefix_length or prefix.split("/")[-1])
-                prefix_id = int(packet.bgp_nlri_path_id or 0)
-                prefix_rd = packet.bgp_rd or ""
-
-                return Nlri(
-                    prefix=prefix,
-                    prefix_len=prefix_len,
-                    prefix_id=prefix_id,
-                    prefix_rd=prefix_rd
-                ), BgpPduType.Update
-
-            elif int(type_code) == 15:  # MP_UNREACH
-                prefix = packet.bgp_nlri_prefix or \
-                         packet.bgp_mp_unreach_nlri_ipv6_prefix or \
-                         packet.bgp_mp_unreach_nlri_ipv4_prefix
-
-                if prefix is None:  # EoR
-                    return Nlri(prefix="EoR", prefix_len=0, prefix_id=0, prefix_rd=""), BgpPduType.EoR
-
-                return Nlri(
-                    prefix=prefix.split("/")[0],
-                    prefix_len=int(packet.bgp_prefix_length or prefix.split("/")[-1]),
-                    prefix_rd=packet.bgp_rd,
-                    prefix_id=int(packet.bgp_nlri_path_id or 0),
-                ), BgpPduType.Withdraw
-            else:
-                raise ValueError("Type code not supported!")
-        else:
-            raise ValueError("Should be unreachable!")
+    def from_fields(cls, fields: dict[str, list[str]]) -> Optional["NlriBatch"]:
+        if "bgp_update_path_attributes_length" not in fields:
+            return None
+        type_codes = [int(code) for code in fields.get("bgp_update_path_attribute_type_code", ())]
+        mp_afis = fields.get("bgp_update_path_attribute_afi", ())
+        mp_safis = fields.get("bgp_update_path_attribute_safi", ())
+        # some tshark versions decode MP prefixes as NLRI prefixes, they are withdrawn if there is no ORIGIN
+        nlri_type = BgpPduType.Withdraw if 15 in type_codes and 1 not in type_codes else BgpPduType.Update
+
+        # (prefix field, pdu type, safi) in decoding order
+        sections = [("bgp_withdrawn_prefix", BgpPduType.Withdraw, SAFI_UNICAST)]
+        for index, code in enumerate(code for code in type_codes if code in (14, 15)):
+            safi = int(mp_safis[index]) if index < len(mp_safis) else SAFI_UNICAST
+            afi = int(mp_afis[index]) if index < len(mp_afis) else AFI_IPV4
+            kind = "reach" if code == 14 else "unreach"
+            sections.append((f"bgp_mp_{kind}_nlri_ipv{4 if afi == AFI_IPV4 else 6}_prefix",
+                             BgpPduType.Update if code == 14 else BgpPduType.Withdraw, safi))
+        sections.append(("bgp_nlri_prefix", nlri_type, SAFI_UNICAST))
+
+        entries = [(prefix, pdu_type, safi) for name, pdu_type, safi in sections for prefix in fields.get(name, ())]
+        lengths = fields.get("bgp_prefix_length", ())
+        path_ids = fields.get("bgp_nlri_path_id", ())
+        labeled = [index for index, (_, _, safi) in enumerate(entries) if safi in (SAFI_MPLS_LABEL, SAFI_MPLS_VPN)]
+        vpn = [index for index, (_, _, safi) in enumerate(entries) if safi == SAFI_MPLS_VPN]
+        rds = dict(zip(vpn, fields.get("bgp_rd", ()))) if len(fields.get("bgp_rd", ())) == len(vpn) else dict()
+        labels = dict(zip(labeled, fields.get("bgp_label_stack", ()))) \
+            if len(fields.get("bgp_label_stack", ())) == len(labeled) else dict()
+
+        batch = cls()
+        for index, (prefix, pdu_type, safi) in enumerate(entries):
+            address, _, length = prefix.partition("/")
+            if index < len(lengths):
+                length = lengths[index]
+            afi = AFI_IPV6 if ":" in address else AFI_IPV4
+            raw = socket.inet_pton(socket.AF_INET6 if afi == AFI_IPV6 else socket.AF_INET, address)
+            path_id = int(path_ids[index]) if len(path_ids) == len(entries) else 0
+            batch.add(pdu_type.value, afi, safi, int(length or 0), path_id, raw, rds.get(index), labels.get(index))
+        batch.mark_eor(fields)
+        return batch
+
+
+# fields projected from the decoded layer into BmpPacket attributes, typed and converted once at ingest
+# an attribute is None when the message does not carry it
+PACKET_SCHEMA: tuple[tuple[str, Callable[[dict[str, list[str]]], Any]], ...] = (
+    # common header
+    ("type", _first("type", convert=lambda value: MessageType(int(value)))),
+    ("version", _first("version", convert=int)),
+    ("length", _first("length", convert=int)),
+    # per-peer header
+    ("peer_header", _first("peer_header")),
+    ("peer_type", _first("peer_type", convert=int)),
+    ("peer_flags", _first("peer_flags", convert=_int)),
+    ("peer_flags_ipv6", _first("peer_flags_ipv6", convert=_bool)),
+    ("peer_flags_post_policy", _first("peer_flags_post_policy", convert=_bool)),
+    ("peer_flags_as_path", _first("peer_flags_as_path", convert=_bool)),
+    ("peer_flags_adj_rib_out", _first("peer_flags_adj_rib_out", convert=_bool)),
+    ("peer_flags_loc_rib", _first("peer_flags_loc_rib", convert=_bool)),
+    # reserved bits of the flags, whatever the peer type
+    ("peer_flags_reserved", _first("peer_flags_reserved", "peer_flags_loc_rib_res", convert=_int)),
+    ("peer_distinguisher", _first("peer_distinguisher")),
+    ("peer_ip", _first("peer_ip_addr", "peer_ipv6_addr")),
+    ("peer_asn", _first("peer_asn", convert=int)),
+    ("peer_bgp_id", _first("peer_id")),
+    ("peer_timestamp", _peer_timestamp),
+    # statistics report
+    ("stats", _stats),
+)
+
+# raw fields kept as strings for the checks that still read them, by message type and field name prefix
+PACKET_RAW_FIELDS: dict[MessageType, tuple[str, ...]] = {
+    MessageType.RouteMonitoring: ("bgp_",),
+    MessageType.PeerUp: ("peer_up_tlv_",),
+}
+# per prefix fields of tshark layers, they are projected into the NLRI batch instead
+NLRI_FIELDS = frozenset(("bgp_withdrawn_prefix", "bgp_nlri_prefix", "bgp_mp_reach_nlri_ipv4_prefix",
+                         "bgp_mp_reach_nlri_ipv6_prefix", "bgp_mp_unreach_nlri_ipv4_prefix",
+                         "bgp_mp_unreach_nlri_ipv6_prefix", "bgp_prefix_length", "bgp_nlri_path_id", "bgp_rd",
+                         "bgp_label_stack"))
+_NO_FIELDS: dict[str, list[str]] = dict()
+
+
+# NLRI batch and raw fields of a route monitoring message
+def project_route_monitoring(fields: dict[str, list[str]], nlri: Optional[NlriBatch] = None) -> \
+        tuple[Optional[NlriBatch], dict[str, list[str]]]:
+    if nlri is None:
+        nlri = NlriBatch.from_fields(fields)
+    prefixes = PACKET_RAW_FIELDS[MessageType.RouteMonitoring]
+    return nlri, {name: field_values for name, field_values in fields.items()
+                  if name.startswith(prefixes) and name not in NLRI_FIELDS}
+
+
+# values of the schema attributes, the NLRI batch of route monitoring messages and the raw fields
+# made of plain values so it is cheap to pickle
+# bgp is False when the BGP PDU of route monitoring messages was not decoded, their NLRI batch and raw fields
+# are then None and decoded by the packet on first access (see BmpPacket)
+def project(fields: dict[str, list[str]], nlri: Optional[NlriBatch] = None, bgp: bool = True) -> tuple:
+    values = tuple(get(fields) for _, get in PACKET_SCHEMA)
+    if values[0] == MessageType.RouteMonitoring:
+        return (*values, *project_route_monitoring(fields, nlri)) if bgp else (*values, None, None)
+    prefixes = PACKET_RAW_FIELDS.get(values[0], ())
+    raw = {name: field_values for name, field_values in fields.items()
+           if name.startswith(prefixes)} if prefixes else _NO_FIELDS
+    return *values, None, raw
+
+
+def project_layer(layer: Union["XmlLayer", FieldLayer], bgp: bool = True) -> tuple:
+    if isinstance(layer, FieldLayer):
+        return project(layer.fields, layer.nlri, bgp=bgp)
+    return project(layer_fields(layer))
+
+
+# attributes set from project()
+_PROJECTED = (*(name for name, _ in PACKET_SCHEMA), "nlri", "fields")
+# slots they are stored in, the NLRI batch and raw fields are behind properties decoding them on first access
+_STORED = (*(name for name, _ in PACKET_SCHEMA), "_nlri", "_fields")
+
+
+# BMP message of a capture
+# only the schema attributes and the raw fields of the message type are kept, the decoded layer is dropped
+# a packet built from its message bytes without its BGP PDU decoded (see project) keeps the bytes and decodes the
+# PDU the first time its NLRI batch or raw fields are read, checks that only read headers never decode it
+class BmpPacket:
+    __slots__ = ("capture_sequence", "frame", "frame_sequence", "frame_bmp_count", "flow", "timestamp", "data",
+                 "peer", *_STORED)
+
+    def __init__(self, capture_sequence: int, frame: int, frame_sequence: int, frame_bmp_count: int,
+                 packet: Union["XmlLayer", FieldLayer] = None, flow: Optional[Flow] = None, timestamp: float = None,
+                 values: tuple = None, data: Optional[bytes] = None):
+
+        self.capture_sequence = capture_sequence
+        self.frame = frame
+        self.frame_sequence = frame_sequence
+        self.frame_bmp_count = frame_bmp_count
+        # TCP session of the message and capture time of its frame, recorded at ingest
+        self.flow = flow
+        self.timestamp = timestamp
+        # bytes of the message, only kept when the BGP PDU is decoded lazily
+        self.data = data
+        # number of the peer in the registry of the pipeline (see bmp/peers.py), set when the packet is fed
+        self.peer: Optional[int] = None
+        # projected values, computed from the layer unless given (e.g. by a decoding worker or the cache)
+        for name, value in zip(_STORED, values if values is not None else project_layer(packet)):
+            setattr(self, name, value)
+
+    # raw fields are None until the BGP PDU of a lazily decoded route monitoring message is decoded
+    def _decode_bgp(self) -> None:
+        # bmp.decoder depends on this module
+        from bmp.decoder import decode_route_monitoring_pdu
+
+        layer = decode_route_monitoring_pdu(self.data)
+        self._nlri, self._fields = project_route_monitoring(layer.fields, layer.nlri)
+
+    @property
+    def nlri(self) -> Optional[NlriBatch]:
+        if self._fields is None:
+            self._decode_bgp()
+        return self._nlri
+
+    @property
+    def fields(self) -> dict[str, list[str]]:
+        if self._fields is None:
+            self._decode_bgp()
+        return self._fields
+
+    @property
+    def values(self) -> tuple:
+        return tuple(getattr(self, name) for name in _PROJECTED)
+
+    @property
+    def field_names(self) -> list[str]:
+        return list(self.fields)
+
+    def get_field_values(self, name: str) -> list[str]:
+        return self.fields.get(name, [])
+
+    # first value of a raw field, None if the message does not have it
+    # the raw fields of route monitoring messages are all bgp_ ones, other names never decode the BGP PDU
+    def __getattr__(self, item):
+        if item.startswith("_") or item == "fields":
+            raise AttributeError(item)
+        fields = self.fields if item.startswith("bgp_") else self._fields
+        values = fields.get(item) if fields is not None else None
+        return values[0] if values else None
+
+    # Print location of the packet to find easily in Wireshark
+    # F = Frame, P = Packet
+    def location_str(self) -> str:
+        return f"@ (F{self.frame + 1}:P{self.frame_sequence + 1}/{self.frame_bmp_count})"
 
 
 class BmpPacketRouteMonitoring(BmpPacket):
     bgp_nlri: Nlri
     bgp_pdu_type: BgpPduType
 
-    def __init__(self, capture_sequence: int, frame: int, frame_sequence: int, frame_bmp_count: int, packet: XmlLayer):
+    def __init__(self, capture_sequence: int, frame: int, frame_sequence: int, frame_bmp_count: int,
+                 packet: Union["XmlLayer", FieldLayer] = None, values: tuple = None):
         super().__init__(capture_sequence=capture_sequence, frame_sequence=frame_sequence, frame=frame,
-                         packet=packet, frame_bmp_count=frame_bmp_count)
+                         packet=packet, frame_bmp_count=frame_bmp_count, values=values)
 
 
 @dataclass(frozen=True, eq=True)
@@ -223,9 +522,7 @@ class PeerId:
 
     @classmethod
     def from_packet(cls, packet: BmpPacket):
-        peer_type = PeerType(int(packet.peer_type))
-        peer_ip = packet.peer_ip_addr if "peer_ip_addr" in packet.field_names else packet.peer_ipv6_addr
-        return PeerId(peer_type=peer_type, peer_ip=peer_ip, peer_rd=packet.peer_distinguisher)
+        return PeerId(peer_type=PeerType(packet.peer_type), peer_ip=packet.peer_ip, peer_rd=packet.peer_distinguisher)
 
 
 class MonitoringType(IntEnum):
@@ -247,7 +544,6 @@ class MonitoringType(IntEnum):
 
     @classmethod
     def from_packet(cls, packet: BmpPacket):
-        peer_type = PeerType(int(packet.peer_type))
-        return MonitoringType.from_flags(peer_type=peer_type,
-                                         out=bool(int(packet.peer_flags_adj_rib_out or "0")),
-                                         post=bool(int(packet.peer_flags_post_policy or "0")))
+        return MonitoringType.from_flags(peer_type=PeerType(packet.peer_type),
+                                         out=bool(packet.peer_flags_adj_rib_out),
+                                         post=bool(packet.peer_flags_post_policy))
@@ -0,0 +1,206 @@
+import gc
+import hashlib
+import json
+import os
+import pickle
+import struct
+import zlib
+from typing import Iterator, Optional
+
+from bmp.bmp import BmpPacket
+from bmp.flows import FlowTable
+
+# on-disk cache of decoded captures
+# a cache file holds the decoded BMP packets of one capture for one backend configuration,
+# it is keyed by the capture content hash and the backend signature (tshark version, decode as, arguments)
+#
+# file layout: magic, header length (u32), json header, then zlib compressed pickled batches of records
+# each batch prefixed by its compressed length (u32), a zero length ends the file
+
+CACHE_MAGIC = b"BMPCACHE"
+# bump when the record layout or the decoders change in a way that invalidates existing caches
+CACHE_VERSION = 5
+CACHE_SUFFIX = ".bmpcache"
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "bmp-testing")
+DEFAULT_CACHE_SIZE = 4 << 30
+
+BATCH_SIZE = 4096
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while block := file.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def to_record(packet: BmpPacket) -> tuple:
+    flow = packet.flow
+    return (packet.capture_sequence, packet.frame, packet.frame_sequence, packet.frame_bmp_count, packet.timestamp,
+            (flow.stream, flow.src, flow.dst, flow.sport, flow.dport), packet.values)
+
+
+# flows are rebuilt in the flow table of the reader
+def from_record(record: tuple, flows: FlowTable) -> BmpPacket:
+    capture_sequence, frame, frame_sequence, frame_bmp_count, timestamp, flow, values = record
+    return BmpPacket(capture_sequence=capture_sequence, frame=frame, frame_sequence=frame_sequence,
+                     frame_bmp_count=frame_bmp_count, values=values,
+                     flow=flows.observe(*flow, timestamp), timestamp=timestamp)
+
+
+class CacheWriter:
+
+    def __init__(self, path: str, header: dict, max_size: int):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.max_size = max_size
+        self.batch: list[tuple] = list()
+        self.size = 0
+        self.file = open(self.tmp_path, "wb")
+        header = json.dumps(header).encode()
+        self._write(CACHE_MAGIC + struct.pack("!I", len(header)) + header)
+
+    def _write(self, data: bytes) -> None:
+        self.size += len(data)
+        self.file.write(data)
+
+    def _flush(self) -> None:
+        if self.batch:
+            data = zlib.compress(pickle.dumps(self.batch, protocol=pickle.HIGHEST_PROTOCOL))
+            self._write(struct.pack("!I", len(data)) + data)
+            self.batch = list()
+
+    # returns False once the cache grew over its size limit, it is then discarded
+    def add(self, packet: BmpPacket) -> bool:
+        self.batch.append(to_record(packet))
+        if len(self.batch) >= BATCH_SIZE:
+            self._flush()
+        if self.size > self.max_size:
+            self.abort()
+            return False
+        return True
+
+    def commit(self) -> None:
+        self._flush()
+        self._write(struct.pack("!I", 0))
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def read_cache(path: str, flows: FlowTable) -> Iterator[BmpPacket]:
+    with open(path, "rb") as file:
+        if file.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+            raise ValueError(f"{path} is not a bmp cache file")
+        (length,) = struct.unpack("!I", file.read(4))
+        file.seek(length, os.SEEK_CUR)
+        while (length := struct.unpack("!I", file.read(4))[0]) != 0:
+            # a batch is only made of acyclic containers, no need for the collector to scan them while loading
+            gc.disable()
+            try:
+                records = pickle.loads(zlib.decompress(file.read(length)))
+            finally:
+                gc.enable()
+            for record in records:
+                yield from_record(record, flows)
+
+
+class Cache:
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_size: int = DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    # file name: capture name, capture path hash, signature hash, content hash
+    # entries for the same capture and signature share a prefix, it is used to find their stale versions
+    def _prefix(self, pcap_path: str, signature: dict) -> str:
+        path_hash = hashlib.sha256(os.path.abspath(pcap_path).encode()).hexdigest()[:8]
+        signature = json.dumps({"cache_version": CACHE_VERSION, **signature}, sort_keys=True)
+        return f"{os.path.basename(pcap_path)}.{path_hash}.{hashlib.sha256(signature.encode()).hexdigest()[:8]}."
+
+    def key(self, pcap_path: str, signature: dict) -> str:
+        return self._prefix(pcap_path, signature) + file_digest(pcap_path)[:32]
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def lookup(self, key: str) -> Optional[str]:
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        # mark as recently used for eviction
+        os.utime(path)
+        return path
+
+    def writer(self, pcap_path: str, key: str, signature: dict) -> CacheWriter:
+        os.makedirs(self.directory, exist_ok=True)
+        header = {"cache_version": CACHE_VERSION, "key": key, "pcap": os.path.abspath(pcap_path), **signature}
+        return CacheWriter(self.path(key), header=header, max_size=self.max_size)
+
+    # remove the other entries of a capture with the same signature, they were built from older content
+    def invalidate(self, pcap_path: str, signature: dict, keep: str) -> None:
+        prefix = self._prefix(pcap_path, signature)
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(CACHE_SUFFIX) and name != keep + CACHE_SUFFIX:
+                os.remove(os.path.join(self.directory, name))
+
+    # remove least recently used entries until the cache fits in its size limit
+    def evict(self) -> None:
+        entries = list()
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_SUFFIX):
+                stat = os.stat(path := os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.remove(path)
+            total -= size
+
+
+# wraps a capture backend, reads the packets from the cache or stores them while they are decoded
+class CachedCapture:
+
+    def __init__(self, capture, cache: Cache):
+        self.capture = capture
+        self.cache = cache
+        self.signature = capture.signature()
+        # the packets depend on the whole filter, not only on the part a backend pushes down
+        if (packet_filter := capture.packet_filter) is not None:
+            self.signature["filter"] = packet_filter.to_dict()
+        self.key = cache.key(capture.path, self.signature)
+        self.hit = cache.lookup(self.key)
+        self.flows = FlowTable() if self.hit is not None else capture.flows
+
+    def describe(self) -> str:
+        if self.hit is not None:
+            return f"{self.capture.describe()} from cache {self.hit}"
+        return f"{self.capture.describe()}, caching to {self.cache.path(self.key)}"
+
+    def __iter__(self) -> Iterator[BmpPacket]:
+        if self.hit is not None:
+            yield from read_cache(self.hit, self.flows)
+            return
+
+        writer = self.cache.writer(self.capture.path, self.key, self.signature)
+        caching = True
+        try:
+            for packet in self.capture:
+                caching = caching and writer.add(packet)
+                yield packet
+        except BaseException:
+            writer.abort()
+            raise
+
+        if caching:
+            writer.commit()
+            self.cache.invalidate(self.capture.path, self.signature, keep=self.key)
+            self.cache.evict()
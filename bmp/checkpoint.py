@@ -0,0 +1,92 @@
+import json
+import os
+import pickle
+import struct
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator
+
+from bmp.bmp import BmpPacket
+from bmp.engine import Check, Pipeline
+from bmp.pcap import TcpReassembly
+from bmp.peers import PeerRegistry
+
+# checkpoint of the check state after a run, loaded before the run over the next capture of a rotation
+# (collectors writing rolling pcaps whose BMP sessions go on from one file to the next), so that only the new
+# capture is read instead of all of them again
+# it holds the peer registry, whose numbers key the per-peer state, and the checkpointed attributes of each check
+# (Check.checkpointed): peer states, statistics history, RIBs and route history, version per session, VRF names
+# it also holds the TCP streams left open at the end of the capture with their buffered bytes, the next capture is
+# reassembled from there so a message split across the two captures is not lost (native backend only)
+# messages of a resumed run are numbered after those of the previous captures, locations keep the frame numbers of
+# their own capture
+#
+# file layout: magic, header length (u32), json header, then the zlib compressed pickled state
+
+CHECKPOINT_MAGIC = b"BMPCHKPT"
+# bump when the checkpointed state of a check changes
+CHECKPOINT_VERSION = 6
+
+
+@dataclass
+class Checkpoint:
+    # messages of the previous captures, the next one is numbered from there
+    count: int = 0
+    # captures checked so far, oldest first
+    captures: list[str] = field(default_factory=list)
+    registry: PeerRegistry = field(default_factory=PeerRegistry)
+    # check name -> state
+    states: dict[str, dict[str, Any]] = field(default_factory=dict)
+    # TCP streams the next capture goes on with
+    reassembly: TcpReassembly = field(default_factory=TcpReassembly)
+
+    # restores the checks in place and returns a pipeline feeding them, checks without a saved state start afresh
+    def resume(self, checks: list[Check], **pipeline_args) -> Pipeline:
+        for check in checks:
+            if (state := self.states.get(check.name)) is not None:
+                check.restore(state)
+        return Pipeline(checks, registry=self.registry, **pipeline_args)
+
+    # packets of the next capture numbered after the previous ones
+    def renumber(self, packets: Iterable[BmpPacket]) -> Iterator[BmpPacket]:
+        count = self.count
+        for packet in packets:
+            packet.capture_sequence += count
+            yield packet
+
+
+def load_checkpoint(path: str) -> Checkpoint:
+    with open(path, "rb") as file:
+        if file.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+            raise ValueError(f"{path} is not a checkpoint")
+        header = json.loads(file.read(struct.unpack("!I", file.read(4))[0]))
+        if header.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"{path} is a version {header.get('version')} checkpoint, "
+                             f"expected version {CHECKPOINT_VERSION}")
+        registry, states, reassembly = pickle.loads(zlib.decompress(file.read()))
+    return Checkpoint(count=header["count"], captures=header["captures"], registry=registry, states=states,
+                      reassembly=reassembly)
+
+
+# checkpoint after a run over `capture` resumed from `previous`, written to a temporary file then renamed
+# `reassembly` holds the TCP streams of the capture once read (see NativeCapture)
+def save_checkpoint(path: str, pipeline: Pipeline, capture: str, previous: Checkpoint = None,
+                    reassembly: TcpReassembly = None) -> Checkpoint:
+    previous = previous or Checkpoint()
+    checkpoint = Checkpoint(count=previous.count + pipeline.count, captures=[*previous.captures, capture],
+                            registry=pipeline.registry,
+                            states={check.name: check.state() for check in pipeline.checks if check.error is None},
+                            reassembly=reassembly if reassembly is not None else TcpReassembly())
+    header = json.dumps({"version": CHECKPOINT_VERSION, "count": checkpoint.count, "captures": checkpoint.captures,
+                         "checks": list(checkpoint.states), "peers": len(checkpoint.registry),
+                         "streams": len(checkpoint.reassembly.streams),
+                         "pending_bytes": checkpoint.reassembly.pending_bytes, "time": time.time()}).encode()
+    data = zlib.compress(pickle.dumps((checkpoint.registry, checkpoint.states, checkpoint.reassembly),
+                                      protocol=pickle.HIGHEST_PROTOCOL))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(CHECKPOINT_MAGIC + struct.pack("!I", len(header)) + header)
+        file.write(data)
+    os.replace(tmp_path, path)
+    return checkpoint
@@ -0,0 +1,574 @@
+import json
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from bmp import bmp
+from bmp.bmp import BmpPacket
+from bmp.engine import Check
+from bmp.events import NO_PREFIX, RouteEvents, RouteHistory
+from bmp.report import Verbosity
+from bmp.rib import ANNOUNCED, AttributeSets, PrefixNumbers, PrefixTable, Rib, RouteCounter, path_attributes
+from bmp.spill import SpillConfig
+from bmp.stats import StatsSeries, StatsStore
+
+
+# message types with a per-peer header
+PEER_MESSAGE_TYPES = (bmp.MessageType.RouteMonitoring, bmp.MessageType.StatisticsReport, bmp.MessageType.PeerDown,
+                      bmp.MessageType.PeerUp, bmp.MessageType.RouteMirroring)
+
+
+# ensure that preprocessing didn't duplicate packets
+class IndicesCheck(Check):
+    name = "indices"
+    checkpointed = ("count",)
+
+    def __init__(self, output=None):
+        super().__init__(output)
+        self.count = 0
+        # capture sequences of the packets the check is fed in order, those of the whole capture if None
+        # (e.g. the packets of one BMP session, see bmp/sessions.py)
+        self.expected: Optional[Iterator[int]] = None
+        # only some packets of the capture are fed (see bmp/filters.py), their capture sequences must only increase
+        self.filtered = False
+        self.last = -1
+
+    # capture sequences must go from 0 to the packet count monotonically, incr of 1
+    def consume(self, packet: BmpPacket) -> None:
+        if self.filtered:
+            if packet.capture_sequence <= self.last:
+                self.fail(f"Packet {self.count} {packet.location_str()} has capture sequence "
+                          f"{packet.capture_sequence} after {self.last}")
+            self.last = packet.capture_sequence
+        elif packet.capture_sequence != (self.count if self.expected is None else next(self.expected, None)):
+            self.fail(f"Packet {self.count} {packet.location_str()} has capture sequence {packet.capture_sequence}")
+        self.count += 1
+
+
+# ensure that the bmp version is the same for the same sessions
+class VersionCheck(Check):
+    name = "version"
+    message_types = (bmp.MessageType.Initiation,)
+    checkpointed = ("sessions",)
+
+    def __init__(self, output=None):
+        super().__init__(output)
+        # (src, dst, sport, dport) -> (capture sequence, version) of its first initiation
+        # sessions are told apart by their addresses and ports, which hold across the captures of a rotation
+        self.sessions: dict[tuple[str, str, int, int], (int, int)] = dict()
+
+    def consume(self, packet: BmpPacket) -> None:
+        session_id = packet.flow.tuple
+        bmp_version = packet.version
+        if self.sessions.get(session_id) is None:
+            self.sessions[session_id] = (packet.capture_sequence, bmp_version)
+
+        # if version changed
+        if self.sessions[session_id][1] != bmp_version:
+            self.log(f"Version changed from {self.sessions[session_id][1]} to {bmp_version} on session {packet.flow}")
+            self.fail(f"Version changed on session {packet.flow} {packet.location_str()}")
+
+
+class PeerFlagsCheck(Check):
+    name = "peerflags"
+    message_types = PEER_MESSAGE_TYPES
+
+    def consume(self, packet: BmpPacket) -> None:
+        if packet.peer_header is None:
+            return
+
+        if packet.peer_flags_reserved != 0:
+            self.fail(f"Packet {packet.capture_sequence} {packet.location_str()} has reserved peer flags set")
+
+
+# ensure that statistics counters never decrease
+class StatsCheck(Check):
+    name = "stats"
+    message_types = (bmp.MessageType.StatisticsReport,)
+    # checked report by report against the last values of each peer, which are the only values kept
+    # otherwise the reports are stored as time series and checked all at once when the capture ends
+    online = False
+    checkpointed = ("peers", "store")
+
+    def __init__(self, output=None):
+        super().__init__(output)
+        # last value and location of each (statistic, afi, safi) of each peer number
+        self.peers: dict[
+            int,
+            dict[tuple[bmp.Statistics, int, int], (int, str)]
+        ] = dict()
+        self.store = StatsStore()
+        # reports of the previous captures, their violations were reported by the previous runs
+        self.restored_reports = 0
+
+    def restore(self, state: dict) -> None:
+        super().restore(state)
+        self.restored_reports = len(self.store)
+
+    def _fail(self, stat: bmp.Statistics, peer: int, previous: int, previous_location: str, next: int,
+              location: str) -> None:
+        self.fail(f"Stat {stat.name} of peer {self.registry[peer].peer_id} went from {previous}({previous_location}) "
+                  f"to {next}({location}) which is forbidden by its type {stat.type}")
+
+    def consume(self, packet: BmpPacket) -> None:
+        if not self.online:
+            self.store.add(packet)
+            return
+
+        peer_stats = self.peers.setdefault(packet.peer, dict())
+        location = f"{packet.capture_sequence} {packet.location_str()}"
+        for stat, afi, safi, next in packet.stats:
+            previous = peer_stats.get((stat, afi, safi))
+            if previous is not None and not stat.type.check(previous[0], next):
+                self._fail(stat, packet.peer, previous[0], previous[1], next, location)
+            peer_stats[(stat, afi, safi)] = (next, location)
+
+    def finish(self) -> None:
+        if self.online:
+            return
+        series = StatsSeries(self.store)
+        for (peer, stat, _, _), previous_report, previous, report, next in series.violations():
+            if report < self.restored_reports:
+                continue
+            self._fail(stat, peer, previous, self.store.location(previous_report), next,
+                       self.store.location(report))
+
+        self.log(f"{len(self.store)} statistics reports, {len(series)} values, "
+                 f"{len(self.store.series_keys)} series")
+        for (peer, stat, afi, safi), first, last, change, rate in series.summary():
+            if stat.type == bmp.StatisticsType.Counter and change:
+                self.log(f"{self.registry[peer].peer_id} {stat.name}" +
+                         (f" afi={afi} safi={safi}" if afi is not None else "") +
+                         f": {first} -> {last} ({change:+d}, {rate:.3g}/s)")
+
+
+# statistics check for live feeds
+class OnlineStatsCheck(StatsCheck):
+    online = True
+
+
+# peer of the records of a report (see bmp/report.py)
+def _peer_fields(peer_id: bmp.PeerId) -> dict[str, str]:
+    return {"peer_type": peer_id.peer_type.name, "peer_ip": peer_id.peer_ip, "peer_rd": peer_id.peer_rd}
+
+
+# checks keeping RIBs, in memory or spilled to disk if `spill` is set before they are created (see bmp/spill.py)
+class RibCheck(Check):
+    spill: Optional[SpillConfig] = None
+
+    def __init__(self, output=None):
+        super().__init__(output)
+        self.spill_store = self.spill.store() if self.spill is not None else None
+        # prefixes shared by the RIBs of all the peers
+        self.prefixes = self._new_prefix_table()
+
+    def _new_prefix_table(self) -> PrefixNumbers:
+        return self.spill_store.prefix_table() if self.spill_store is not None else PrefixTable()
+
+    def _new_rib(self, attributes: Optional[AttributeSets] = None) -> Rib:
+        if self.spill_store is not None:
+            return self.spill_store.rib(self.prefixes, attributes)
+        return Rib(self.prefixes, attributes)
+
+
+# compare the route counts reported in statistics with the routes announced over route monitoring
+# routes are counted incrementally per peer and monitoring type, a report is compared with the count at that point
+# of the capture once the RIB was fully sent (End-of-RIB received), counts are reset when the peer goes down
+# only the prefix numbers and a bit per prefix and RIB are kept, not the prefixes themselves or their RIB state
+class RouteCountCheck(RibCheck):
+    name = "route_count"
+    message_types = (bmp.MessageType.RouteMonitoring, bmp.MessageType.StatisticsReport, bmp.MessageType.PeerDown)
+
+    # RIB counted by each route count statistic
+    STATISTICS: dict[bmp.Statistics, bmp.MonitoringType] = {
+        bmp.Statistics.AdjInRouteCount: bmp.MonitoringType.AdjInPre,
+        bmp.Statistics.LocalRibRouteCount: bmp.MonitoringType.LocRib,
+        bmp.Statistics.AdjOutPreRouteCount: bmp.MonitoringType.AdjOutPre,
+        bmp.Statistics.AdjOutPostRouteCount: bmp.MonitoringType.AdjOutPost,
+    }
+    checkpointed = ("prefixes", "ribs", "compared", "skipped")
+
+    def __init__(self, output=None):
+        super().__init__(output)
+        # RIBs of each peer number
+        self.ribs: dict[int, dict[bmp.MonitoringType, RouteCounter]] = dict()
+        self.compared = 0
+        # reports of RIBs that were not monitored or not fully sent yet
+        self.skipped = 0
+
+    def _new_prefix_table(self) -> PrefixNumbers:
+        return self.spill_store.prefix_numbers() if self.spill_store is not None else PrefixNumbers()
+
+    def consume(self, packet: BmpPacket) -> None:
+        peer = packet.peer
+        match packet.type:
+            case bmp.MessageType.RouteMonitoring:
+                if packet.nlri is None:
+                    return
+                ribs = self.ribs.setdefault(peer, dict())
+                mon_type = bmp.MonitoringType.from_packet(packet)
+                if (rib := ribs.get(mon_type)) is None:
+                    rib = ribs[mon_type] = RouteCounter(self.prefixes)
+                rib.apply(packet.nlri)
+
+            case bmp.MessageType.PeerDown:
+                self.ribs.pop(peer, None)
+
+            case bmp.MessageType.StatisticsReport:
+                ribs = self.ribs.get(peer, dict())
+                for stat, _, _, value in packet.stats:
+                    if (mon_type := self.STATISTICS.get(stat)) is None:
+                        continue
+                    if (rib := ribs.get(mon_type)) is None or not rib.eor_count:
+                        self.skipped += 1
+                        continue
+                    self.compared += 1
+                    if value != rib.route_count:
+                        self.fail(f"Stat {stat.name} of peer {self.registry[peer].peer_id} reports {value} routes "
+                                  f"but {rib.route_count} are announced in {mon_type} "
+                                  f"({packet.capture_sequence} {packet.location_str()})")
+
+    def finish(self) -> None:
+        self.log(f"{self.compared} route counts compared, {self.skipped} skipped (RIB not monitored or before its "
+                 f"End-of-RIB)")
+        for peer, ribs in self.ribs.items():
+            for mon_type, rib in ribs.items():
+                self.log(f"{self.registry[peer].peer_id} {mon_type}: {rib.route_count} routes")
+
+
+# summarize peer up/down state and count ignored messages (received before peer up / after peer down)
+class PeerUpCheck(Check):
+    name = "peerup"
+    message_types = PEER_MESSAGE_TYPES
+    checkpointed = ("peers", "vrfs")
+
+    def __init__(self, output=None):
+        super().__init__(output)
+
+        # peer stores
+        # keys are peer numbers of the registry
+        # values are dicts with id (the bmp.PeerId of the peer), type, state, stats etc.
+        self.peers: dict[
+            int,
+            dict[str, any]
+        ] = dict()
+
+        self.vrfs: dict[
+            int,
+            dict[str, any]
+        ] = dict()
+
+        self.log("====== TIMELINE ======")
+
+    # get a peer from one of the local peer stores
+    def _get_peer(self, number: int):
+        if (peer := self.peers.get(number, self.vrfs.get(number))) is not None:
+            return peer
+        peer_id = self.registry[number].peer_id
+        store = self.vrfs if peer_id.peer_type == bmp.PeerType.LocRibInstance else self.peers
+        peer = store[number] = {
+            "id": peer_id,
+            "type": peer_id.peer_type,
+            "type_name": peer_id.peer_type.name,
+            "state": None,
+            "state_msgs": list(),
+            "stats": dict()
+        }
+        return peer
+
+    # increment a stat for a peer, create it if missing
+    @staticmethod
+    def _incr_stat(peer, stat_name: str):
+        peer["stats"][stat_name] = peer["stats"].setdefault(stat_name, 0) + 1
+
+    def consume(self, packet: BmpPacket) -> None:
+
+        # if a state message this is a new peer state
+        packet_type = packet.type
+
+        # ignore messages with no per-peer header
+        if packet.peer_header is None:
+            return
+
+        peer = self._get_peer(packet.peer)
+        peer_id = peer["id"]
+        peer_state = peer["state"]
+
+        # got a peer state message, update peer state
+        if packet_type in [bmp.MessageType.PeerUp, bmp.MessageType.PeerDown]:
+            if peer_state == packet_type:
+                self._incr_stat(peer, f"{packet_type.name}_duplicate")
+                if self.sink is not None:
+                    self.emit("duplicate_state", Verbosity.Detail, **_peer_fields(peer_id),
+                              state=packet_type.name, sequence=packet.capture_sequence,
+                              location=packet.location_str())
+                else:
+                    self.log(f"peer {peer_id} duplicate state {peer_state} {packet.location_str()}")
+            else:
+                peer["state_msgs"].append(packet.capture_sequence)
+                peer["state"] = packet_type
+                self._incr_stat(peer, packet_type.name)
+                if self.sink is not None:
+                    self.emit("state", Verbosity.Detail, **_peer_fields(peer_id),
+                              previous=peer_state.name if peer_state is not None else None, state=packet_type.name,
+                              sequence=packet.capture_sequence, location=packet.location_str())
+                else:
+                    self.log(f"{peer['type_name']} {peer_id} changed state {peer_state} -> {packet_type}")
+
+        # got any other message
+        else:
+            not_up = peer_state != bmp.MessageType.PeerUp
+            self._incr_stat(peer, f"{packet_type.name}_ignored" if not_up else packet_type.name)
+
+    def finish(self) -> None:
+        if self.sink is not None:
+            self.log(f"====== TIMELINE ======\n"
+                     f"timeline and summary streamed to {self.sink.path}")
+            for vrf, store in ((False, self.peers), (True, self.vrfs)):
+                for peer in store.values():
+                    self.emit("peer", Verbosity.Summary, **_peer_fields(peer["id"]), vrf=vrf,
+                              state=peer["state"].name if peer["state"] is not None else None,
+                              state_msgs=peer["state_msgs"], stats=peer["stats"])
+            return
+
+        self.log("====== TIMELINE ======\n"
+                 "====== SUMMARY PRETTY ======")
+
+        def _pretty_print_peer(peer_id: bmp.PeerId, peer_data: dict[str, any]):
+            self.log(f"Peer: Type={peer_id.peer_type} IP={peer_id.peer_ip} RD={peer_id.peer_rd}")
+            self.log(json.dumps(peer_data, default=str, indent=4))
+
+        for peer_data in self.peers.values():
+            _pretty_print_peer(peer_data["id"], peer_data)
+
+        self.log("====== SUMMARY PRETTY ======\n"
+                 "====== SUMMARY RAW ======")
+        self.log({peer["id"]: peer for peer in self.peers.values()})
+        self.log({peer["id"]: peer for peer in self.vrfs.values()})
+        self.log("====== SUMMARY RAW ======")
+
+    @classmethod
+    def summary(cls, records: Iterable[dict[str, Any]]) -> Iterator[str]:
+        yield "====== SUMMARY ======"
+        for record in records:
+            if record["record"] != "peer":
+                continue
+            stats = ", ".join(f"{name}={count}" for name, count in sorted(record["stats"].items()))
+            yield f"{'VRF' if record['vrf'] else 'Peer'}: Type={record['peer_type']} IP={record['peer_ip']} " \
+                  f"RD={record['peer_rd']} state={record['state']} state changes={len(record['state_msgs'])} " \
+                  f"stats: {stats}"
+        yield "====== SUMMARY ======"
+
+
+# ensure that the peer type is never 0 when the peer RD is not zero and vice-versa
+class PeerTypeCheck(Check):
+    name = "peer_type"
+    message_types = PEER_MESSAGE_TYPES
+
+    def consume(self, packet: BmpPacket) -> None:
+        if packet.peer_type is None or packet.peer_distinguisher is None:
+            return
+
+        can_rd = packet.peer_type != bmp.PeerType.GlobalInstance
+        need_rd = packet.peer_type in [bmp.PeerType.RDInstance, bmp.PeerType.LocalInstance]
+        has_rd = packet.peer_distinguisher != "00:00:00:00:00:00:00:00"
+        if (has_rd and not can_rd) or (need_rd and not has_rd):
+            self.log(f"Packet {packet.capture_sequence} {packet.location_str()}"
+                     f"has invalid type / rd combination")
+            self.log(f"Message type: {packet.type}, "
+                     f"peer type: {packet.peer_type}. "
+                     f"out: {packet.peer_flags_adj_rib_out}, "
+                     f"post: {packet.peer_flags_post_policy}")
+            self.fail(f"Packet {packet.capture_sequence} {packet.location_str()} has invalid type / rd combination")
+
+
+# json object written like json.dump(indent=2) does, without building it
+# pairs are (key, value), a value given as an iterator of pairs is written as a nested object
+def _json_object(pairs: Iterable[tuple[str, Any]], level: int = 0) -> Iterator[str]:
+    indent = "\n" + "  " * (level + 1)
+    empty = True
+    yield "{"
+    for key, value in pairs:
+        yield ("" if empty else ",") + indent + json.dumps(key) + ": "
+        empty = False
+        if isinstance(value, Iterator):
+            yield from _json_object(value, level + 1)
+        else:
+            yield json.dumps(value, indent=2, default=str).replace("\n", indent)
+    yield "}" if empty else "\n" + "  " * level + "}"
+
+
+class MonitoringSummaryCheck(RibCheck):
+    name = "monitoring_summary"
+    message_types = (bmp.MessageType.RouteMonitoring,)
+
+    # most unstable prefixes reported
+    TOP_UNSTABLE = 10
+    # a prefix flaps when it is announced again at most this many seconds after being withdrawn
+    FLAP_WINDOW = 60.0
+    checkpointed = ("prefixes", "attributes", "peers", "history")
+
+    def __init__(self, output=None):
+        super().__init__(output)
+        # attribute sets are shared by the RIBs of all the peers, like the prefixes
+        self.attributes = AttributeSets()
+        # RIBs of each peer number
+        self.peers: dict[int, dict[bmp.MonitoringType, Rib]] = dict()
+        # every route event, e.g. to query the RIBs at any point of the capture (see bmp/query.py)
+        self.history = RouteHistory(self.prefixes,
+                                    self.spill_store.event_log() if self.spill_store is not None else None)
+
+    def _get_rib(self, peer: int, mon_type: bmp.MonitoringType) -> Rib:
+        ribs = self.peers.setdefault(peer, dict())
+        if (rib := ribs.get(mon_type)) is None:
+            rib = ribs[mon_type] = self._new_rib(self.attributes)
+        return rib
+
+    def consume(self, packet: BmpPacket) -> None:
+        if packet.nlri is None:
+            return
+        mon_type = bmp.MonitoringType.from_packet(packet=packet)
+        rib = self._get_rib(packet.peer, mon_type)
+        numbers = rib.apply(packet.nlri, path_attributes(packet))
+        self.history.add(packet, packet.peer, numbers, mon_type=mon_type)
+
+    def _prefix_key(self, number: int) -> str:
+        return f"{self.prefixes.address(number)}/{self.prefixes.lengths[number]}, " \
+               f"id={self.prefixes.path_ids[number]}, rd=n{self.prefixes.rd(number)}"
+
+    # timelines of the prefixes not `sampled` are left out
+    def _prefixes(self, rib: Rib, timelines: dict[int, list],
+                  sampled: Callable[[int], bool] = None) -> Iterator[tuple[str, dict[str, any]]]:
+        for number, last, update_count, withdraw_count, duplicate_withdraw_count, attribute_number in rib.rows():
+            prefix_len, prefix_id, prefix_rd = \
+                self.prefixes.lengths[number], self.prefixes.path_ids[number], self.prefixes.rd(number)
+            key = self._prefix_key(number)
+            prefix = {
+                "prefix": key,
+                "prefix_len": prefix_len,
+                "id": prefix_id,
+                "rd": prefix_rd,
+                "update_count": update_count,
+                "withdraw_count": withdraw_count,
+                "duplicate_withdraw_count": duplicate_withdraw_count,
+                "last": last,  # 0 is withdrawn, 1 is updated
+                "last_attr": self.attributes.get(attribute_number),  # current attributes if last is 1
+            }
+            if sampled is None or sampled(number):
+                # (capture_sequence, pdu_type) of packets affecting the prefix
+                prefix["timeline"] = timelines.get(number, [])
+            yield key, prefix
+        if rib.eor_count:
+            key = "EoR/0, id=0, rd=n"
+            prefix = {"prefix": key, "prefix_len": 0, "id": 0, "rd": "", "update_count": rib.eor_count,
+                      "withdraw_count": 0, "duplicate_withdraw_count": 0, "last": None, "last_attr": None}
+            if sampled is None or sampled(NO_PREFIX):
+                prefix["timeline"] = timelines.get(NO_PREFIX, [])
+            yield key, prefix
+
+    def _peer(self, peer: int, events: RouteEvents) -> Iterator[tuple[str, any]]:
+        yield "id", self.registry[peer].peer_id
+        ribs = self.peers[peer]
+        for mon_type in bmp.MonitoringType:
+            yield str(mon_type), self._prefixes(ribs[mon_type], events.timelines(peer, mon_type.value)) \
+                if mon_type in ribs else dict()
+
+    # prefix records of each RIB if the report is detailed, then a record of the RIB totals
+    def _report(self, events: RouteEvents) -> None:
+        detail, timelines = self.sink.wants(Verbosity.Detail), self.sink.wants(Verbosity.Timeline)
+        for peer, ribs in self.peers.items():
+            peer_fields = _peer_fields(self.registry[peer].peer_id)
+            for mon_type, rib in ribs.items():
+                prefix_count = route_count = update_count = withdraw_count = duplicate_withdraw_count = 0
+                for key, prefix in self._prefixes(rib, events.timelines(peer, mon_type.value) if timelines else {},
+                                                  self.sink.samples):
+                    if detail:
+                        self.emit("prefix", Verbosity.Detail, **peer_fields, monitoring_type=mon_type.name,
+                                  **prefix)
+                    if prefix["last"] is None:
+                        continue
+                    prefix_count += 1
+                    route_count += prefix["last"] == ANNOUNCED
+                    update_count += prefix["update_count"]
+                    withdraw_count += prefix["withdraw_count"]
+                    duplicate_withdraw_count += prefix["duplicate_withdraw_count"]
+                self.emit("rib", Verbosity.Summary, **peer_fields, monitoring_type=mon_type.name,
+                          prefixes=prefix_count, routes=route_count, updates=update_count, withdraws=withdraw_count,
+                          duplicate_withdraws=duplicate_withdraw_count, eor=rib.eor_count,
+                          unsupported=rib.unsupported_count)
+
+    def finish(self) -> None:
+        events = RouteEvents(self.history.log)
+        if self.sink is not None:
+            self._report(events)
+            self.log(f"prefixes streamed to {self.sink.path}")
+        else:
+            for chunk in _json_object((str(self.registry[peer].peer_id), self._peer(peer, events))
+                                      for peer in self.peers):
+                self.output.write(chunk)
+            self.output.write("\n")
+
+        churn = events.churn_by_prefix(len(self.prefixes))
+        flaps = events.flaps_by_prefix(self.FLAP_WINDOW, len(self.prefixes))
+        self.log(f"{len(events)} route events, {flaps.sum()} flaps within {self.FLAP_WINDOW:g}s")
+        self.log("most unstable prefixes (events, flaps):")
+        for number, count in events.top(churn, self.TOP_UNSTABLE):
+            self.log(f"  {self._prefix_key(number)}: {count}, {flaps[number]}")
+        self.log("events by peer:")
+        peer_churn = events.churn_by_peer(len(self.registry))
+        for peer in self.peers:
+            self.log(f"  {self.registry[peer].peer_id}: {peer_churn[peer]}")
+
+    @classmethod
+    def summary(cls, records: Iterable[dict[str, Any]]) -> Iterator[str]:
+        prefix_count = timeline_count = 0
+        for record in records:
+            if record["record"] == "prefix":
+                prefix_count += 1
+                timeline_count += "timeline" in record
+            elif record["record"] == "rib":
+                yield f"{record['peer_ip']} ({record['peer_type']}, rd={record['peer_rd']}) " \
+                      f"{record['monitoring_type']}: {record['prefixes']} prefixes, " \
+                      f"{record['routes']} routes, {record['updates']} updates, {record['withdraws']} withdraws " \
+                      f"({record['duplicate_withdraws']} duplicate), {record['eor']} End-of-RIB, " \
+                      f"{record['unsupported']} without decoded prefixes"
+        if prefix_count:
+            yield f"{prefix_count} prefix records, {timeline_count} with a timeline"
+
+
+class VrfTableNameCheck(Check):
+    name = "vrf_table_name_tlv"
+    message_types = (bmp.MessageType.PeerUp,)
+    checkpointed = ("tlvs", "rds")
+
+    def __init__(self, output=None):
+        super().__init__(output)
+        self.tlvs = set()
+        # rd -> (vrf name, location of the first packet with that name)
+        self.rds: dict[str, (str, str)] = dict()
+
+    def _get_rd(self, rd: str, name: str, packet: BmpPacket) -> (str, str):
+        return self.rds.setdefault(rd, (name, f"{packet.capture_sequence} {packet.location_str()}"))
+
+    def consume(self, packet: BmpPacket) -> None:
+        rd = packet.peer_distinguisher
+        new = packet.peer_up_tlv_vrf_table_name
+
+        # skip messages that do not contain the tlv
+        if new is None:
+            return
+
+        current_name, current_packet = self._get_rd(rd=rd, name=new, packet=packet)
+
+        if new != current_name:
+            self.fail(f"RD {rd} changed name from {current_name}({current_packet}) to {new}"
+                      f"({packet.capture_sequence} {packet.location_str()})")
+        self.tlvs.update(set([field for field in packet.field_names if "tlv" in field]))
+
+    def finish(self) -> None:
+        self.log(self.rds)
+        self.log(self.tlvs)
+
+
+# TODO record peer up RD/VRF_NAME and check that all other messages with the same tlv value has the same RD
+
+CHECKS: list[type[Check]] = [IndicesCheck, VersionCheck, PeerFlagsCheck, StatsCheck, RouteCountCheck, PeerUpCheck,
+                             PeerTypeCheck, MonitoringSummaryCheck, VrfTableNameCheck]
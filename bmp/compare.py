@@ -0,0 +1,230 @@
+import argparse
+import hashlib
+import ipaddress
+import sys
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, Optional
+
+from bmp import ingest
+from bmp.bmp import AFI_IPV4, AFI_IPV6, BmpPacket, MessageType, MonitoringType, PeerType
+from bmp.peers import PeerRegistry
+from bmp.rib import ANNOUNCED, AttributeSets, PrefixTable, Rib, path_attributes
+
+# differential comparison of the final RIBs of two captures (e.g. two routers, or two software versions, fed the
+# same BGP input)
+# the routes of each capture are hashed into a Merkle tree: peer, monitoring type, afi, prefix blocks, then routes
+# whose digest covers their attributes, each node digesting the keys and digests of its children
+# two trees are compared from the root, a subtree is only descended when its digests differ, so the comparison is
+# proportional to the size of the difference and not to the size of the RIBs
+#
+#   python -m bmp.compare <pcap a> <pcap b>
+#   python -m bmp.compare <pcap a> <pcap b> --ignore-attribute next_hop
+
+DIGEST_SIZE = 16
+
+# prefix lengths of the blocks between the afi and the routes
+BLOCKS: dict[int, tuple[int, ...]] = {AFI_IPV4: (8, 16), AFI_IPV6: (16, 32, 48)}
+
+# (peer type, peer address, peer rd) of a peer, like PeerId
+PeerKey = tuple[int, str, str]
+# (address, prefix length, path id, rd) of a route, rd is empty for routes without RD
+# blocks are keyed by (address, block length) so that blocks and routes sort by address
+RouteKey = tuple[int, int, int, str]
+
+
+class _Node:
+    __slots__ = ("digest", "children", "attributes")
+
+    def __init__(self):
+        self.digest = b""
+        # key -> child, None for the routes
+        self.children: Optional[dict[Any, "_Node"]] = dict()
+        # attributes of a route
+        self.attributes: Optional[dict[str, tuple[str, ...]]] = None
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+def _canonical(attributes: Optional[dict[str, tuple[str, ...]]]) -> bytes:
+    return repr(sorted(attributes.items())).encode() if attributes else b""
+
+
+# RIBs of a capture: prefixes and attribute sets shared by the RIB of each (peer, monitoring type)
+class Ribs:
+
+    def __init__(self):
+        self.registry = PeerRegistry()
+        self.prefixes = PrefixTable()
+        self.attributes = AttributeSets()
+        self.ribs: dict[tuple[int, MonitoringType], Rib] = dict()
+        # messages read
+        self.count = 0
+
+    # raises ValueError for a message whose peer type and flags give no monitoring type
+    def add(self, packet: BmpPacket) -> None:
+        peer = self.registry.register(packet)
+        self.count += 1
+        if packet.type != MessageType.RouteMonitoring or packet.nlri is None:
+            return
+        try:
+            key = (peer, MonitoringType.from_packet(packet))
+        except ValueError as e:
+            raise ValueError(f"route monitoring message {packet.capture_sequence} of peer {packet.peer_ip} "
+                             f"(rd={packet.peer_distinguisher}): {e}") from e
+        if (rib := self.ribs.get(key)) is None:
+            rib = self.ribs[key] = Rib(self.prefixes, self.attributes)
+        rib.apply(packet.nlri, path_attributes(packet))
+
+    # routes of every RIB as (peer, monitoring type, afi, route key, attribute set number)
+    def routes(self) -> Iterator[tuple[PeerKey, int, int, RouteKey, int]]:
+        prefixes = self.prefixes
+        for (peer, mon_type), rib in self.ribs.items():
+            peer = self.registry[peer]
+            peer_key = (peer.peer_type, peer.peer_ip, peer.peer_rd)
+            for number, last, *_, attribute_number in rib.rows():
+                if last != ANNOUNCED:
+                    continue
+                yield peer_key, mon_type.value, prefixes.afis[number], \
+                    (prefixes.address_value(number), prefixes.lengths[number], prefixes.path_ids[number],
+                     prefixes.rd(number) or ""), attribute_number
+
+
+def read_ribs(packets: Iterable[BmpPacket]) -> Ribs:
+    ribs = Ribs()
+    for packet in packets:
+        ribs.add(packet)
+    return ribs
+
+
+# Merkle tree of the routes of some RIBs
+class RibDigest:
+
+    def __init__(self, ribs: Ribs, ignored: Iterable[str] = ()):
+        self.ribs = ribs
+        self.ignored = frozenset(ignored)
+        self.root = _Node()
+        self.route_count = 0
+        # digests of the attribute sets, shared by their routes
+        attribute_digests: dict[int, bytes] = dict()
+        for peer, mon_type, afi, route, attribute_number in ribs.routes():
+            node = self.root
+            address, length = route[0], route[1]
+            bits = 32 if afi == AFI_IPV4 else 128
+            path = [peer, mon_type, afi]
+            path += [(address >> (bits - block) << (bits - block), block) for block in BLOCKS[afi] if block <= length]
+            for key in path:
+                if (child := node.children.get(key)) is None:
+                    child = node.children[key] = _Node()
+                node = child
+            leaf = node.children[route] = _Node()
+            leaf.children = None
+            if (attributes := ribs.attributes.get(attribute_number)) is not None:
+                attributes = {name: value for name, value in attributes.items() if name not in self.ignored}
+            leaf.attributes = attributes
+            if (attributes_digest := attribute_digests.get(attribute_number)) is None:
+                attributes_digest = attribute_digests[attribute_number] = _digest(_canonical(attributes))
+            leaf.digest = attributes_digest
+            self.route_count += 1
+        self._seal(self.root)
+
+    # digests of the inner nodes, from the children's keys and digests in key order
+    def _seal(self, node: _Node) -> bytes:
+        hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        for key in sorted(node.children):
+            child = node.children[key]
+            hasher.update(repr(key).encode())
+            hasher.update(child.digest if child.children is None else self._seal(child))
+        node.digest = hasher.digest()
+        return node.digest
+
+    @property
+    def digest(self) -> str:
+        return self.root.digest.hex()
+
+
+@dataclass
+class Difference:
+    peer: PeerKey
+    monitoring_type: MonitoringType
+    afi: int
+    route: RouteKey
+    # attributes of the route in each capture, None if the capture does not have the route
+    a: Optional[dict[str, tuple[str, ...]]]
+    b: Optional[dict[str, tuple[str, ...]]]
+
+    def __str__(self):
+        peer_type, peer_ip, peer_rd = self.peer
+        address, length, path_id, rd = self.route
+        prefix = ipaddress.IPv4Address(address) if self.afi == AFI_IPV4 else ipaddress.IPv6Address(address)
+        route = f"{peer_ip} ({PeerType(peer_type).name}, rd={peer_rd}) {self.monitoring_type.name}: " \
+                f"{prefix}/{length} path_id={path_id} rd={rd or None}"
+        if self.a is None or self.b is None:
+            return f"only in {'a' if self.b is None else 'b'}: {route}"
+        return f"attributes differ: {route}" + "".join(
+            f"\n    {name}: {self.a.get(name)} != {self.b.get(name)}" for name in sorted({*self.a, *self.b})
+            if self.a.get(name) != self.b.get(name))
+
+
+# routes of two trees that differ, in key order
+class Comparison:
+
+    def __init__(self, a: RibDigest, b: RibDigest):
+        self.a = a
+        self.b = b
+        # nodes whose digests were compared
+        self.visited = 0
+
+    def __iter__(self) -> Iterator[Difference]:
+        return self._walk(self.a.root, self.b.root, ())
+
+    def _walk(self, a: Optional[_Node], b: Optional[_Node], path: tuple) -> Iterator[Difference]:
+        self.visited += 1
+        if a is not None and b is not None and a.digest == b.digest:
+            return
+        leaf = a if a is not None else b
+        if leaf.children is None:
+            peer, mon_type, afi, *_, route = path
+            yield Difference(peer=peer, monitoring_type=MonitoringType(mon_type), afi=afi, route=route,
+                             a=a.attributes or {} if a is not None else None,
+                             b=b.attributes or {} if b is not None else None)
+            return
+        a_children = a.children if a is not None else {}
+        b_children = b.children if b is not None else {}
+        for key in sorted(a_children.keys() | b_children.keys()):
+            yield from self._walk(a_children.get(key), b_children.get(key), (*path, key))
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="compare the RIBs reconstructed from two captures")
+    parser.add_argument('a', type=str, help='first pcap file')
+    parser.add_argument('b', type=str, help='second pcap file')
+    parser.add_argument('-p', '--port', type=int, default=12345, help="tcp port of BMP in the captures")
+    parser.add_argument('-b', '--backend', type=str, choices=list(ingest.BACKENDS), default="native",
+                        help="capture decoder")
+    parser.add_argument('--ignore-attribute', type=str, action='append', default=[], metavar='NAME',
+                        help="path attribute left out of the comparison (e.g. next_hop), can be repeated")
+    args = parser.parse_args(args)
+
+    digests = list()
+    for path in (args.a, args.b):
+        try:
+            ribs = read_ribs(ingest.open_capture(args.backend, path, port=args.port))
+        except ValueError as e:
+            parser.exit(2, f"{parser.prog}: error: {path}: {e}\n")
+        digests.append(RibDigest(ribs, args.ignore_attribute))
+    for name, path, digest in zip("ab", (args.a, args.b), digests):
+        print(f"{name}: {path}: {digest.ribs.count} messages, {digest.route_count} routes, digest {digest.digest}",
+              file=sys.stderr)
+    comparison = Comparison(*digests)
+    count = 0
+    for difference in comparison:
+        print(difference)
+        count += 1
+    print(f"{count} routes differ, {comparison.visited} nodes compared", file=sys.stderr)
+    return 1 if count else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
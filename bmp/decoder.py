@@ -0,0 +1,443 @@
+import socket
+import struct
+from typing import Optional
+
+from bmp.bmp import AFI_IPV4, AFI_IPV6, SAFI_MPLS_LABEL, SAFI_MPLS_VPN, SAFI_MULTICAST, SAFI_UNICAST, BgpPduType, \
+    FieldLayer, MessageType, NlriBatch, PeerType, Statistics
+
+# native BMP (RFC 7854, RFC 8671, RFC 9069) and BGP decoder
+# produces layers with the same sanitized field names as the tshark bmp layer
+# except for the prefixes of BGP UPDATEs, which are decoded into the NLRI batch of the layer
+
+BMP_HEADER_LEN = 6
+PEER_HEADER_LEN = 42
+BGP_HEADER_LEN = 19
+
+BGP_OPEN = 1
+BGP_UPDATE = 2
+BGP_NOTIFICATION = 3
+
+# peer flags (RFC 7854, RFC 8671), Loc-RIB peer flags (RFC 9069)
+PEER_FLAG_IPV6 = 0x80
+PEER_FLAG_POST_POLICY = 0x40
+PEER_FLAG_AS_PATH = 0x20
+PEER_FLAG_ADJ_RIB_OUT = 0x10
+PEER_FLAG_LOC_RIB = 0x80
+
+STATS_FIELDS: dict[int, str] = {stat.iana: stat.value for stat in Statistics}
+
+INIT_TLV_FIELDS = {0: "init_tlv_info", 1: "init_tlv_sys_descr", 2: "init_tlv_sys_name"}
+PEER_UP_TLV_FIELDS = {0: "peer_up_tlv_string", 3: "peer_up_tlv_vrf_table_name"}
+
+
+class _Fields(dict):
+    # prefixes of the BGP UPDATE of the message, if any
+    nlri: Optional[NlriBatch] = None
+
+    def add(self, name: str, value) -> None:
+        if (values := self.get(name)) is None:
+            self[name] = [str(value)]
+        else:
+            values.append(str(value))
+
+
+def _address(raw: bytes) -> str:
+    return socket.inet_ntop(socket.AF_INET if len(raw) == 4 else socket.AF_INET6, raw)
+
+
+def _colon_hex(raw: bytes) -> str:
+    return raw.hex(":")
+
+
+def _text(raw: bytes) -> str:
+    return raw.decode("utf-8", errors="replace")
+
+
+def format_rd(raw: bytes) -> str:
+    rd_type = struct.unpack_from("!H", raw, 0)[0]
+    if rd_type == 0:
+        return "%d:%d" % struct.unpack_from("!HI", raw, 2)
+    if rd_type == 1:
+        return f"{_address(raw[2:6])}:{struct.unpack_from('!H', raw, 6)[0]}"
+    if rd_type == 2:
+        return "%d:%d" % struct.unpack_from("!IH", raw, 2)
+    return _colon_hex(raw)
+
+
+def _address_bits(afi: int) -> int:
+    return 32 if afi == AFI_IPV4 else 128
+
+
+# maximum prefix length an NLRI entry can carry, including labels and RD
+def _max_nlri_bits(afi: int, safi: int) -> int:
+    bits = _address_bits(afi)
+    if safi in (SAFI_MPLS_LABEL, SAFI_MPLS_VPN):
+        bits += 24 * 8
+    if safi == SAFI_MPLS_VPN:
+        bits += 64
+    return bits
+
+
+# walk NLRI entries, returns the highest path id or None if the data does not parse
+def _scan_nlri(data: bytes, start: int, end: int, max_bits: int, path_id: bool) -> Optional[int]:
+    offset, highest = start, 0
+    while offset < end:
+        if path_id:
+            if offset + 5 > end:
+                return None
+            highest = max(highest, struct.unpack_from("!I", data, offset)[0])
+            offset += 4
+        prefix_len = data[offset]
+        if prefix_len > max_bits:
+            return None
+        offset += 1 + (prefix_len + 7) // 8
+    return highest if offset == end else None
+
+
+# ADD-PATH is not signaled in BMP, guess it from the NLRI like tshark's heuristic
+def _has_path_id(data: bytes, start: int, end: int, afi: int, safi: int) -> bool:
+    max_bits = _max_nlri_bits(afi, safi)
+    with_id = _scan_nlri(data, start, end, max_bits, path_id=True)
+    if with_id is None:
+        return False
+    without_id = _scan_nlri(data, start, end, max_bits, path_id=False)
+    # both parse, path ids are small integers in practice
+    return without_id is None or with_id < (1 << 16)
+
+
+# appends the prefixes of an NLRI field to the batch, a path id of 0 stands for no path id
+def _decode_nlri(batch: NlriBatch, data: bytes, start: int, end: int, afi: int, safi: int, pdu_type: int) -> None:
+    if start >= end or afi not in (AFI_IPV4, AFI_IPV6) or \
+            safi not in (SAFI_UNICAST, SAFI_MULTICAST, SAFI_MPLS_LABEL, SAFI_MPLS_VPN):
+        return
+
+    add_path = _has_path_id(data, start, end, afi, safi)
+    max_len = _address_bits(afi)
+    labeled = safi in (SAFI_MPLS_LABEL, SAFI_MPLS_VPN)
+    add = batch.add
+    offset, path_id, rd, labels = start, 0, None, None
+    while offset < end:
+        if add_path:
+            path_id = struct.unpack_from("!I", data, offset)[0]
+            offset += 4
+        prefix_len = data[offset]
+        offset += 1
+
+        if labeled:
+            stack = list()
+            while prefix_len >= 24 and offset + 3 <= end:
+                label = int.from_bytes(data[offset:offset + 3], "big")
+                offset, prefix_len = offset + 3, prefix_len - 24
+                stack.append(str(label >> 4))
+                # bottom of stack, or withdraw compatibility label (RFC 8277)
+                if label & 1 or label in (0x800000, 0x000000):
+                    break
+            labels = " ".join(stack)
+            if safi == SAFI_MPLS_VPN:
+                rd = format_rd(data[offset:offset + 8])
+                offset, prefix_len = offset + 8, prefix_len - 64
+
+        prefix_len = max(0, min(prefix_len, max_len))
+        length = (prefix_len + 7) // 8
+        add(pdu_type, afi, safi, prefix_len, path_id, data[offset:offset + length], rd, labels)
+        offset += length
+
+
+def _as_path(data: bytes, start: int, end: int, as_size: int) -> str:
+    segments, offset = list(), start
+    as_format = "H" if as_size == 2 else "I"
+    while offset + 2 <= end:
+        segment_type, count = data[offset], data[offset + 1]
+        offset += 2
+        asns = [str(asn) for asn in struct.unpack_from(f"!{count}{as_format}", data, offset)]
+        offset += count * as_size
+        # AS_SET and AS_CONFED_SET
+        segments.append("{" + ",".join(asns) + "}" if segment_type in (1, 4) else " ".join(asns))
+    return " ".join(segments)
+
+
+def _next_hop(raw: bytes) -> str:
+    # VPN next hops are prefixed by a zero RD
+    if len(raw) in (12, 24, 48):
+        raw = raw[8:] if len(raw) == 12 else raw[8:24]
+    if len(raw) == 32:  # global and link local
+        raw = raw[:16]
+    return _address(raw) if len(raw) in (4, 16) else raw.hex()
+
+
+def _decode_attributes(fields: _Fields, data: bytes, start: int, end: int, as_size: int) -> None:
+    offset = start
+    while offset + 3 <= end:
+        flags, type_code = data[offset], data[offset + 1]
+        if flags & 0x10:  # extended length
+            length = struct.unpack_from("!H", data, offset + 2)[0]
+            offset += 4
+        else:
+            length = data[offset + 2]
+            offset += 3
+        value_end = offset + length
+
+        fields.add("bgp_update_path_attribute_flags", f"0x{flags:02x}")
+        fields.add("bgp_update_path_attribute_type_code", type_code)
+        fields.add("bgp_update_path_attribute_length", length)
+
+        match type_code:
+            case 1:
+                fields.add("bgp_update_path_attribute_origin", data[offset])
+            case 2:
+                fields.add("bgp_update_path_attribute_as_path", _as_path(data, offset, value_end, as_size))
+            case 3:
+                fields.add("bgp_update_path_attribute_next_hop", _address(data[offset:offset + 4]))
+            case 4:
+                fields.add("bgp_update_path_attribute_multi_exit_disc", struct.unpack_from("!I", data, offset)[0])
+            case 5:
+                fields.add("bgp_update_path_attribute_local_pref", struct.unpack_from("!I", data, offset)[0])
+            case 7:
+                aggregator_as = int.from_bytes(data[offset:value_end - 4], "big")
+                fields.add("bgp_update_path_attribute_aggregator_as", aggregator_as)
+                fields.add("bgp_update_path_attribute_aggregator_origin", _address(data[value_end - 4:value_end]))
+            case 8:
+                for community in struct.unpack_from(f"!{length // 4}I", data, offset):
+                    fields.add("bgp_update_path_attribute_community", f"{community >> 16}:{community & 0xFFFF}")
+            case 9:
+                fields.add("bgp_update_path_attribute_originator_id", _address(data[offset:offset + 4]))
+            case 10:
+                for cluster in range(offset, value_end, 4):
+                    fields.add("bgp_update_path_attribute_cluster_list", _address(data[cluster:cluster + 4]))
+            case 14:  # MP_REACH_NLRI
+                afi, safi, next_hop_len = struct.unpack_from("!HBB", data, offset)
+                fields.add("bgp_update_path_attribute_afi", afi)
+                fields.add("bgp_update_path_attribute_safi", safi)
+                next_hop = offset + 4
+                fields.add("bgp_update_path_attribute_mp_reach_nlri_next_hop",
+                           _next_hop(data[next_hop:next_hop + next_hop_len]))
+                _decode_nlri(fields.nlri, data, next_hop + next_hop_len + 1, value_end, afi, safi,
+                             BgpPduType.Update.value)
+            case 15:  # MP_UNREACH_NLRI
+                afi, safi = struct.unpack_from("!HB", data, offset)
+                fields.add("bgp_update_path_attribute_afi", afi)
+                fields.add("bgp_update_path_attribute_safi", safi)
+                _decode_nlri(fields.nlri, data, offset + 3, value_end, afi, safi, BgpPduType.Withdraw.value)
+            case 16:
+                for community in range(offset, value_end, 8):
+                    fields.add("bgp_update_path_attribute_extended_community", data[community:community + 8].hex())
+            case 32:
+                for community in range(offset, value_end, 12):
+                    fields.add("bgp_update_path_attribute_large_community",
+                               "%d:%d:%d" % struct.unpack_from("!III", data, community))
+
+        offset = value_end
+
+
+def _decode_update(fields: _Fields, data: bytes, start: int, end: int, as_size: int) -> None:
+    fields.nlri = NlriBatch()
+    withdrawn_len = struct.unpack_from("!H", data, start)[0]
+    fields.add("bgp_update_withdrawn_routes_length", withdrawn_len)
+    withdrawn = start + 2
+    _decode_nlri(fields.nlri, data, withdrawn, withdrawn + withdrawn_len, AFI_IPV4, SAFI_UNICAST,
+                 BgpPduType.Withdraw.value)
+
+    attributes = withdrawn + withdrawn_len
+    attributes_len = struct.unpack_from("!H", data, attributes)[0]
+    fields.add("bgp_update_path_attributes_length", attributes_len)
+    _decode_attributes(fields, data, attributes + 2, attributes + 2 + attributes_len, as_size)
+
+    _decode_nlri(fields.nlri, data, attributes + 2 + attributes_len, end, AFI_IPV4, SAFI_UNICAST,
+                 BgpPduType.Update.value)
+    fields.nlri.mark_eor(fields)
+
+
+# decode one BGP message starting at offset, returns the offset following it
+def decode_bgp(fields: _Fields, data: bytes, offset: int, as_size: int = 4) -> int:
+    length, bgp_type = struct.unpack_from("!HB", data, offset + 16)
+    fields.add("bgp_length", length)
+    fields.add("bgp_type", bgp_type)
+    body, end = offset + BGP_HEADER_LEN, offset + length
+
+    if bgp_type == BGP_OPEN:
+        version, my_as, hold_time = struct.unpack_from("!BHH", data, body)
+        fields.add("bgp_open_version", version)
+        fields.add("bgp_open_myas", my_as)
+        fields.add("bgp_open_holdtime", hold_time)
+        fields.add("bgp_open_identifier", _address(data[body + 5:body + 9]))
+        fields.add("bgp_open_opt_len", data[body + 9])
+    elif bgp_type == BGP_UPDATE:
+        _decode_update(fields, data, body, end, as_size)
+    elif bgp_type == BGP_NOTIFICATION:
+        fields.add("bgp_notify_major_error", data[body])
+        fields.add("bgp_notify_minor_error", data[body + 1])
+    return end
+
+
+def _decode_peer_header(fields: _Fields, data: bytes, offset: int) -> int:
+    peer_type, flags = data[offset], data[offset + 1]
+    fields.add("peer_header", data[offset:offset + PEER_HEADER_LEN].hex())
+    fields.add("peer_type", peer_type)
+    fields.add("peer_flags", f"0x{flags:02x}")
+
+    if peer_type == PeerType.LocRibInstance:
+        fields.add("peer_flags_loc_rib", int(bool(flags & PEER_FLAG_LOC_RIB)))
+        fields.add("peer_flags_loc_rib_res", flags & 0x7F)
+        ipv6 = False
+    else:
+        ipv6 = bool(flags & PEER_FLAG_IPV6)
+        fields.add("peer_flags_ipv6", int(ipv6))
+        fields.add("peer_flags_post_policy", int(bool(flags & PEER_FLAG_POST_POLICY)))
+        fields.add("peer_flags_as_path", int(bool(flags & PEER_FLAG_AS_PATH)))
+        fields.add("peer_flags_adj_rib_out", int(bool(flags & PEER_FLAG_ADJ_RIB_OUT)))
+        fields.add("peer_flags_reserved", flags & 0x0F)
+
+    fields.add("peer_distinguisher", _colon_hex(data[offset + 2:offset + 10]))
+    if ipv6:
+        fields.add("peer_ipv6_addr", _address(data[offset + 10:offset + 26]))
+    else:
+        fields.add("peer_ip_addr", _address(data[offset + 22:offset + 26]))
+
+    peer_as, timestamp_sec, timestamp_usec = struct.unpack_from("!I4xII", data, offset + 26)
+    fields.add("peer_asn", peer_as)
+    fields.add("peer_id", _address(data[offset + 30:offset + 34]))
+    fields.add("peer_timestamp_sec", timestamp_sec)
+    fields.add("peer_timestamp_msec", timestamp_usec)
+    return offset + PEER_HEADER_LEN
+
+
+def _decode_stats(fields: _Fields, data: bytes, offset: int, end: int) -> None:
+    count = struct.unpack_from("!I", data, offset)[0]
+    fields.add("stats_count", count)
+    offset += 4
+    for _ in range(count):
+        if offset + 4 > end:
+            break
+        stat_type, length = struct.unpack_from("!HH", data, offset)
+        fields.add("stats_type", stat_type)
+        fields.add("stats_length", length)
+        offset += 4
+        name = STATS_FIELDS.get(stat_type, "stats_data")
+        if length == 4:
+            fields.add(name, struct.unpack_from("!I", data, offset)[0])
+        elif length == 8:
+            fields.add(name, struct.unpack_from("!Q", data, offset)[0])
+        elif length == 11:  # per AFI/SAFI gauge
+            afi, safi, value = struct.unpack_from("!HBQ", data, offset)
+            fields.add("stats_data_afi", afi)
+            fields.add("stats_data_safi", safi)
+            fields.add(name, value)
+        else:
+            fields.add(name, data[offset:offset + length].hex())
+        offset += length
+
+
+# names maps string tlv types to their field, numbers maps integer tlv types to their field
+def _decode_tlvs(fields: _Fields, data: bytes, offset: int, end: int, prefix: str,
+                 names: dict[int, str], numbers: Optional[dict[int, str]] = None) -> None:
+    while offset + 4 <= end:
+        tlv_type, length = struct.unpack_from("!HH", data, offset)
+        fields.add(f"{prefix}_type", tlv_type)
+        fields.add(f"{prefix}_length", length)
+        value = data[offset + 4:offset + 4 + length]
+        if (name := names.get(tlv_type)) is not None:
+            fields.add(name, _text(value))
+        elif numbers and (name := numbers.get(tlv_type)) is not None:
+            fields.add(name, int.from_bytes(value, "big"))
+        else:
+            fields.add(f"{prefix}_value", value.hex())
+        offset += 4 + length
+
+
+def _decode_peer_up(fields: _Fields, data: bytes, offset: int, end: int, ipv6: bool) -> None:
+    if ipv6:
+        fields.add("peer_up_ipv6_addr", _address(data[offset:offset + 16]))
+    else:
+        fields.add("peer_up_ip_addr", _address(data[offset + 12:offset + 16]))
+    local_port, remote_port = struct.unpack_from("!HH", data, offset + 16)
+    fields.add("peer_up_port_local", local_port)
+    fields.add("peer_up_port_remote", remote_port)
+
+    # sent and received OPEN messages
+    offset += 20
+    for _ in range(2):
+        if offset + BGP_HEADER_LEN > end:
+            return
+        offset = decode_bgp(fields, data, offset)
+
+    _decode_tlvs(fields, data, offset, end, "peer_up_tlv", PEER_UP_TLV_FIELDS)
+
+
+def _decode_peer_down(fields: _Fields, data: bytes, offset: int, end: int) -> None:
+    reason = data[offset]
+    fields.add("peer_down_reason", reason)
+    offset += 1
+    if reason in (1, 3) and offset + BGP_HEADER_LEN <= end:  # NOTIFICATION sent / received
+        decode_bgp(fields, data, offset)
+    elif reason == 2 and offset + 2 <= end:  # FSM event code
+        fields.add("peer_down_data", struct.unpack_from("!H", data, offset)[0])
+
+
+def _decode_route_mirroring(fields: _Fields, data: bytes, offset: int, end: int) -> None:
+    while offset + 4 <= end:
+        tlv_type, length = struct.unpack_from("!HH", data, offset)
+        fields.add("route_mirroring_type", tlv_type)
+        if tlv_type == 0 and length >= BGP_HEADER_LEN:
+            decode_bgp(fields, data, offset + 4)
+        elif tlv_type == 1:
+            fields.add("route_mirroring_code", struct.unpack_from("!H", data, offset + 4)[0])
+        offset += 4 + length
+
+
+# size of the AS numbers in the AS paths of a route monitoring message
+def _as_size(peer_type: int, peer_flags: int) -> int:
+    return 2 if peer_type != PeerType.LocRibInstance and peer_flags & PEER_FLAG_AS_PATH else 4
+
+
+# decode the BGP PDU of a route monitoring message only, e.g. of a message decoded without it
+def decode_route_monitoring_pdu(data: bytes) -> FieldLayer:
+    fields = _Fields()
+    try:
+        decode_bgp(fields, data, BMP_HEADER_LEN + PEER_HEADER_LEN,
+                   as_size=_as_size(data[BMP_HEADER_LEN], data[BMP_HEADER_LEN + 1]))
+    except (struct.error, IndexError, ValueError) as e:
+        fields.add("malformed", e)
+    return FieldLayer(dict(fields), fields.nlri)
+
+
+# decode one complete BMP message
+# the BGP PDU of route monitoring messages is left out if bgp is False, see decode_route_monitoring_pdu
+def decode_bmp(data: bytes, bgp: bool = True) -> FieldLayer:
+    fields = _Fields()
+    version, length, msg_type = struct.unpack_from("!BIB", data, 0)
+    fields.add("version", version)
+    fields.add("length", length)
+    fields.add("type", msg_type)
+    offset, end = BMP_HEADER_LEN, min(length, len(data))
+
+    try:
+        if msg_type in (MessageType.RouteMonitoring, MessageType.StatisticsReport, MessageType.PeerDown,
+                        MessageType.PeerUp, MessageType.RouteMirroring):
+            peer_type, peer_flags = data[offset], data[offset + 1]
+            offset = _decode_peer_header(fields, data, offset)
+            loc_rib = peer_type == PeerType.LocRibInstance
+
+            match msg_type:
+                case MessageType.RouteMonitoring:
+                    if bgp:
+                        decode_bgp(fields, data, offset, as_size=_as_size(peer_type, peer_flags))
+                case MessageType.StatisticsReport:
+                    _decode_stats(fields, data, offset, end)
+                case MessageType.PeerDown:
+                    _decode_peer_down(fields, data, offset, end)
+                case MessageType.PeerUp:
+                    _decode_peer_up(fields, data, offset, end, ipv6=not loc_rib and peer_flags & PEER_FLAG_IPV6)
+                case MessageType.RouteMirroring:
+                    _decode_route_mirroring(fields, data, offset, end)
+
+        elif msg_type == MessageType.Initiation:
+            _decode_tlvs(fields, data, offset, end, "init_tlv", INIT_TLV_FIELDS)
+
+        elif msg_type == MessageType.Termination:
+            _decode_tlvs(fields, data, offset, end, "term_tlv", {0: "term_tlv_string"}, {1: "term_tlv_reason"})
+
+    # truncated or malformed message, keep what was decoded like tshark does
+    except (struct.error, IndexError, ValueError) as e:
+        fields.add("malformed", e)
+
+    return FieldLayer(dict(fields), fields.nlri)
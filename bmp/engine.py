@@ -0,0 +1,177 @@
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional, TextIO
+
+from bmp.bmp import BmpPacket, MessageType, MonitoringType
+from bmp.index import PacketIndex, monitoring_type
+from bmp.peers import PeerRegistry
+from bmp.report import ReportSink, Verbosity
+
+# single pass check engine
+# checks are incremental consumers fed by one streaming pass over the capture,
+# their memory is bounded by their own state and not by the capture size
+
+# failure messages kept per check, the others are only counted
+MAX_FAILURES = 100
+
+
+# outcome of a check run over a part of the capture (e.g. one BMP session in a worker), cheap to pickle
+@dataclass
+class CheckResult:
+    name: str
+    log: str
+    failures: list[str]
+    failure_count: int
+    error: Optional[BaseException]
+
+
+class Check:
+    # test_<name> reports the check in tests/test_bmp.py
+    name: str = None
+    # message types consumed by the check, all of them if None
+    message_types: Optional[tuple[MessageType, ...]] = None
+    # monitoring types consumed by the check, all packets if None, only packets with a per-peer header otherwise
+    monitoring_types: Optional[tuple[MonitoringType, ...]] = None
+    # attributes holding the state carried over to the next capture of a rotation (see bmp/checkpoint.py)
+    checkpointed: tuple[str, ...] = ()
+
+    def __init__(self, output: TextIO = None):
+        self.output = output or sys.stdout
+        self.failures: list[str] = list()
+        self.failure_count = 0
+        # exception raised by the check, it is not fed anymore
+        self.error: Optional[BaseException] = None
+        # called on each failure as it happens, e.g. to report failures online
+        self.report: Optional[Callable[["Check", str], None]] = None
+        # peers of the packets, whose numbers are in packet.peer, set by the pipeline
+        self.registry: Optional[PeerRegistry] = None
+        # structured report the check streams its records to instead of dumping them to its output (see bmp/report.py)
+        self.sink: Optional[ReportSink] = None
+
+    def log(self, *args) -> None:
+        print(*args, file=self.output)
+
+    # writes a record to the report if the report keeps records of that verbosity
+    def emit(self, record: str, verbosity: Verbosity, **fields) -> None:
+        if self.sink is not None and self.sink.wants(verbosity):
+            self.sink.write(self.name, record, **fields)
+
+    # human readable summary of the records of the check in a report
+    @classmethod
+    def summary(cls, records: Iterable[dict[str, Any]]) -> Iterator[str]:
+        return iter(())
+
+    def fail(self, msg: str) -> None:
+        self.failure_count += 1
+        if len(self.failures) < MAX_FAILURES:
+            self.failures.append(msg)
+        if self.report is not None:
+            self.report(self, msg)
+
+    @property
+    def passed(self) -> bool:
+        return self.error is None and self.failure_count == 0
+
+    def accepts(self, msg_type: MessageType, mon_type: Optional[MonitoringType]) -> bool:
+        return (self.message_types is None or msg_type in self.message_types) and \
+            (self.monitoring_types is None or mon_type in self.monitoring_types)
+
+    def consume(self, packet: BmpPacket) -> None:
+        raise NotImplementedError
+
+    # called once after the last packet
+    def finish(self) -> None:
+        pass
+
+    # state of the check after a run, picklable
+    def state(self) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in self.checkpointed}
+
+    # state of the same check saved after the previous capture, before the first packet
+    def restore(self, state: dict[str, Any]) -> None:
+        for name in self.checkpointed:
+            if name in state:
+                setattr(self, name, state[name])
+
+    # result of the finished check, its output must be readable back (e.g. a StringIO)
+    def result(self) -> CheckResult:
+        self.output.seek(0)
+        return CheckResult(name=self.name, log=self.output.read(), failures=self.failures,
+                           failure_count=self.failure_count, error=self.error)
+
+    # adds the logs and failures of the same check run over a part of the capture, labelled with the part
+    def merge(self, result: CheckResult, label: str) -> None:
+        self.log(f"=== {label} ===")
+        self.output.write(result.log)
+        self.failures.extend(f"{label}: {msg}" for msg in result.failures[:MAX_FAILURES - len(self.failures)])
+        self.failure_count += result.failure_count
+        if self.error is None:
+            self.error = result.error
+
+
+class Pipeline:
+
+    def __init__(self, checks: list[Check], index: Optional[PacketIndex] = None,
+                 registry: Optional[PeerRegistry] = None):
+        self.checks = checks
+        # indexes of the capture, filled by the pass if given
+        self.index = index
+        # every packet is registered once, the checks share the registry
+        self.registry = registry if registry is not None else PeerRegistry()
+        for check in checks:
+            check.registry = self.registry
+        self.count = 0
+        # wall time, cpu time (consume and finish) and consumed messages of each check, recorded when timed is set
+        self.timed = False
+        self.timings: dict[Check, list] = {check: [0.0, 0.0, 0] for check in checks}
+        # consumers of each (message type, monitoring type), so checks only see their slice of the capture
+        self._dispatch: dict[tuple[MessageType, Optional[MonitoringType]], list[Check]] = dict()
+
+    def _consumers(self, msg_type: MessageType, mon_type: Optional[MonitoringType]) -> list[Check]:
+        if (consumers := self._dispatch.get((msg_type, mon_type))) is None:
+            consumers = self._dispatch[(msg_type, mon_type)] = [
+                check for check in self.checks if check.error is None and check.accepts(msg_type, mon_type)
+            ]
+        return consumers
+
+    def _disable(self, check: Check, error: BaseException) -> None:
+        check.error = error
+        for consumers in self._dispatch.values():
+            if check in consumers:
+                consumers.remove(check)
+
+    def _call(self, check: Check, method: Callable, *args) -> None:
+        if self.timed:
+            timing = self.timings[check]
+            wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            method(*args)
+        except Exception as e:
+            self._disable(check, e)
+        if self.timed:
+            timing[0] += time.perf_counter() - wall
+            timing[1] += time.process_time() - cpu
+
+    def feed(self, packet: BmpPacket) -> None:
+        mon_type = monitoring_type(packet)
+        packet.peer = self.registry.register(packet)
+        if self.index is not None:
+            self.index.add(packet, mon_type, self.registry.peer_id(packet.peer))
+        for check in self._consumers(packet.type, mon_type):
+            self._call(check, check.consume, packet)
+            if self.timed:
+                self.timings[check][2] += 1
+        self.count += 1
+
+    def finish(self) -> None:
+        for check in self.checks:
+            if check.error is None:
+                self._call(check, check.finish)
+
+    # run all the checks over the packets in one pass, returns the packet count
+    def run(self, packets: Iterable[BmpPacket]) -> int:
+        for packet in packets:
+            self.feed(packet)
+        self.finish()
+        return self.count
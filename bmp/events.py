@@ -0,0 +1,159 @@
+import math
+from array import array
+from typing import Optional
+
+import numpy as np
+
+from bmp.bmp import BgpPduType, BmpPacket, MonitoringType
+from bmp.rib import PrefixTable
+
+# columnar log of the route events of a capture, one row per prefix of each UPDATE (and one per End-of-RIB)
+# rows are appended in capture order to array columns, the analytics work on numpy copies of the columns
+#
+# peers are numbered by the writer of the log, prefixes are the numbers of a PrefixTable (see bmp/rib.py),
+# End-of-RIB events have no prefix (-1)
+
+NO_PREFIX = -1
+
+_PDU_TYPES: dict[int, BgpPduType] = {pdu_type.value: pdu_type for pdu_type in BgpPduType}
+
+
+class RouteEventLog:
+    columns = ("sequences", "timestamps", "peers", "monitoring_types", "prefixes", "pdu_types")
+
+    def __init__(self):
+        self.sequences = array("I")
+        self.timestamps = array("d")
+        self.peers = array("I")
+        self.monitoring_types = array("B")
+        self.prefixes = array("i")
+        self.pdu_types = array("b")
+
+    def __len__(self) -> int:
+        return len(self.sequences)
+
+    # events of the prefixes of an UPDATE, all from the same packet and RIB
+    def record(self, sequence: int, timestamp: Optional[float], peer: int, mon_type: int, prefixes: array,
+               pdu_types: array) -> None:
+        count = len(prefixes)
+        self.sequences += array("I", (sequence,)) * count
+        self.timestamps += array("d", (math.nan if timestamp is None else timestamp,)) * count
+        self.peers += array("I", (peer,)) * count
+        self.monitoring_types += array("B", (mon_type,)) * count
+        self.prefixes.extend(prefixes)
+        self.pdu_types.extend(pdu_types)
+
+    def record_eor(self, sequence: int, timestamp: Optional[float], peer: int, mon_type: int) -> None:
+        self.record(sequence, timestamp, peer, mon_type, array("i", (NO_PREFIX,)), array("b", (BgpPduType.EoR.value,)))
+
+    # numpy copies of the columns, in the order of `columns`
+    def arrays(self) -> tuple[np.ndarray, ...]:
+        return tuple(np.array(getattr(self, name)) for name in self.columns)
+
+
+# route events of a capture with the prefixes they refer to, peers are numbered by the caller
+# (e.g. the peer numbers of a PeerRegistry, see bmp/peers.py)
+class RouteHistory:
+
+    def __init__(self, prefixes: Optional[PrefixTable] = None, log: Optional[RouteEventLog] = None):
+        self.prefixes = prefixes if prefixes is not None else PrefixTable()
+        self.log = log if log is not None else RouteEventLog()
+
+    # records the prefixes of a route monitoring message, numbers are their prefix numbers if already interned
+    # UPDATEs without decoded prefixes that are not End-of-RIBs have no event
+    def add(self, packet: BmpPacket, peer: int, numbers: Optional[array] = None,
+            mon_type: Optional[MonitoringType] = None) -> None:
+        mon_type = (mon_type or MonitoringType.from_packet(packet)).value
+        if packet.nlri.eor:
+            self.log.record_eor(packet.capture_sequence, packet.timestamp, peer, mon_type)
+        elif len(packet.nlri):
+            self.log.record(packet.capture_sequence, packet.timestamp, peer, mon_type,
+                            numbers if numbers is not None else self.prefixes.intern(packet.nlri),
+                            packet.nlri.pdu_types)
+
+
+# vectorized analytics over a snapshot of a log
+# events are grouped by RIB (peer and monitoring type) and prefix with one stable sort, which keeps capture order
+# within a group
+class RouteEvents:
+
+    def __init__(self, log: RouteEventLog):
+        self.sequences, self.timestamps, self.peers, self.monitoring_types, self.prefixes, self.pdu_types = \
+            log.arrays()
+
+        # (peer, monitoring type, prefix + 1) packed in one key, End-of-RIBs first in their RIB
+        self._keys = (self._rib_keys(self.peers, self.monitoring_types) << 32) | \
+            (self.prefixes.astype(np.int64) + 1)
+        self._order = np.argsort(self._keys, kind="stable")
+        self._sorted_keys = self._keys[self._order]
+
+    def __len__(self) -> int:
+        return len(self.sequences)
+
+    @staticmethod
+    def _rib_keys(peers, mon_types) -> np.ndarray:
+        return (np.asarray(peers, dtype=np.int64) << 8) | np.asarray(mon_types, dtype=np.int64)
+
+    @property
+    def _routes(self) -> np.ndarray:
+        return self.prefixes != NO_PREFIX
+
+    # route events by prefix number, all RIBs together
+    def churn_by_prefix(self, prefix_count: int = 0) -> np.ndarray:
+        return np.bincount(self.prefixes[self._routes], minlength=prefix_count)
+
+    # route events by peer number
+    def churn_by_peer(self, peer_count: int = 0) -> np.ndarray:
+        return np.bincount(self.peers[self._routes], minlength=peer_count)
+
+    # indexes of the events that announce again a prefix the same RIB withdrew at most `window` seconds before
+    def flaps(self, window: float) -> np.ndarray:
+        keys, order = self._sorted_keys, self._order
+        pdu_types, timestamps = self.pdu_types[order], self.timestamps[order]
+        flapped = (keys[1:] == keys[:-1]) & (pdu_types[:-1] == BgpPduType.Withdraw.value) & \
+            (pdu_types[1:] == BgpPduType.Update.value) & (timestamps[1:] - timestamps[:-1] <= window)
+        return np.sort(order[1:][flapped])
+
+    # (peers, monitoring types, prefixes) of the routes announced once the events up to capture sequence `sequence`
+    # (the whole log if None) are applied
+    def routes(self, sequence: Optional[int] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        order, keys = self._order, self._sorted_keys
+        if sequence is not None:
+            applied = self.sequences[order] <= sequence
+            order, keys = order[applied], keys[applied]
+        # last event of each RIB and prefix
+        last = order[np.append(keys[1:] != keys[:-1], True)] if len(order) else order
+        last = last[(self.pdu_types[last] == BgpPduType.Update.value) & (self.prefixes[last] != NO_PREFIX)]
+        return self.peers[last], self.monitoring_types[last], self.prefixes[last]
+
+    # flaps by prefix number, all RIBs together
+    def flaps_by_prefix(self, window: float, prefix_count: int = 0) -> np.ndarray:
+        return np.bincount(self.prefixes[self.flaps(window)], minlength=prefix_count)
+
+    # route events per time bucket of `interval` seconds from the first event, and the start of the first bucket
+    def activity(self, interval: float) -> tuple[np.ndarray, float]:
+        timestamps = self.timestamps[self._routes & ~np.isnan(self.timestamps)]
+        if not len(timestamps):
+            return np.zeros(0, dtype=np.int64), math.nan
+        start = timestamps.min()
+        return np.bincount(((timestamps - start) // interval).astype(np.int64)), float(start)
+
+    # (number, count) of the `n` highest counts, highest first and lowest number first among equal counts
+    @staticmethod
+    def top(counts: np.ndarray, n: int) -> list[tuple[int, int]]:
+        top = np.argsort(-counts, kind="stable")[:min(n, np.count_nonzero(counts))]
+        return list(zip(top.tolist(), counts[top].tolist()))
+
+    # (capture sequence, pdu type) of the events of each prefix of a RIB, End-of-RIBs under NO_PREFIX
+    def timelines(self, peer: int, mon_type: int) -> dict[int, list[tuple[int, BgpPduType]]]:
+        rib = int(self._rib_keys(peer, mon_type)) << 32
+        start, end = np.searchsorted(self._sorted_keys, (rib, rib + (1 << 32)))
+        if start == end:
+            return dict()
+        order, keys = self._order[start:end], self._sorted_keys[start:end]
+        bounds = [0, *(np.flatnonzero(keys[1:] != keys[:-1]) + 1).tolist(), len(keys)]
+        sequences, pdu_types = self.sequences[order].tolist(), self.pdu_types[order].tolist()
+        prefixes = (keys[bounds[:-1]] - rib - 1).tolist()
+        return {prefix: [(sequence, _PDU_TYPES[pdu_type]) for sequence, pdu_type in
+                         zip(sequences[first:last], pdu_types[first:last])]
+                for prefix, first, last in zip(prefixes, bounds, bounds[1:])}
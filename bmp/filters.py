@@ -0,0 +1,184 @@
+import ipaddress
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+from bmp.bmp import AFI_IPV4, AFI_IPV6, NLRI_FIELDS, BmpPacket, MessageType, NlriBatch, PeerType
+
+# selection of the messages of a capture, pushed down to the earliest stage of each backend
+# the tshark backend gets a display filter so tshark drops the frames without a matching message, the native reader
+# tests the time and the raw common and per-peer headers of a message before decoding it and only decodes the BGP
+# PDU of route monitoring messages up front for prefix ranges
+# messages are numbered like in the whole capture so locations stay valid (native backend)
+#
+# each criterion is a list of alternatives, a message must match one alternative of every criterion given
+# peer criteria only match messages with a per-peer header, prefix ranges only restrict route monitoring messages,
+# which are kept whole if at least one of their prefixes is in a range
+
+# message types with a per-peer header
+PEER_MESSAGE_TYPES = frozenset(msg_type.value for msg_type in (
+    MessageType.RouteMonitoring, MessageType.StatisticsReport, MessageType.PeerDown, MessageType.PeerUp,
+    MessageType.RouteMirroring))
+
+_BMP_TYPE = 5
+_PEER_TYPE = 6
+_PEER_FLAGS = 7
+_PEER_RD = slice(8, 16)
+_PEER_ADDRESS = slice(16, 32)
+_PEER_HEADER_END = 48
+_PEER_FLAG_IPV6 = 0x80
+
+
+# seconds since the epoch, or an ISO 8601 date and time (UTC unless it has an offset)
+def parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        time = datetime.fromisoformat(value)
+        return (time if time.tzinfo is not None else time.replace(tzinfo=timezone.utc)).timestamp()
+
+
+# peer address as the 16 bytes of the per-peer header, IPv4 addresses in the last 4
+def _packed_address(address: str) -> bytes:
+    packed = ipaddress.ip_address(address).packed
+    return packed.rjust(16, b"\0")
+
+
+# peer distinguisher in the colon separated hex of the logs (e.g. 00:00:fd:e8:00:00:00:01)
+def _packed_rd(rd: str) -> bytes:
+    packed = bytes.fromhex(rd.replace(":", ""))
+    if len(packed) != 8:
+        raise ValueError(f"invalid peer distinguisher {rd}, expected 8 colon separated hex bytes")
+    return packed
+
+
+@dataclass
+class PacketFilter:
+    peer_ips: list[str] = field(default_factory=list)
+    peer_rds: list[str] = field(default_factory=list)
+    peer_types: list[str] = field(default_factory=list)
+    message_types: list[str] = field(default_factory=list)
+    # capture time window, seconds since the epoch, inclusive
+    start: Optional[float] = None
+    end: Optional[float] = None
+    prefixes: list[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._addresses = {_packed_address(address) for address in self.peer_ips}
+        self._rds = {_packed_rd(rd) for rd in self.peer_rds}
+        self._peer_types = {PeerType[name].value for name in self.peer_types}
+        self._message_types = {MessageType[name].value for name in self.message_types}
+        # (afi, network address, prefix length) of the prefix ranges
+        self._networks = [(AFI_IPV4 if network.version == 4 else AFI_IPV6, int(network.network_address),
+                           network.prefixlen)
+                          for network in (ipaddress.ip_network(prefix, strict=False) for prefix in self.prefixes)]
+
+    def __bool__(self) -> bool:
+        return bool(self.peer_ips or self.peer_rds or self.peer_types or self.message_types or self.prefixes or
+                    self.start is not None or self.end is not None)
+
+    @property
+    def has_peers(self) -> bool:
+        return bool(self._addresses or self._rds or self._peer_types)
+
+    def to_dict(self) -> dict:
+        return {name: value for name, value in asdict(self).items() if value or value == 0}
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "PacketFilter":
+        return cls(**values)
+
+    def accepts_time(self, timestamp: Optional[float]) -> bool:
+        return timestamp is None or ((self.start is None or timestamp >= self.start) and
+                                     (self.end is None or timestamp <= self.end))
+
+    # message type and per-peer header of an undecoded message
+    def accepts_header(self, data: bytes) -> bool:
+        if len(data) <= _BMP_TYPE:
+            return not (self._message_types or self.has_peers)
+        msg_type = data[_BMP_TYPE]
+        if self._message_types and msg_type not in self._message_types:
+            return False
+        if not self.has_peers:
+            return True
+        if msg_type not in PEER_MESSAGE_TYPES or len(data) < _PEER_HEADER_END:
+            return False
+        peer_type = data[_PEER_TYPE]
+        if self._peer_types and peer_type not in self._peer_types:
+            return False
+        if self._rds and data[_PEER_RD] not in self._rds:
+            return False
+        if self._addresses:
+            ipv6 = peer_type != PeerType.LocRibInstance.value and data[_PEER_FLAGS] & _PEER_FLAG_IPV6
+            address = data[_PEER_ADDRESS] if ipv6 else bytes(12) + data[_PEER_ADDRESS][12:]
+            return address in self._addresses
+        return True
+
+    # whether a batch has a prefix in one of the ranges
+    def accepts_nlri(self, batch: Optional[NlriBatch]) -> bool:
+        if not self._networks:
+            return True
+        if batch is None:
+            return False
+        addresses = batch.addresses
+        for index, (afi, length) in enumerate(zip(batch.afis, batch.lengths)):
+            start = index * NlriBatch.ADDRESS_SIZE
+            bits = 32 if afi == AFI_IPV4 else 128
+            address = int.from_bytes(addresses[start:start + bits // 8], "big")
+            for network_afi, network, network_length in self._networks:
+                if afi == network_afi and length >= network_length and \
+                        (address ^ network) >> (bits - network_length) == 0:
+                    return True
+        return False
+
+    # routes of a decoded packet, other message types are not restricted by prefix ranges
+    def accepts_routes(self, packet: BmpPacket) -> bool:
+        return not self._networks or packet.type != MessageType.RouteMonitoring or self.accepts_nlri(packet.nlri)
+
+    # whole decoded packet, e.g. of a frame that matched a display filter because of another of its messages
+    def accepts(self, packet: BmpPacket) -> bool:
+        if not self.accepts_time(packet.timestamp):
+            return False
+        if self._message_types and packet.type.value not in self._message_types:
+            return False
+        if self.has_peers:
+            if packet.peer_type is None or (self._peer_types and packet.peer_type not in self._peer_types):
+                return False
+            if self._rds and _packed_rd(packet.peer_distinguisher) not in self._rds:
+                return False
+            if self._addresses and _packed_address(packet.peer_ip) not in self._addresses:
+                return False
+        return self.accepts_routes(packet)
+
+    # equivalent wireshark display filter, it selects the frames carrying at least one matching message
+    def display_filter(self) -> str:
+        def _any(clauses: list[str]) -> str:
+            return clauses[0] if len(clauses) == 1 else "(" + " || ".join(clauses) + ")"
+
+        criteria = list()
+        if self.start is not None:
+            criteria.append(f"frame.time_epoch >= {self.start}")
+        if self.end is not None:
+            criteria.append(f"frame.time_epoch <= {self.end}")
+        if self._message_types:
+            criteria.append(_any([f"bmp.type == {msg_type}" for msg_type in sorted(self._message_types)]))
+        if self._peer_types:
+            criteria.append(_any([f"bmp.peer.type == {peer_type}" for peer_type in sorted(self._peer_types)]))
+        if self.peer_rds:
+            criteria.append(_any([f"bmp.peer.distinguisher == {rd}" for rd in self.peer_rds]))
+        if self.peer_ips:
+            criteria.append(_any([f"bmp.peer.ip.addr == {address}" if ipaddress.ip_address(address).version == 4
+                                  else f"bmp.peer.ipv6.addr == {address}" for address in self.peer_ips]))
+        if self.prefixes:
+            # other message types are not restricted
+            clauses = [f"bmp.type != {MessageType.RouteMonitoring.value}"]
+            for prefix in self.prefixes:
+                version = ipaddress.ip_network(prefix, strict=False).version
+                clauses += [f"bgp.{name.removeprefix('bgp_')} == {prefix}" for name in sorted(NLRI_FIELDS)
+                            if name.endswith("prefix") and ("ipv6" in name) == (version == 6) and
+                            (version == 4 or "ipv4" not in name)]
+            criteria.append(_any(clauses))
+        return " && ".join(criteria)
+
+    def __str__(self):
+        return ", ".join(f"{name}={value}" for name, value in self.to_dict().items())
@@ -0,0 +1,49 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+# a TCP session carrying BMP messages, src is the sender of the messages (the router)
+@dataclass(eq=False)
+class Flow:
+    # TCP stream index, like tshark's tcp.stream
+    stream: int
+    src: str
+    dst: str
+    sport: int
+    dport: int
+    # capture time of the first and last BMP message of the session
+    first_timestamp: float
+    last_timestamp: float
+    message_count: int = 0
+
+    @property
+    def tuple(self) -> tuple[str, str, int, int]:
+        return self.src, self.dst, self.sport, self.dport
+
+    def __str__(self):
+        return f"stream {self.stream} {self.src}:{self.sport} -> {self.dst}:{self.dport}"
+
+
+# sessions of a capture by stream index, filled at ingest
+class FlowTable:
+
+    def __init__(self):
+        self.flows: dict[int, Flow] = dict()
+
+    def __iter__(self):
+        return iter(self.flows.values())
+
+    def __len__(self):
+        return len(self.flows)
+
+    def get(self, stream: int) -> Optional[Flow]:
+        return self.flows.get(stream)
+
+    # record a BMP message of a session, returns its flow
+    def observe(self, stream: int, src: str, dst: str, sport: int, dport: int, timestamp: float) -> Flow:
+        if (flow := self.flows.get(stream)) is None:
+            flow = self.flows[stream] = Flow(stream=stream, src=src, dst=dst, sport=sport, dport=dport,
+                                             first_timestamp=timestamp, last_timestamp=timestamp)
+        flow.last_timestamp = timestamp
+        flow.message_count += 1
+        return flow
@@ -0,0 +1,77 @@
+import heapq
+from array import array
+from typing import Iterator, Optional, Sequence
+
+from bmp.bmp import BmpPacket, MessageType, MonitoringType, PeerId
+
+# indexes of a capture built during the ingest pass
+# each index maps a key to the capture sequences of its packets, in capture order,
+# sequences are stored in compact arrays so the indexes stay small next to the packets they describe
+
+
+# monitoring type of a packet, None if it has no per-peer header or invalid flags
+def monitoring_type(packet: BmpPacket) -> Optional[MonitoringType]:
+    if packet.peer_type is None:
+        return None
+    try:
+        return MonitoringType.from_packet(packet=packet)
+    except ValueError:
+        return None
+
+
+class PacketIndex:
+
+    def __init__(self):
+        self.count = 0
+        self.by_type: dict[MessageType, array] = {msg_type: array("L") for msg_type in MessageType}
+        self.by_peer: dict[PeerId, array] = dict()
+        self.by_monitoring_type: dict[MonitoringType, array] = {mon_type: array("L") for mon_type in MonitoringType}
+
+    # peer is None if the packet has no per-peer header or an unknown peer type
+    def add(self, packet: BmpPacket, mon_type: Optional[MonitoringType] = None, peer: Optional[PeerId] = None) -> None:
+        seq = packet.capture_sequence
+        self.count += 1
+        self.by_type[packet.type].append(seq)
+        if peer is not None:
+            if (sequences := self.by_peer.get(peer)) is None:
+                sequences = self.by_peer[peer] = array("L")
+            sequences.append(seq)
+        if mon_type is not None:
+            self.by_monitoring_type[mon_type].append(seq)
+
+    # adds the packets of another index of the same capture (e.g. of another BMP session), keeping capture order
+    def merge(self, other: "PacketIndex") -> None:
+        self.count += other.count
+        for index, other_index in ((self.by_type, other.by_type), (self.by_peer, other.by_peer),
+                                   (self.by_monitoring_type, other.by_monitoring_type)):
+            for key, sequences in other_index.items():
+                index[key] = array("L", heapq.merge(index[key], sequences)) if key in index else array("L", sequences)
+
+    # packet count of each message type by name
+    def type_counts(self) -> dict[str, int]:
+        return {msg_type.name: len(sequences) for msg_type, sequences in self.by_type.items()}
+
+    def peer_counts(self) -> dict[PeerId, int]:
+        return {peer: len(sequences) for peer, sequences in self.by_peer.items()}
+
+    def monitoring_type_counts(self) -> dict[str, int]:
+        return {mon_type.name: len(sequences) for mon_type, sequences in self.by_monitoring_type.items()}
+
+    # capture sequences matching all the given keys, in capture order
+    def sequences(self, msg_type: MessageType = None, peer: PeerId = None,
+                  mon_type: MonitoringType = None) -> Sequence[int]:
+        keyed = [(index, key) for index, key in ((self.by_type, msg_type), (self.by_peer, peer),
+                                                 (self.by_monitoring_type, mon_type)) if key is not None]
+        if not keyed:
+            return range(self.count)
+        # intersect starting from the smallest slice
+        slices = sorted((index.get(key, array("L")) for index, key in keyed), key=len)
+        if len(slices) == 1:
+            return slices[0]
+        others = [set(other) for other in slices[1:]]
+        return array("L", (seq for seq in slices[0] if all(seq in other for other in others)))
+
+    # packets of a slice from packets stored by capture sequence (e.g. a list of the whole capture)
+    def select(self, packets: Sequence[BmpPacket], msg_type: MessageType = None, peer: PeerId = None,
+               mon_type: MonitoringType = None) -> Iterator[BmpPacket]:
+        return (packets[seq] for seq in self.sequences(msg_type=msg_type, peer=peer, mon_type=mon_type))
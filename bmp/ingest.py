@@ -0,0 +1,203 @@
+from typing import Iterator, Optional
+
+from bmp import tshark
+from bmp.bmp import BmpPacket, project_layer
+from bmp.cache import Cache, CachedCapture
+from bmp.decoder import decode_bmp
+from bmp.filters import PacketFilter
+from bmp.flows import FlowTable
+from bmp.parallel import decode_parallel
+from bmp.pcap import BmpMessage, TcpReassembly, iter_bmp_messages
+
+# capture backends, each one reads a pcap and yields BmpPacket in capture order
+
+
+# capture sequence of the first BMP message of each frame carrying one, from the native TCP reassembly without
+# decoding, so that the tshark backends number the messages of the frames a display filter keeps like in the whole
+# capture
+def frame_sequences(path: str, port: int) -> dict[int, int]:
+    sequences: dict[int, int] = dict()
+    for seq, message in enumerate(iter_bmp_messages(path, port)):
+        sequences.setdefault(message.frame, seq)
+    return sequences
+
+
+class TsharkCapture:
+    name = "tshark"
+
+    def __init__(self, path: str, port: int, tshark_path: str = None, tshark_args: list[str] = None,
+                 packet_filter: Optional[PacketFilter] = None, **_):
+        # pyshark is only required for this backend
+        import pyshark
+
+        self.path = path
+        self.port = port
+        self.flows = FlowTable()
+        self.decode_as = {f"tcp.port=={port}": "bmp"}
+        self.tshark_args = tshark_args or []
+        self.packet_filter = packet_filter or None
+        # tshark only dissects and sends the frames with a selected message
+        self.display_filter = self.packet_filter.display_filter() if self.packet_filter else None
+        self.pcap = pyshark.FileCapture(path, tshark_path=tshark_path, decode_as=self.decode_as,
+                                        display_filter=self.display_filter, custom_parameters=self.tshark_args)
+
+    def describe(self) -> str:
+        return f"TShark {self.pcap._get_tshark_version()} from {self.pcap._get_tshark_path()}"
+
+    # everything the decoded packets depend on besides the capture content
+    def signature(self) -> dict:
+        return {"backend": self.name, "tshark_version": str(self.pcap._get_tshark_version()),
+                "decode_as": self.decode_as, "tshark_args": self.tshark_args,
+                **({"display_filter": self.display_filter} if self.display_filter else {})}
+
+    def __iter__(self) -> Iterator[BmpPacket]:
+        seq = 0
+        packet_filter = self.packet_filter
+        sequences = frame_sequences(self.path, self.port) if packet_filter else None
+        for frame_id, frame in enumerate(self.pcap):
+            # frames are numbered from 1 by tshark, the filtered out ones are not enumerated
+            if packet_filter:
+                frame_id = int(frame.number) - 1
+                seq = sequences.get(frame_id, seq)
+            if (packets := frame.get_multiple_layers("bmp")) is not None and len(packets) > 0:
+                ip = frame.ip if hasattr(frame, "ip") else frame.ipv6
+                timestamp = float(frame.sniff_timestamp)
+                for frame_seq, packet in enumerate(packets):
+                    flow = self.flows.observe(int(frame.tcp.stream), ip.src, ip.dst, int(frame.tcp.srcport),
+                                              int(frame.tcp.dstport), timestamp)
+                    packet = BmpPacket(capture_sequence=seq, frame=frame_id, frame_sequence=frame_seq,
+                                       frame_bmp_count=len(packets), packet=packet, flow=flow, timestamp=timestamp)
+                    seq += 1
+                    # the other messages of a frame that matched the display filter
+                    if packet_filter and not packet_filter.accepts(packet):
+                        continue
+                    yield packet
+
+
+# tshark without pyshark, see bmp/tshark.py, numbered like the tshark backend
+class TsharkEkCapture:
+    name = "tshark-ek"
+
+    def __init__(self, path: str, port: int, tshark_path: str = None, tshark_args: list[str] = None,
+                 packet_filter: Optional[PacketFilter] = None, **_):
+        self.path = path
+        self.port = port
+        self.flows = FlowTable()
+        self.tshark = tshark.executable(tshark_path)
+        self.tshark_args = tshark_args or []
+        self.packet_filter = packet_filter or None
+        self.display_filter = self.packet_filter.display_filter() if self.packet_filter else None
+        self._version: Optional[str] = None
+
+    @property
+    def version(self) -> str:
+        if self._version is None:
+            self._version = tshark.version(self.tshark)
+        return self._version
+
+    def describe(self) -> str:
+        return f"{self.version} from {self.tshark} in ek mode"
+
+    def signature(self) -> dict:
+        return {"backend": self.name, "tshark_version": self.version, "port": self.port,
+                "tshark_args": self.tshark_args,
+                **({"display_filter": self.display_filter} if self.display_filter else {})}
+
+    def __iter__(self) -> Iterator[BmpPacket]:
+        seq = 0
+        packet_filter = self.packet_filter
+        sequences = frame_sequences(self.path, self.port) if packet_filter else None
+        args = tshark.command(self.tshark, self.path, self.port, self.display_filter, self.tshark_args)
+        for frame in tshark.iter_frames(args):
+            if packet_filter:
+                seq = sequences.get(frame.number - 1, seq)
+            for frame_seq, layer in enumerate(frame.layers):
+                flow = self.flows.observe(frame.stream, frame.src, frame.dst, frame.sport, frame.dport,
+                                          frame.timestamp)
+                packet = BmpPacket(capture_sequence=seq, frame=frame.number - 1, frame_sequence=frame_seq,
+                                   frame_bmp_count=len(frame.layers), packet=layer, flow=flow,
+                                   timestamp=frame.timestamp)
+                seq += 1
+                if packet_filter and not packet_filter.accepts(packet):
+                    continue
+                yield packet
+
+
+class NativeCapture:
+    name = "native"
+
+    def __init__(self, path: str, port: int, jobs: int = 1, packet_filter: Optional[PacketFilter] = None,
+                 reassembly: Optional[TcpReassembly] = None, **_):
+        self.path = path
+        self.port = port
+        self.jobs = jobs
+        self.packet_filter = packet_filter or None
+        self.flows = FlowTable()
+        # TCP streams left open by the previous capture of a rotation, then by this one once read
+        self.reassembly = reassembly if reassembly is not None else TcpReassembly()
+
+    def describe(self) -> str:
+        return f"native decoder on tcp port {self.port}" + (f" with {self.jobs} jobs" if self.jobs > 1 else "") + \
+            (f" keeping {self.packet_filter}" if self.packet_filter else "")
+
+    def signature(self) -> dict:
+        return {"backend": self.name, "port": self.port}
+
+    # (message, capture sequence, frame sequence, frame bmp count) of the messages, numbered like in the whole capture
+    def _numbered(self) -> Iterator[tuple[BmpMessage, int, int, int]]:
+        seq = 0
+        frame_messages: list[BmpMessage] = list()
+
+        # messages are grouped per frame to know the bmp count of each frame
+        def _flush():
+            nonlocal seq
+            for frame_seq, message in enumerate(frame_messages):
+                yield message, seq, frame_seq, len(frame_messages)
+                seq += 1
+            frame_messages.clear()
+
+        for message in iter_bmp_messages(self.path, self.port, self.reassembly):
+            if frame_messages and frame_messages[0].frame != message.frame:
+                yield from _flush()
+            frame_messages.append(message)
+        yield from _flush()
+
+    def __iter__(self) -> Iterator[BmpPacket]:
+        numbered = self._numbered()
+        # messages not selected by their time or headers are not decoded
+        if packet_filter := self.packet_filter:
+            numbered = (item for item in numbered
+                        if packet_filter.accepts_time(item[0].timestamp) and packet_filter.accepts_header(item[0].data))
+        # workers decode the whole messages, otherwise BGP PDUs are decoded by the packets when first read
+        lazy = self.jobs <= 1
+        if not lazy:
+            decoded = decode_parallel(numbered, jobs=self.jobs, data=lambda item: item[0].data)
+        else:
+            decoded = ((item, project_layer(decode_bmp(item[0].data, bgp=False), bgp=False)) for item in numbered)
+
+        for (message, seq, frame_seq, frame_bmp_count), values in decoded:
+            packet = BmpPacket(capture_sequence=seq, frame=message.frame, frame_sequence=frame_seq,
+                               frame_bmp_count=frame_bmp_count, values=values, timestamp=message.timestamp,
+                               data=message.data if lazy else None)
+            if packet_filter and not packet_filter.accepts_routes(packet):
+                continue
+            packet.flow = self.flows.observe(message.stream, *message.session, message.timestamp)
+            yield packet
+
+
+BACKENDS = {backend.name: backend for backend in (TsharkCapture, TsharkEkCapture, NativeCapture)}
+
+
+# `reassembly` carries the TCP streams over from the previous capture of a rotation, the capture is then not cached
+def open_capture(backend: str, path: str, port: int, tshark_path: str = None, tshark_args: list[str] = None,
+                 cache: Optional[Cache] = None, jobs: int = 1, packet_filter: Optional[PacketFilter] = None,
+                 reassembly: Optional[TcpReassembly] = None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {list(BACKENDS)}")
+    if jobs > 1 and backend != NativeCapture.name:
+        raise ValueError(f"Parallel decoding is only supported by the {NativeCapture.name} backend")
+    if reassembly is not None and (backend != NativeCapture.name or cache is not None):
+        raise ValueError(f"TCP streams are only carried over by the uncached {NativeCapture.name} backend")
+    capture = BACKENDS[backend](path=path, port=int(port), tshark_path=tshark_path, tshark_args=tshark_args,
+                                jobs=jobs, packet_filter=packet_filter, reassembly=reassembly)
+    return capture if cache is None else CachedCapture(capture, cache)
@@ -0,0 +1,127 @@
+import cProfile
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Iterable, Optional
+
+from bmp.engine import Pipeline
+
+# instrumentation of a test run
+# records wall / cpu time and message counts of the ingest, of each check and of each test method,
+# optionally the tracemalloc peak and a cProfile of a sample of the messages, and writes them as a json report
+#
+# the ingest and the checks share a single pass, the ingest time is the time spent getting the next packet
+# from the capture and the time of a check is the time spent in its consume calls
+
+# profiled functions listed in the report
+PROFILE_TOP = 30
+
+
+class Timer:
+    __slots__ = ("wall", "cpu", "count")
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.count = 0
+
+    def to_dict(self) -> dict:
+        return {"wall_seconds": self.wall, "cpu_seconds": self.cpu, "count": self.count}
+
+
+class Instrumentation:
+
+    def __init__(self, path: str, trace_memory: bool = False, profile_interval: int = 0, info: dict = None):
+        self.path = path
+        # description of the run, copied in the report
+        self.info = info or dict()
+        self.trace_memory = trace_memory
+        # one message out of profile_interval is profiled, with its ingest and its checks, none if 0
+        self.profile_interval = profile_interval
+        self.profiler: Optional[cProfile.Profile] = cProfile.Profile() if profile_interval else None
+        self.ingest = Timer()
+        self.setup = Timer()
+        self.tests: dict[str, Timer] = dict()
+        self.pipeline: Optional[Pipeline] = None
+        self.memory_peak: Optional[int] = None
+
+    # run the checks of a pipeline over the packets like Pipeline.run, returns the packet count
+    def run(self, pipeline: Pipeline, packets: Iterable) -> int:
+        self.pipeline = pipeline
+        pipeline.timed = True
+        if self.trace_memory:
+            tracemalloc.start()
+        setup_wall, setup_cpu = time.perf_counter(), time.process_time()
+
+        iterator = iter(packets)
+        ingest, profiler, interval = self.ingest, self.profiler, self.profile_interval
+        while True:
+            sampled = profiler is not None and ingest.count % interval == 0
+            if sampled:
+                profiler.enable()
+            wall, cpu = time.perf_counter(), time.process_time()
+            packet = next(iterator, None)
+            ingest.wall += time.perf_counter() - wall
+            ingest.cpu += time.process_time() - cpu
+            if packet is None:
+                if sampled:
+                    profiler.disable()
+                break
+            ingest.count += 1
+            pipeline.feed(packet)
+            if sampled:
+                profiler.disable()
+        pipeline.finish()
+
+        self.setup.wall, self.setup.cpu = time.perf_counter() - setup_wall, time.process_time() - setup_cpu
+        self.setup.count = ingest.count
+        if self.trace_memory:
+            self.memory_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return pipeline.count
+
+    def start_test(self, name: str) -> None:
+        timer = self.tests[name] = Timer()
+        timer.wall, timer.cpu = -time.perf_counter(), -time.process_time()
+
+    def stop_test(self, name: str) -> None:
+        timer = self.tests[name]
+        timer.wall += time.perf_counter()
+        timer.cpu += time.process_time()
+        timer.count = 1
+
+    def _profile(self) -> dict:
+        profile_path = os.path.splitext(self.path)[0] + ".prof"
+        self.profiler.dump_stats(profile_path)
+        stats = pstats.Stats(self.profiler).stats
+
+        def _entries(key: int) -> list[dict]:
+            return [{"function": f"{os.path.relpath(file) if file.startswith(os.sep) else file}:{line}({name})",
+                     "calls": calls, "tottime": tottime, "cumtime": cumtime}
+                    for (file, line, name), (_, calls, tottime, cumtime, _) in
+                    sorted(stats.items(), key=lambda item: item[1][key], reverse=True)[:PROFILE_TOP]]
+
+        return {"interval": self.profile_interval, "file": profile_path,
+                "by_tottime": _entries(2), "by_cumtime": _entries(3)}
+
+    def report(self) -> dict:
+        report = {
+            **self.info,
+            "setup": self.setup.to_dict(),
+            "ingest": self.ingest.to_dict(),
+            "checks": {check.name: {"wall_seconds": wall, "cpu_seconds": cpu, "count": count}
+                       for check, (wall, cpu, count) in self.pipeline.timings.items()}
+            if self.pipeline is not None else dict(),
+            "tests": {name: timer.to_dict() for name, timer in self.tests.items()},
+        }
+        if self.memory_peak is not None:
+            report["tracemalloc_peak_bytes"] = self.memory_peak
+        if self.profiler is not None:
+            report["profile"] = self._profile()
+        return report
+
+    def write(self) -> None:
+        with open(self.path, "w") as file:
+            json.dump(self.report(), file, indent=2)
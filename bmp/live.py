@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import struct
+import sys
+import time
+from typing import Optional, TextIO
+
+from bmp.bmp import BmpPacket, project_layer
+from bmp.checks import OnlineStatsCheck, PeerTypeCheck, PeerUpCheck, VersionCheck
+from bmp.decoder import decode_bmp
+from bmp.engine import Check, Pipeline
+from bmp.flows import FlowTable
+from bmp.pcap import BMP_HEADER_LEN, BMP_MAX_LENGTH, BMP_MAX_TYPE
+
+# live mode, listens on a TCP port as a stand-in for a BMP collector and runs checks on the messages as they arrive
+# each message is framed, decoded and fed to the checks as soon as it is read, only the checks' state is kept
+# every connection is a session, numbered like a capture's TCP streams
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 1790
+
+# checks that can validate a feed online
+LIVE_CHECKS: list[type[Check]] = [VersionCheck, PeerTypeCheck, OnlineStatsCheck, PeerUpCheck]
+
+
+class LiveCollector:
+
+    def __init__(self, checks: list[Check], output: TextIO = None):
+        self.output = output or sys.stdout
+        self.checks = checks
+        self.pipeline = Pipeline(checks)
+        self.flows = FlowTable()
+        self.session_count = 0
+        self.closed_count = 0
+        # processing time of a message, from its last byte read to the end of the checks
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        for check in checks:
+            check.report = self._report
+
+    def log(self, *args) -> None:
+        print(*args, file=self.output, flush=True)
+
+    def _report(self, check: Check, msg: str) -> None:
+        self.log(f"FAIL {check.name}: {msg}")
+
+    def process(self, stream: int, session: tuple[str, str, int, int], data: bytes) -> BmpPacket:
+        start = time.perf_counter()
+        timestamp = time.time()
+        seq = self.pipeline.count
+        packet = BmpPacket(capture_sequence=seq, frame=seq, frame_sequence=0, frame_bmp_count=1,
+                           values=project_layer(decode_bmp(data, bgp=False), bgp=False), data=data,
+                           flow=self.flows.observe(stream, *session, timestamp), timestamp=timestamp)
+
+        running = [check for check in self.checks if check.error is None]
+        self.pipeline.feed(packet)
+        for check in running:
+            if check.error is not None:
+                self.log(f"ERROR {check.name} disabled: {check.error!r}")
+
+        latency = time.perf_counter() - start
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        return packet
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        stream = self.session_count
+        self.session_count += 1
+        (src, sport), (dst, dport) = writer.get_extra_info("peername")[:2], writer.get_extra_info("sockname")[:2]
+        session = (src, dst, sport, dport)
+        self.log(f"session {stream} {src}:{sport} -> {dst}:{dport} opened")
+
+        try:
+            while True:
+                header = await reader.readexactly(BMP_HEADER_LEN)
+                version, length, msg_type = struct.unpack("!BIB", header)
+                # the stream cannot be framed anymore, give up on the session
+                if version != 3 or msg_type > BMP_MAX_TYPE or not BMP_HEADER_LEN <= length <= BMP_MAX_LENGTH:
+                    self.log(f"FAIL session {stream}: invalid BMP header version={version} type={msg_type} "
+                             f"length={length}, closing")
+                    break
+                self.process(stream, session, header + await reader.readexactly(length - BMP_HEADER_LEN))
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                self.log(f"FAIL session {stream}: closed in the middle of a message")
+        except ConnectionError as e:
+            self.log(f"session {stream} {e!r}")
+        finally:
+            writer.close()
+            self.closed_count += 1
+            self.log(f"session {stream} closed")
+
+    def finish(self) -> None:
+        self.pipeline.finish()
+        count = self.pipeline.count
+        self.log(f"{count} messages over {self.session_count} sessions, "
+                 f"latency avg {self.latency_total / count * 1e6 if count else 0:.0f}us "
+                 f"max {self.latency_max * 1e6:.0f}us")
+        for check in self.checks:
+            status = "ERROR" if check.error is not None else "OK" if check.passed else "FAIL"
+            self.log(f"{status} {check.name}: {check.failure_count} failures"
+                     + (f", {check.error!r}" if check.error is not None else ""))
+
+
+# serve until interrupted, or until `sessions` sessions were closed
+async def serve(collector: LiveCollector, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                sessions: Optional[int] = None) -> None:
+    server = await asyncio.start_server(collector.handle, host, port)
+    collector.log(f"listening on {', '.join(str(sock.getsockname()) for sock in server.sockets)}")
+    async with server:
+        if sessions is None:
+            await server.serve_forever()
+        else:
+            while collector.closed_count < sessions:
+                await asyncio.sleep(0.1)
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="listen for BMP sessions and validate them online")
+    parser.add_argument('-l', '--listen', type=str, default=DEFAULT_HOST, help="address to listen on")
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT, help="tcp port to listen on")
+    parser.add_argument('-s', '--sessions', type=int,
+                        help="stop after this many sessions were closed, run until interrupted otherwise")
+    args = parser.parse_args(args)
+
+    checks = [check() for check in LIVE_CHECKS]
+    collector = LiveCollector(checks)
+    try:
+        asyncio.run(serve(collector, host=args.listen, port=args.port, sessions=args.sessions))
+    except KeyboardInterrupt:
+        pass
+    collector.finish()
+    return 0 if all(check.passed for check in checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
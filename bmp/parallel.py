@@ -0,0 +1,57 @@
+import gc
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from bmp.bmp import project_layer
+from bmp.decoder import decode_bmp
+
+# parallel decoding of a capture
+# TCP reassembly and BMP framing stay in the calling process, they are cheap and sequential by nature,
+# complete BMP messages are then independent and decoded by batches in a process pool
+# results are read back in submission order, numbering is left to the caller so it is globally correct
+
+T = TypeVar("T")
+
+# messages per batch sent to a worker
+BATCH_SIZE = 2048
+# batches in flight per worker, bounds the memory used by pending results
+BATCHES_PER_JOB = 4
+
+
+# workers send back the projected values of the packets, pickled so that the caller controls when they are loaded
+def _decode_batch(batch: list[bytes]) -> bytes:
+    return pickle.dumps([project_layer(decode_bmp(data)) for data in batch], protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# loading a batch creates many small acyclic containers, the collector scanning them costs more than the decoding
+def _load_batch(data: bytes) -> list[tuple]:
+    gc.disable()
+    try:
+        return pickle.loads(data)
+    finally:
+        gc.enable()
+
+
+# items are messages, or carry them when `data` reads their BMP message
+def decode_parallel(messages: Iterable[T], jobs: int, batch_size: int = BATCH_SIZE,
+                    data: Callable[[T], bytes] = lambda message: message.data) -> Iterator[tuple[T, tuple]]:
+    messages = iter(messages)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+
+        def _submit() -> bool:
+            if not (batch := list(islice(messages, batch_size))):
+                return False
+            pending.append((batch, pool.submit(_decode_batch, [data(message) for message in batch])))
+            return True
+
+        while len(pending) < jobs * BATCHES_PER_JOB and _submit():
+            pass
+
+        while pending:
+            batch, future = pending.popleft()
+            _submit()
+            yield from zip(batch, _load_batch(future.result()))
@@ -0,0 +1,397 @@
+import mmap
+import os
+import socket
+import struct
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+# pcap / pcapng reader and TCP reassembly used by the native backend
+
+PCAP_MAGIC_USEC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# pcapng block types
+PCAPNG_IDB = 0x00000001
+PCAPNG_OPB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+
+# link types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+IPPROTO_TCP = 6
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+BMP_HEADER_LEN = 6
+BMP_MAX_LENGTH = 1 << 20
+BMP_MAX_TYPE = 6
+
+# out of order segments kept before giving up on a gap (lost segment in the capture)
+MAX_PENDING_SEGMENTS = 1024
+
+
+@dataclass()
+class Frame:
+    index: int
+    timestamp: float
+    linktype: int
+    data: memoryview
+
+
+@dataclass()
+class TcpSegment:
+    src: bytes
+    dst: bytes
+    sport: int
+    dport: int
+    seq: int
+    flags: int
+    payload: memoryview
+
+
+def _iter_pcap(buf: memoryview) -> Iterator[Frame]:
+    magic = struct.unpack_from("<I", buf, 0)[0]
+    if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+        endian = "<"
+    else:
+        endian = ">"
+        magic = struct.unpack_from(">I", buf, 0)[0]
+    resolution = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+    linktype = struct.unpack_from(endian + "I", buf, 20)[0] & 0x0FFFFFFF
+
+    record = struct.Struct(endian + "IIII")
+    offset, index, size = 24, 0, len(buf)
+    while offset + 16 <= size:
+        ts_sec, ts_frac, incl_len, _ = record.unpack_from(buf, offset)
+        offset += 16
+        yield Frame(index=index, timestamp=ts_sec + ts_frac * resolution, linktype=linktype,
+                    data=buf[offset:offset + incl_len])
+        offset += incl_len
+        index += 1
+
+
+def _iter_pcapng(buf: memoryview) -> Iterator[Frame]:
+    endian = "<"
+    interfaces: list[tuple[int, float, int]] = list()  # (linktype, resolution, ts offset)
+    offset, index, size = 0, 0, len(buf)
+    while offset + 12 <= size:
+        block_type = struct.unpack_from(endian + "I", buf, offset)[0]
+
+        # section header, byte order may change between sections
+        if block_type == PCAPNG_SHB:
+            endian = "<" if struct.unpack_from("<I", buf, offset + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            interfaces = list()
+
+        block_len = struct.unpack_from(endian + "I", buf, offset + 4)[0]
+        if block_len < 12:
+            raise ValueError(f"Invalid pcapng block length {block_len} at offset {offset}")
+        body = offset + 8
+
+        if block_type == PCAPNG_IDB:
+            linktype = struct.unpack_from(endian + "H", buf, body)[0]
+            resolution, ts_offset = 1e-6, 0
+            opt, end = body + 8, offset + block_len - 4
+            while opt + 4 <= end:
+                code, length = struct.unpack_from(endian + "HH", buf, opt)
+                if code == 0:
+                    break
+                if code == 9:  # if_tsresol
+                    tsresol = buf[opt + 4]
+                    resolution = 2.0 ** -(tsresol & 0x7F) if tsresol & 0x80 else 10.0 ** -tsresol
+                elif code == 14:  # if_tsoffset
+                    ts_offset = struct.unpack_from(endian + "q", buf, opt + 4)[0]
+                opt += 4 + ((length + 3) & ~3)
+            interfaces.append((linktype, resolution, ts_offset))
+
+        elif block_type in (PCAPNG_EPB, PCAPNG_OPB):
+            if block_type == PCAPNG_EPB:
+                interface, ts_high, ts_low, caplen = struct.unpack_from(endian + "IIII", buf, body)
+            else:
+                interface, _, ts_high, ts_low, caplen = struct.unpack_from(endian + "HHIII", buf, body)
+            linktype, resolution, ts_offset = interfaces[interface]
+            yield Frame(index=index, timestamp=((ts_high << 32) | ts_low) * resolution + ts_offset,
+                        linktype=linktype, data=buf[body + 20:body + 20 + caplen])
+            index += 1
+
+        elif block_type == PCAPNG_SPB:
+            linktype, _, _ = interfaces[0]
+            orig_len = struct.unpack_from(endian + "I", buf, body)[0]
+            caplen = min(orig_len, block_len - 16)
+            yield Frame(index=index, timestamp=0.0, linktype=linktype, data=buf[body + 4:body + 4 + caplen])
+            index += 1
+
+        offset += block_len
+
+
+# iterate over all the frames of a pcap or pcapng file
+def iter_frames(path: str) -> Iterator[Frame]:
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size < 4:
+            return
+        # frames are views on the mapping, it is unmapped once the last one is released
+        buf = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    if struct.unpack_from("<I", buf, 0)[0] == PCAPNG_SHB:
+        yield from _iter_pcapng(buf)
+    else:
+        yield from _iter_pcap(buf)
+
+
+# get the network layer payload of a frame and its ethertype, None if not IP
+def _network_layer(linktype: int, data: memoryview) -> Optional[tuple[int, memoryview]]:
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None
+        ethertype, offset = struct.unpack_from("!H", data, 12)[0], 14
+        while ethertype in ETHERTYPE_VLAN and len(data) >= offset + 4:
+            ethertype, offset = struct.unpack_from("!H", data, offset + 2)[0], offset + 4
+        return ethertype, data[offset:]
+
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if len(data) < 1:
+            return None
+        return (ETHERTYPE_IPV4 if data[0] >> 4 == 4 else ETHERTYPE_IPV6), data
+
+    if linktype == LINKTYPE_LINUX_SLL:
+        return (struct.unpack_from("!H", data, 14)[0], data[16:]) if len(data) >= 16 else None
+
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return (struct.unpack_from("!H", data, 0)[0], data[20:]) if len(data) >= 20 else None
+
+    if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        if len(data) < 4:
+            return None
+        family = struct.unpack_from("<I" if linktype == LINKTYPE_NULL else "!I", data, 0)[0]
+        if family not in (2, 24, 28, 30):
+            family = struct.unpack_from(">I" if linktype == LINKTYPE_NULL else "<I", data, 0)[0]
+        return (ETHERTYPE_IPV4 if family == 2 else ETHERTYPE_IPV6), data[4:]
+
+    return None
+
+
+# extract the TCP segment of a frame, None if the frame does not carry TCP
+def parse_tcp(linktype: int, data: memoryview) -> Optional[TcpSegment]:
+    if (network := _network_layer(linktype, data)) is None:
+        return None
+    ethertype, ip = network
+
+    if ethertype == ETHERTYPE_IPV4:
+        if len(ip) < 20:
+            return None
+        ihl = (ip[0] & 0x0F) * 4
+        total_len, frag = struct.unpack_from("!H2xH", ip, 2)
+        # skip fragments, tshark only reassembles them with ip.defragment
+        if ip[9] != IPPROTO_TCP or frag & 0x3FFF:
+            return None
+        src, dst = bytes(ip[12:16]), bytes(ip[16:20])
+        tcp = ip[ihl:total_len] if total_len >= ihl else ip[ihl:]
+
+    elif ethertype == ETHERTYPE_IPV6:
+        if len(ip) < 40:
+            return None
+        payload_len = struct.unpack_from("!H", ip, 4)[0]
+        next_header, offset = ip[6], 40
+        end = 40 + payload_len if payload_len else len(ip)
+        while next_header in IPV6_EXTENSION_HEADERS and offset + 2 <= len(ip):
+            next_header, offset = ip[offset], offset + (ip[offset + 1] + 1) * 8
+        if next_header != IPPROTO_TCP:
+            return None
+        src, dst = bytes(ip[8:24]), bytes(ip[24:40])
+        tcp = ip[offset:end]
+
+    else:
+        return None
+
+    if len(tcp) < 20:
+        return None
+    sport, dport, seq, _, offset_flags = struct.unpack_from("!HHIIH", tcp, 0)
+    return TcpSegment(src=src, dst=dst, sport=sport, dport=dport, seq=seq,
+                      flags=offset_flags & 0x3F, payload=tcp[(offset_flags >> 12) * 4:])
+
+
+def format_address(address: bytes) -> str:
+    return socket.inet_ntop(socket.AF_INET if len(address) == 4 else socket.AF_INET6, address)
+
+
+# whether buf[offset:] looks like the start of a BMP v3 message
+def _is_bmp_header(buf: bytearray, offset: int) -> bool:
+    if len(buf) - offset < BMP_HEADER_LEN:
+        return False
+    version, length, msg_type = struct.unpack_from("!BIB", buf, offset)
+    if version != 3 or msg_type > BMP_MAX_TYPE or not BMP_HEADER_LEN <= length <= BMP_MAX_LENGTH:
+        return False
+    # messages with a per-peer header must have a valid peer type
+    if msg_type in (0, 1, 2, 3, 6) and len(buf) - offset > BMP_HEADER_LEN and buf[offset + BMP_HEADER_LEN] > 3:
+        return False
+    return True
+
+
+@dataclass()
+class TcpStream:
+    next_seq: Optional[int] = None
+    # set when the stream position is not known to be on a BMP message boundary
+    resync: bool = True
+    buffer: bytearray = field(default_factory=bytearray)
+    pending: dict[int, bytes] = field(default_factory=dict)
+
+    def _append(self, seq: int, payload) -> None:
+        delta = (seq - self.next_seq) & 0xFFFFFFFF
+        if delta & 0x80000000:  # retransmission or overlap, keep only new bytes
+            overlap = (-delta) & 0xFFFFFFFF
+            if overlap >= len(payload):
+                return
+            payload = payload[overlap:]
+        elif delta:  # out of order, wait for the gap to be filled
+            self.pending[seq] = bytes(payload)
+            return
+        self.buffer += payload
+        self.next_seq = (self.next_seq + len(payload)) & 0xFFFFFFFF
+
+    # feed a segment, returns the complete BMP messages it completed
+    def feed(self, segment: TcpSegment) -> list[bytes]:
+        if segment.flags & TCP_SYN:
+            self.next_seq, self.resync = (segment.seq + 1) & 0xFFFFFFFF, False
+            self.buffer.clear()
+            self.pending.clear()
+            if not segment.payload:
+                return []
+            seq = self.next_seq
+        elif self.next_seq is None:  # capture started mid stream
+            self.next_seq = seq = segment.seq
+        else:
+            seq = segment.seq
+
+        if segment.payload:
+            self._append(seq, segment.payload)
+
+        # a segment was lost, skip the gap and look for the next message
+        if len(self.pending) > MAX_PENDING_SEGMENTS:
+            seq = min(self.pending, key=lambda s: (s - self.next_seq) & 0xFFFFFFFF)
+            self.buffer.clear()
+            self.next_seq, self.resync = seq, True
+            self._append(seq, self.pending.pop(seq))
+
+        # drain out of order segments that are now in sequence
+        while self.pending:
+            ready = [s for s in self.pending if ((s - self.next_seq) & 0xFFFFFFFF) & 0x80000000 or s == self.next_seq]
+            if not ready:
+                break
+            for s in sorted(ready, key=lambda s: (s - self.next_seq) & 0xFFFFFFFF):
+                self._append(s, self.pending.pop(s))
+
+        return self._messages()
+
+    def _messages(self) -> list[bytes]:
+        buf, offset, messages = self.buffer, 0, list()
+        while True:
+            if self.resync:
+                while offset + BMP_HEADER_LEN <= len(buf) and not _is_bmp_header(buf, offset):
+                    offset += 1
+                if offset + BMP_HEADER_LEN > len(buf):
+                    break
+                self.resync = False
+
+            if len(buf) - offset < BMP_HEADER_LEN:
+                break
+            # garbage in the stream, search for the next header
+            if not _is_bmp_header(buf, offset):
+                self.resync = True
+                offset += 1
+                continue
+
+            length = struct.unpack_from("!I", buf, offset + 1)[0]
+            if len(buf) - offset < length:
+                break
+            messages.append(bytes(buf[offset:offset + length]))
+            offset += length
+
+        del buf[:offset]
+        return messages
+
+
+@dataclass()
+class BmpMessage:
+    frame: int
+    timestamp: float
+    # index of the TCP conversation in the capture, like tshark's tcp.stream
+    stream: int
+    # (src, dst, sport, dport) of the TCP direction carrying the message
+    session: tuple[str, str, int, int]
+    data: bytes
+
+
+# TCP streams of the BMP sessions being reassembled, with their buffered bytes
+# carried over from a capture to the next one of a rotation (see bmp/checkpoint.py), so that the messages split
+# across two captures are completed by the next one instead of being lost
+@dataclass()
+class TcpReassembly:
+    streams: dict[tuple[bytes, bytes, int, int], TcpStream] = field(default_factory=dict)
+    # (src, dst, sport, dport) of each stream, formatted
+    sessions: dict[tuple[bytes, bytes, int, int], tuple[str, str, int, int]] = field(default_factory=dict)
+
+    # bytes received and not part of a complete message yet
+    @property
+    def pending_bytes(self) -> int:
+        return sum(len(stream.buffer) + sum(len(segment) for segment in stream.pending.values())
+                   for stream in self.streams.values())
+
+
+# read all BMP messages sent over TCP port `port` in capture order
+# messages belong to the frame carrying their last byte, like tshark reassembly does
+# the streams left open at the end of the capture stay in `reassembly` if given
+def iter_bmp_messages(path: str, port: int, reassembly: Optional[TcpReassembly] = None) -> Iterator[BmpMessage]:
+    reassembly = reassembly if reassembly is not None else TcpReassembly()
+    streams, sessions = reassembly.streams, reassembly.sessions
+    # every TCP conversation is numbered, not only BMP ones, to match tshark's tcp.stream
+    conversations: dict[tuple, int] = dict()
+    closed: set[tuple] = set()
+    stream_count = 0
+
+    for frame in iter_frames(path):
+        if (segment := parse_tcp(frame.linktype, frame.data)) is None:
+            continue
+
+        a, b = (segment.src, segment.sport), (segment.dst, segment.dport)
+        conversation = (a, b) if a <= b else (b, a)
+        if (stream_index := conversations.get(conversation)) is None or \
+                (conversation in closed and segment.flags & (TCP_SYN | TCP_ACK) == TCP_SYN):
+            stream_index = conversations[conversation] = stream_count
+            stream_count += 1
+            closed.discard(conversation)
+        if segment.flags & (TCP_FIN | TCP_RST):
+            closed.add(conversation)
+
+        if segment.sport != port and segment.dport != port:
+            continue
+
+        key = (segment.src, segment.dst, segment.sport, segment.dport)
+        if (stream := streams.get(key)) is None:
+            stream = streams[key] = TcpStream()
+            sessions[key] = (format_address(segment.src), format_address(segment.dst),
+                             segment.sport, segment.dport)
+
+        for data in stream.feed(segment):
+            yield BmpMessage(frame=frame.index, timestamp=frame.timestamp, stream=stream_index,
+                             session=sessions[key], data=data)
+
+        if segment.flags & (TCP_FIN | TCP_RST):
+            del streams[key]
+            del sessions[key]
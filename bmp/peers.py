@@ -0,0 +1,74 @@
+from typing import Optional
+
+from bmp.bmp import BmpPacket, MessageType, PeerId, PeerType
+
+# registry of the peers of a capture, filled at ingest by the pipeline (see bmp/engine.py)
+# each distinct per-peer header identity (peer type, address and distinguisher, like PeerId) is interned once and
+# numbered in order of appearance, packets carry that number and checks key their per-peer state by it instead of
+# building and hashing a PeerId per message, the number is resolved back to the peer when reporting
+
+
+class Peer:
+    __slots__ = ("number", "peer_type", "peer_ip", "peer_rd", "asn", "bgp_id", "vrf_name", "_peer_id")
+
+    def __init__(self, number: int, peer_type: int, peer_ip: str, peer_rd: str, asn: Optional[int],
+                 bgp_id: Optional[str]):
+        self.number = number
+        self.peer_type = peer_type
+        self.peer_ip = peer_ip
+        self.peer_rd = peer_rd
+        # AS and BGP ID of the first per-peer header of the peer, updated by its peer ups
+        self.asn = asn
+        self.bgp_id = bgp_id
+        # VRF / table name TLV of the peer's last peer up that had one
+        self.vrf_name: Optional[str] = None
+        self._peer_id: Optional[PeerId] = None
+
+    # raises ValueError for an unknown peer type, like PeerId.from_packet
+    @property
+    def peer_id(self) -> PeerId:
+        if self._peer_id is None:
+            self._peer_id = PeerId(peer_type=PeerType(self.peer_type), peer_ip=self.peer_ip, peer_rd=self.peer_rd)
+        return self._peer_id
+
+    def to_dict(self) -> dict:
+        return {"number": self.number, "type": self.peer_type, "ip": self.peer_ip, "rd": self.peer_rd,
+                "asn": self.asn, "bgp_id": self.bgp_id, "vrf_name": self.vrf_name}
+
+
+class PeerRegistry:
+
+    def __init__(self):
+        self.peers: list[Peer] = list()
+        # (peer type, address, distinguisher) -> number
+        self.numbers: dict[tuple[int, str, str], int] = dict()
+
+    def __len__(self) -> int:
+        return len(self.peers)
+
+    def __getitem__(self, number: int) -> Peer:
+        return self.peers[number]
+
+    # number of the peer of a packet, None if it has no per-peer header
+    def register(self, packet: BmpPacket) -> Optional[int]:
+        if (peer_type := packet.peer_type) is None:
+            return None
+        key = (peer_type, packet.peer_ip, packet.peer_distinguisher)
+        if (number := self.numbers.get(key)) is None:
+            number = self.numbers[key] = len(self.peers)
+            self.peers.append(Peer(number, *key, asn=packet.peer_asn, bgp_id=packet.peer_bgp_id))
+        if packet.type is MessageType.PeerUp:
+            peer = self.peers[number]
+            peer.asn, peer.bgp_id = packet.peer_asn, packet.peer_bgp_id
+            if (vrf_name := packet.peer_up_tlv_vrf_table_name) is not None:
+                peer.vrf_name = vrf_name
+        return number
+
+    # PeerId of a peer number, None if there is no peer or its type is unknown
+    def peer_id(self, number: Optional[int]) -> Optional[PeerId]:
+        if number is None:
+            return None
+        try:
+            return self.peers[number].peer_id
+        except ValueError:
+            return None
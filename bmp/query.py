@@ -0,0 +1,259 @@
+import argparse
+import ipaddress
+import sys
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from bmp import ingest
+from bmp.bmp import AFI_IPV4, AFI_IPV6, MessageType, MonitoringType, PeerId
+from bmp.events import RouteEvents, RouteHistory
+from bmp.peers import PeerRegistry
+
+# prefix queries over the RIBs reconstructed from a capture
+# the routes of each (peer, monitoring type, afi, rd) are indexed in a radix trie, at the end of the capture or at
+# any capture sequence, which answers longest prefix match, covering (less specific) and covered (more specific)
+# queries
+#
+#   python -m bmp.query <pcap> lookup 10.0.0.1
+#   python -m bmp.query <pcap> covered 10.0.0.0/8 --at 1200 --peer 192.0.2.1
+
+# (peer, monitoring type, afi, rd) of a trie, rd is None for prefixes without RD
+RibKey = tuple[PeerId, MonitoringType, int, Optional[str]]
+
+
+class _Node:
+    __slots__ = ("address", "length", "values", "children")
+
+    def __init__(self, address: int, length: int, values: Optional[list[int]] = None):
+        self.address = address
+        self.length = length
+        # prefix numbers of the routes of the node's prefix, None for the nodes that only branch
+        self.values = values
+        self.children: list[Optional[_Node]] = [None, None]
+
+
+# path compressed binary radix (Patricia) trie of the prefixes of one address family
+# prefixes are (address, length) with the address as an integer of `bits` bits, host bits zero
+class PrefixTrie:
+
+    def __init__(self, bits: int):
+        self.bits = bits
+        self.root = _Node(0, 0)
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _bit(self, address: int, position: int) -> int:
+        return (address >> (self.bits - 1 - position)) & 1
+
+    # whether address is in the prefix of node
+    def _contains(self, node: _Node, address: int) -> bool:
+        return node.length == 0 or (address ^ node.address) >> (self.bits - node.length) == 0
+
+    def _mask(self, address: int, length: int) -> int:
+        return address >> (self.bits - length) << (self.bits - length) if length else 0
+
+    def insert(self, address: int, length: int, value: int) -> None:
+        self.count += 1
+        node = self.root
+        while True:
+            if node.length == length:
+                if node.values is None:
+                    node.values = list()
+                node.values.append(value)
+                return
+            bit = self._bit(address, node.length)
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _Node(address, length, [value])
+                return
+            difference = address ^ child.address
+            common = min(length, child.length,
+                         self.bits - difference.bit_length() if difference else self.bits)
+            if common == child.length:
+                node = child
+                continue
+            # the new prefix and the child diverge (or the new prefix is above the child), insert a node at the fork
+            fork = _Node(address, length, [value]) if common == length else _Node(self._mask(address, common), common)
+            fork.children[self._bit(child.address, common)] = child
+            if common < length:
+                fork.children[self._bit(address, common)] = _Node(address, length, [value])
+            node.children[bit] = fork
+            return
+
+    # nodes with routes whose prefix contains (address, length), least specific first
+    def covering(self, address: int, length: int) -> list[_Node]:
+        nodes, node = list(), self.root
+        while node is not None and node.length <= length and self._contains(node, address):
+            if node.values is not None:
+                nodes.append(node)
+            if node.length == self.bits:
+                break
+            node = node.children[self._bit(address, node.length)]
+        return nodes
+
+    # node with the longest prefix containing (address, length), None if none does
+    def longest_match(self, address: int, length: Optional[int] = None) -> Optional[_Node]:
+        covering = self.covering(address, self.bits if length is None else length)
+        return covering[-1] if covering else None
+
+    # nodes with routes whose prefix is in (address, length), the prefix itself included, in address order
+    def covered(self, address: int, length: int) -> list[_Node]:
+        node = self.root
+        while node is not None and node.length < length:
+            if not self._contains(node, address):
+                return []
+            node = node.children[self._bit(address, node.length)]
+        if node is None or (length and (node.address ^ address) >> (self.bits - length)):
+            return []
+        nodes, stack = list(), [node]
+        while stack:
+            node = stack.pop()
+            if node.values is not None:
+                nodes.append(node)
+            stack.extend(child for child in reversed(node.children) if child is not None)
+        return nodes
+
+
+@dataclass(frozen=True)
+class Route:
+    peer_id: PeerId
+    monitoring_type: MonitoringType
+    prefix: str
+    prefix_len: int
+    path_id: int
+    rd: Optional[str]
+
+    def __str__(self):
+        return f"{self.peer_id.peer_ip} ({self.peer_id.peer_type.name}, rd={self.peer_id.peer_rd}) " \
+               f"{self.monitoring_type.name}: {self.prefix}/{self.prefix_len} path_id={self.path_id} rd={self.rd}"
+
+
+# radix tries of the routes of a history, once the events up to capture sequence `sequence` are applied
+# the peers of the history are numbered by registry
+class RouteIndex:
+
+    def __init__(self, history: RouteHistory, registry: PeerRegistry, sequence: Optional[int] = None):
+        self.history = history
+        self.sequence = sequence
+        self.tries: dict[RibKey, PrefixTrie] = dict()
+        prefixes = history.prefixes
+        for peer, mon_type, number in zip(*(column.tolist() for column in RouteEvents(history.log).routes(sequence))):
+            afi = prefixes.afis[number]
+            key = (registry[peer].peer_id, MonitoringType(mon_type), afi, prefixes.rd(number))
+            if (trie := self.tries.get(key)) is None:
+                trie = self.tries[key] = PrefixTrie(32 if afi == AFI_IPV4 else 128)
+            trie.insert(prefixes.address_value(number), prefixes.lengths[number], number)
+
+    @property
+    def route_count(self) -> int:
+        return sum(len(trie) for trie in self.tries.values())
+
+    def _route(self, key: RibKey, number: int) -> Route:
+        prefixes = self.history.prefixes
+        return Route(peer_id=key[0], monitoring_type=key[1], prefix=prefixes.address(number),
+                     prefix_len=prefixes.lengths[number], path_id=prefixes.path_ids[number], rd=prefixes.rd(number))
+
+    # tries of the address family, optionally of one peer address, monitoring type or rd ("" for no rd)
+    def _tries(self, afi: int, peer_ip: Optional[str], mon_type: Optional[MonitoringType],
+               rd: Optional[str]) -> Iterator[tuple[RibKey, PrefixTrie]]:
+        for key, trie in self.tries.items():
+            if key[2] == afi and (peer_ip is None or key[0].peer_ip == peer_ip) and \
+                    (mon_type is None or key[1] == mon_type) and (rd is None or (key[3] or "") == rd):
+                yield key, trie
+
+    @staticmethod
+    def _parse(prefix: str) -> tuple[int, int, int]:
+        network = ipaddress.ip_network(prefix, strict=False)
+        return AFI_IPV4 if network.version == 4 else AFI_IPV6, int(network.network_address), network.prefixlen
+
+    # most specific route of each RIB containing an address or prefix
+    def longest_match(self, address: str, peer_ip: str = None, mon_type: MonitoringType = None,
+                      rd: str = None) -> list[Route]:
+        afi, value, length = self._parse(address)
+        return [self._route(key, number) for key, trie in self._tries(afi, peer_ip, mon_type, rd)
+                if (node := trie.longest_match(value, length)) is not None for number in node.values]
+
+    # routes containing a prefix, the prefix itself included
+    def covering(self, prefix: str, peer_ip: str = None, mon_type: MonitoringType = None,
+                 rd: str = None) -> list[Route]:
+        afi, value, length = self._parse(prefix)
+        return [self._route(key, number) for key, trie in self._tries(afi, peer_ip, mon_type, rd)
+                for node in trie.covering(value, length) for number in node.values]
+
+    # routes contained in a prefix, the prefix itself included
+    def covered(self, prefix: str, peer_ip: str = None, mon_type: MonitoringType = None,
+                rd: str = None) -> list[Route]:
+        afi, value, length = self._parse(prefix)
+        return [self._route(key, number) for key, trie in self._tries(afi, peer_ip, mon_type, rd)
+                for node in trie.covered(value, length) for number in node.values]
+
+
+# route history of the route monitoring messages of packets and the registry of their peers
+# raises ValueError for a message whose peer type and flags give no monitoring type
+def read_history(packets) -> tuple[RouteHistory, PeerRegistry]:
+    history, registry = RouteHistory(), PeerRegistry()
+    for packet in packets:
+        peer = registry.register(packet)
+        if packet.type == MessageType.RouteMonitoring and packet.nlri is not None:
+            try:
+                history.add(packet, peer)
+            except ValueError as e:
+                raise ValueError(f"route monitoring message {packet.capture_sequence} of peer {packet.peer_ip} "
+                                 f"(rd={packet.peer_distinguisher}): {e}") from e
+    return history, registry
+
+
+QUERIES = {
+    "lookup": (RouteIndex.longest_match, "most specific route of each RIB containing an address or prefix"),
+    "covering": (RouteIndex.covering, "routes containing a prefix"),
+    "covered": (RouteIndex.covered, "routes contained in a prefix"),
+}
+
+
+def _monitoring_type(name: str) -> MonitoringType:
+    try:
+        return MonitoringType[name]
+    except KeyError:
+        raise argparse.ArgumentTypeError(f"unknown monitoring type {name}, expected one of "
+                                         f"{[mon_type.name for mon_type in MonitoringType]}")
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="query the RIBs reconstructed from a capture")
+    parser.add_argument('pcap', type=str, help='pcap file to read')
+    parser.add_argument('-p', '--port', type=int, default=12345, help="tcp port of BMP in the capture")
+    parser.add_argument('-b', '--backend', type=str, choices=list(ingest.BACKENDS), default="native",
+                        help="capture decoder")
+    queries = parser.add_subparsers(dest="query", required=True)
+    for name, (_, description) in QUERIES.items():
+        query = queries.add_parser(name, help=description, description=description)
+        query.add_argument('prefix', type=str, help="address or prefix (e.g. 10.0.0.1 or 10.0.0.0/8)")
+        query.add_argument('--at', type=int, help="capture sequence to query the RIBs at, end of capture if unset")
+        query.add_argument('--peer', type=str, help="only the RIBs of this peer address")
+        query.add_argument('--monitoring-type', type=_monitoring_type,
+                           help=f"only the RIBs of this monitoring type ({', '.join(t.name for t in MonitoringType)})")
+        query.add_argument('--rd', type=str, help="only the routes with this RD, empty for routes without RD")
+    args = parser.parse_args(args)
+
+    try:
+        RouteIndex._parse(args.prefix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        history, registry = read_history(ingest.open_capture(args.backend, args.pcap, port=args.port))
+    except ValueError as e:
+        parser.exit(2, f"{parser.prog}: error: {args.pcap}: {e}\n")
+    index = RouteIndex(history, registry, sequence=args.at)
+    routes: list[Route] = QUERIES[args.query][0](index, args.prefix, peer_ip=args.peer,
+                                                 mon_type=args.monitoring_type, rd=args.rd)
+    for route in routes:
+        print(route)
+    print(f"{len(routes)} routes out of {index.route_count} in {len(index.tries)} RIBs", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import sys
+from typing import Optional
+
+from bmp.live import DEFAULT_HOST, DEFAULT_PORT
+from bmp.pcap import iter_bmp_messages
+
+# replays the BMP messages of a capture into a live listener (see bmp/live.py)
+# each BMP session of the capture is replayed over its own connection, messages are sent in capture order
+
+
+# speed scales the capture timing (2 is twice as fast), messages are sent as fast as possible if None
+async def replay(path: str, capture_port: int, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 speed: Optional[float] = None) -> int:
+    loop = asyncio.get_running_loop()
+    writers: dict[int, asyncio.StreamWriter] = dict()
+    start, first_timestamp = loop.time(), None
+    count = 0
+    try:
+        for message in iter_bmp_messages(path, capture_port):
+            if speed is not None:
+                first_timestamp = message.timestamp if first_timestamp is None else first_timestamp
+                if (delay := start + (message.timestamp - first_timestamp) / speed - loop.time()) > 0:
+                    await asyncio.sleep(delay)
+
+            if (writer := writers.get(message.stream)) is None:
+                _, writer = await asyncio.open_connection(host, port)
+                writers[message.stream] = writer
+            writer.write(message.data)
+            await writer.drain()
+            count += 1
+    finally:
+        for writer in writers.values():
+            writer.close()
+            await writer.wait_closed()
+    return count
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="replay the BMP sessions of a capture to a live listener")
+    parser.add_argument('pcap', type=str, help='pcap file to replay')
+    parser.add_argument('-cp', '--capture-port', type=int, default=12345, help="tcp port of BMP in the capture")
+    parser.add_argument('-H', '--host', type=str, default=DEFAULT_HOST, help="listener address")
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT, help="listener tcp port")
+    parser.add_argument('--speed', type=float,
+                        help="replay following the capture timing scaled by this factor, as fast as possible if unset")
+    args = parser.parse_args(args)
+
+    count = asyncio.run(replay(args.pcap, args.capture_port, host=args.host, port=args.port, speed=args.speed))
+    print(f"replayed {count} messages")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
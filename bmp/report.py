@@ -0,0 +1,85 @@
+import argparse
+import gzip
+import json
+import sys
+from enum import IntEnum
+from typing import Any, Iterator, TextIO
+
+# structured report of the checks, streamed as they produce it instead of being printed as big dumps at the end
+# records are json objects written one per line (NDJSON), gzip compressed if the path ends with .gz
+# every record starts with the check and record names, so the records of a check are found without parsing the others:
+#
+#   {"check":"peerup","record":"state","sequence":12,...}
+#   {"check":"monitoring_summary","record":"prefix","peer":"...","prefix":"10.0.0.0/24, id=0, rd=nNone",...}
+#
+# the human readable summaries of the checks are built back from the report (Check.summary), at the end of a run
+# or later with:
+#
+#   python -m bmp.report <report>
+
+
+class Verbosity(IntEnum):
+    # per peer and per RIB records
+    Summary = 0
+    # and per event and per prefix records
+    Detail = 1
+    # and the timelines of the prefixes
+    Timeline = 2
+
+
+class ReportSink:
+
+    def __init__(self, path: str, verbosity: Verbosity = Verbosity.Detail, timeline_sample: int = 1):
+        self.path = path
+        self.verbosity = verbosity
+        # timelines of one prefix out of timeline_sample are written
+        self.timeline_sample = max(timeline_sample, 1)
+        self.file: TextIO = gzip.open(path, "wt") if path.endswith(".gz") else open(path, "w", buffering=1 << 20)
+        self.count = 0
+
+    def wants(self, verbosity: Verbosity) -> bool:
+        return verbosity <= self.verbosity
+
+    # whether the timeline of a prefix is written, by prefix number so the same prefixes are sampled in every RIB
+    def samples(self, number: int) -> bool:
+        return self.verbosity >= Verbosity.Timeline and number % self.timeline_sample == 0
+
+    def write(self, check: str, record: str, **fields) -> None:
+        self.file.write(json.dumps({"check": check, "record": record, **fields}, default=str, separators=(",", ":")))
+        self.file.write("\n")
+        self.count += 1
+
+    def close(self) -> None:
+        self.file.close()
+
+
+# records of a report, only those of `check` if set
+def read_records(path: str, check: str = None) -> Iterator[dict[str, Any]]:
+    prefix = json.dumps({"check": check}, separators=(",", ":"))[:-1] + "," if check is not None else ""
+    with gzip.open(path, "rt") if path.endswith(".gz") else open(path) as file:
+        for line in file:
+            if line.startswith(prefix):
+                yield json.loads(line)
+
+
+def main(args: list[str] = None) -> int:
+    from bmp.checks import CHECKS
+
+    parser = argparse.ArgumentParser(description="summarize the report of a run")
+    parser.add_argument('report', type=str, help='report file (NDJSON, gzip compressed if .gz)')
+    parser.add_argument('-c', '--check', type=str, action='append', choices=[check.name for check in CHECKS],
+                        help="only summarize this check, can be repeated")
+    args = parser.parse_args(args)
+
+    for check in CHECKS:
+        if args.check and check.name not in args.check:
+            continue
+        lines = list(check.summary(read_records(args.report, check.name)))
+        if lines:
+            print(f"===== {check.name} =====")
+            print("\n".join(lines))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,301 @@
+import socket
+from array import array
+from typing import Iterator, Optional
+
+from bmp.bmp import AFI_IPV4, BgpPduType, BmpPacket, NlriBatch
+
+# memory compact RIB store
+# prefixes are interned once for all the RIBs and numbered, identical path attribute sets are shared and reference
+# counted, and the state of the prefixes of a RIB is kept in array columns with one row per prefix the RIB saw
+#
+# a RIB finds the row of a prefix number in pages of PAGE_SIZE numbers, a page is only allocated once the RIB saw one
+# of its prefixes, so a RIB costs about 17 bytes per prefix it saw instead of a few bytes per prefix of the table
+
+ADDRESS_SIZE = NlriBatch.ADDRESS_SIZE
+
+# Rib.last values
+NOT_SEEN = -1
+WITHDRAWN = BgpPduType.Withdraw.value
+ANNOUNCED = BgpPduType.Update.value
+
+# attribute set number of the prefixes without attributes
+NO_ATTRIBUTES = -1
+
+# prefix numbers per page of the row index of a RIB
+PAGE_SIZE = 1024
+# page entry of the prefixes the RIB did not see
+NO_ROW = -1
+
+# path attributes of a route in the order of their sets, without the framing of the UPDATE (attribute order, flags,
+# type codes and lengths, MP_REACH and MP_UNREACH AFI/SAFI) which depends on how the router packed the attributes
+# and prefixes
+ROUTE_ATTRIBUTES = ("origin", "as_path", "next_hop", "multi_exit_disc", "local_pref", "aggregator_as",
+                    "aggregator_origin", "community", "originator_id", "cluster_list", "mp_reach_nlri_next_hop",
+                    "extended_community", "large_community")
+
+
+# numbers of the interned prefixes (afi, address, prefix length, path id, rd), in order of appearance
+class PrefixNumbers:
+
+    def __init__(self):
+        # packed integer of a prefix -> its number
+        self.numbers: dict[int, int] = dict()
+        self.count = 0
+        # interned RDs, 0 is no RD
+        self.rd_names: list[Optional[str]] = [None]
+        self._rd_numbers: dict[Optional[str], int] = {None: 0}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _rd_number(self, rd: Optional[str]) -> int:
+        if (number := self._rd_numbers.get(rd)) is None:
+            number = self._rd_numbers[rd] = len(self.rd_names)
+            self.rd_names.append(rd)
+        return number
+
+    # a prefix new to the table, the index-th of the batch
+    def _add(self, batch: NlriBatch, index: int, rd_number: int) -> None:
+        pass
+
+    # numbers of the prefixes of a batch, new prefixes are added to the table
+    def intern(self, batch: NlriBatch) -> array:
+        numbers, addresses = self.numbers, batch.addresses
+        rds = batch.rds or (None,) * len(batch)
+        interned = array("i")
+        for index, (afi, length, path_id, rd) in enumerate(zip(batch.afis, batch.lengths, batch.path_ids, rds)):
+            start = index * ADDRESS_SIZE
+            address = int.from_bytes(addresses[start:start + (4 if afi == AFI_IPV4 else ADDRESS_SIZE)], "big")
+            rd_number = self._rd_number(rd) if rd is not None else 0
+            # the common case of no path id and no RD packs into a small integer
+            key = (address << 8 | length) << 1 | (afi != AFI_IPV4)
+            if path_id or rd_number:
+                key |= (rd_number << 32 | path_id) << 137
+            if (number := numbers.get(key)) is None:
+                number = numbers[key] = self.count
+                self.count += 1
+                self._add(batch, index, rd_number)
+            interned.append(number)
+        return interned
+
+
+# interned prefixes with their afi, address, prefix length, path id and rd by number
+class PrefixTable(PrefixNumbers):
+
+    def __init__(self):
+        super().__init__()
+        self.afis = array("B")
+        self.lengths = array("B")
+        self.path_ids = array("I")
+        self.rds = array("H")
+        self.addresses = bytearray()
+
+    def _add(self, batch: NlriBatch, index: int, rd_number: int) -> None:
+        self.afis.append(batch.afis[index])
+        self.lengths.append(batch.lengths[index])
+        self.path_ids.append(batch.path_ids[index])
+        self.rds.append(rd_number)
+        start = index * ADDRESS_SIZE
+        self.addresses += batch.addresses[start:start + ADDRESS_SIZE]
+
+    # address of a prefix as an integer
+    def address_value(self, number: int) -> int:
+        start = number * ADDRESS_SIZE
+        return int.from_bytes(self.addresses[start:start + (4 if self.afis[number] == AFI_IPV4 else ADDRESS_SIZE)],
+                              "big")
+
+    def address(self, number: int) -> str:
+        start = number * ADDRESS_SIZE
+        if self.afis[number] == AFI_IPV4:
+            return socket.inet_ntop(socket.AF_INET, self.addresses[start:start + 4])
+        return socket.inet_ntop(socket.AF_INET6, self.addresses[start:start + ADDRESS_SIZE])
+
+    def rd(self, number: int) -> Optional[str]:
+        return self.rd_names[self.rds[number]]
+
+
+# route attributes of a route monitoring message, shared by the prefixes it announces, None if it announces none
+# every value of the multi-valued fields is kept in order (communities, cluster list...)
+def path_attributes(packet: BmpPacket) -> Optional[dict[str, tuple[str, ...]]]:
+    if not packet.nlri.announced_count:
+        return None
+    return {name: tuple(values) for name in ROUTE_ATTRIBUTES
+            if (values := packet.get_field_values(f"bgp_update_path_attribute_{name}"))}
+
+
+# interned path attribute sets, one shared object per distinct set, freed when no prefix references it anymore
+class AttributeSets:
+
+    def __init__(self):
+        self.sets: list[Optional[dict[str, tuple[str, ...]]]] = list()
+        self.refcounts = array("I")
+        self.numbers: dict[tuple, int] = dict()
+        self._keys: list[Optional[tuple]] = list()
+        self._free: list[int] = list()
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    # number of an attribute set, with `references` more references to it
+    def intern(self, attributes: dict[str, tuple[str, ...]], references: int = 1) -> int:
+        key = tuple(attributes.items())
+        if (number := self.numbers.get(key)) is None:
+            if self._free:
+                number = self._free.pop()
+                self.sets[number], self._keys[number] = attributes, key
+            else:
+                number = len(self.sets)
+                self.sets.append(attributes)
+                self._keys.append(key)
+                self.refcounts.append(0)
+            self.numbers[key] = number
+        self.refcounts[number] += references
+        return number
+
+    def release(self, number: int) -> None:
+        self.refcounts[number] -= 1
+        if self.refcounts[number] == 0:
+            del self.numbers[self._keys[number]]
+            self.sets[number] = self._keys[number] = None
+            self._free.append(number)
+
+    def get(self, number: int) -> Optional[dict[str, tuple[str, ...]]]:
+        return self.sets[number] if number != NO_ATTRIBUTES else None
+
+
+# routes of one RIB (a peer and monitoring type), columns are indexed by the rows of the prefixes, in order of
+# first appearance in the RIB
+class Rib:
+    __slots__ = ("prefixes", "attributes", "pages", "last", "update_counts", "withdraw_counts",
+                 "duplicate_withdraw_counts", "attribute_numbers", "seen_count", "route_count", "eor_count",
+                 "unsupported_count")
+
+    # attribute sets are not tracked if attributes is None
+    def __init__(self, prefixes: PrefixTable, attributes: Optional[AttributeSets] = None):
+        self.prefixes = prefixes
+        self.attributes = attributes
+        # row of each prefix number, by page of PAGE_SIZE numbers, None for the pages of prefixes the RIB never saw
+        self.pages: list[Optional[array]] = list()
+        self.last = array("b")
+        self.update_counts = array("I")
+        self.withdraw_counts = array("I")
+        # duplicate withdraws are rare, only the rows that had some are kept
+        self.duplicate_withdraw_counts: dict[int, int] = dict()
+        self.attribute_numbers = array("i")
+        # prefixes seen and currently announced by the RIB
+        self.seen_count = 0
+        self.route_count = 0
+        self.eor_count = 0
+        # UPDATEs without decoded prefixes that are not End-of-RIBs (see NlriBatch.eor)
+        self.unsupported_count = 0
+
+    # rows of prefix numbers, new rows are added for the prefixes the RIB never saw
+    def _rows(self, numbers: array) -> list[int]:
+        pages, rows = self.pages, list()
+        for number in numbers:
+            page_number, offset = divmod(number, PAGE_SIZE)
+            if page_number >= len(pages):
+                pages.extend((None,) * (page_number + 1 - len(pages)))
+            if (page := pages[page_number]) is None:
+                page = pages[page_number] = array("i", (NO_ROW,)) * PAGE_SIZE
+            if (row := page[offset]) == NO_ROW:
+                row = page[offset] = len(self.last)
+                self.last.append(NOT_SEEN)
+                self.update_counts.append(0)
+                self.withdraw_counts.append(0)
+                self.attribute_numbers.append(NO_ATTRIBUTES)
+            rows.append(row)
+        return rows
+
+    # applies the prefixes of an UPDATE, the announced ones get the attributes of the PDU
+    # returns the prefix numbers of the batch, None for an End-of-RIB or an UPDATE without decoded prefixes
+    def apply(self, batch: NlriBatch, attributes: Optional[dict[str, tuple[str, ...]]]) -> Optional[array]:
+        if not len(batch):
+            if batch.eor:
+                self.eor_count += 1
+            else:
+                self.unsupported_count += 1
+            return None
+
+        numbers = self.prefixes.intern(batch)
+        announced = batch.announced_count
+        attribute_number = self.attributes.intern(attributes, announced) \
+            if announced and self.attributes is not None else NO_ATTRIBUTES
+        last, attribute_numbers = self.last, self.attribute_numbers
+        release = self.attributes.release if self.attributes is not None else None
+
+        for row, pdu_type in zip(self._rows(numbers), batch.pdu_types):
+            previous = last[row]
+            if previous == NOT_SEEN:
+                self.seen_count += 1
+            if (previous_attributes := attribute_numbers[row]) != NO_ATTRIBUTES:
+                release(previous_attributes)
+            if pdu_type == ANNOUNCED:
+                self.update_counts[row] += 1
+                attribute_numbers[row] = attribute_number
+                self.route_count += previous != ANNOUNCED
+            else:
+                self.withdraw_counts[row] += 1
+                attribute_numbers[row] = NO_ATTRIBUTES
+                if previous == ANNOUNCED:
+                    self.route_count -= 1
+                else:
+                    self.duplicate_withdraw_counts[row] = self.duplicate_withdraw_counts.get(row, 0) + 1
+            last[row] = pdu_type
+        return numbers
+
+    # (number, row) of the prefixes seen by the RIB, in table order
+    def _numbered_rows(self) -> Iterator[tuple[int, int]]:
+        for page_number, page in enumerate(self.pages):
+            if page is not None:
+                start = page_number * PAGE_SIZE
+                yield from ((start + offset, row) for offset, row in enumerate(page) if row != NO_ROW)
+
+    # numbers of the prefixes seen by the RIB, in table order
+    def seen(self) -> Iterator[int]:
+        return (number for number, _ in self._numbered_rows())
+
+    # (number, last, update count, withdraw count, duplicate withdraw count, attribute set number) of the prefixes
+    # seen by the RIB, in table order
+    def rows(self) -> Iterator[tuple[int, int, int, int, int, int]]:
+        duplicates = self.duplicate_withdraw_counts
+        return ((number, self.last[row], self.update_counts[row], self.withdraw_counts[row], duplicates.get(row, 0),
+                 self.attribute_numbers[row]) for number, row in self._numbered_rows())
+
+    # numbers of the prefixes currently announced, in table order
+    def routes(self) -> Iterator[int]:
+        last = self.last
+        return (number for number, row in self._numbered_rows() if last[row] == ANNOUNCED)
+
+
+# routes of a RIB that are only counted, a bit per prefix number tells whether the prefix is announced
+class RouteCounter:
+    __slots__ = ("prefixes", "announced", "route_count", "eor_count", "unsupported_count")
+
+    def __init__(self, prefixes: PrefixNumbers):
+        self.prefixes = prefixes
+        self.announced = bytearray()
+        self.route_count = 0
+        self.eor_count = 0
+        self.unsupported_count = 0
+
+    # applies the prefixes of an UPDATE, returns their prefix numbers, None for an End-of-RIB or an UPDATE without
+    # decoded prefixes
+    def apply(self, batch: NlriBatch) -> Optional[array]:
+        if not len(batch):
+            if batch.eor:
+                self.eor_count += 1
+            else:
+                self.unsupported_count += 1
+            return None
+
+        numbers = self.prefixes.intern(batch)
+        announced = self.announced
+        if (missing := (max(numbers) >> 3) + 1 - len(announced)) > 0:
+            announced += bytes(missing)
+        for number, pdu_type in zip(numbers, batch.pdu_types):
+            byte, bit = number >> 3, 1 << (number & 7)
+            if (pdu_type == ANNOUNCED) != bool(announced[byte] & bit):
+                announced[byte] ^= bit
+                self.route_count += 1 if pdu_type == ANNOUNCED else -1
+        return numbers
@@ -0,0 +1,167 @@
+import io
+import os
+import shutil
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional
+
+from bmp.bmp import BmpPacket, project_layer
+from bmp.checks import IndicesCheck
+from bmp.decoder import decode_bmp
+from bmp.engine import Check, CheckResult, Pipeline
+from bmp.filters import PacketFilter
+from bmp.flows import Flow, FlowTable
+from bmp.index import PacketIndex
+from bmp.pcap import BmpMessage, iter_bmp_messages
+
+# per session processing of a capture
+# a capture mixes the BMP sessions of many routers, the state of a session's peers only depends on its own messages
+# messages are framed and numbered in the calling process like the native backend does, sharded by session (TCP
+# stream), then each session is decoded and checked in a worker of a process pool by its own instances of the checks
+# so peer states, RIBs and statistics are scoped to the session (two routers may report the same PeerId)
+# the results are merged in session order into the checks of the caller, whose logs are then one section per session
+#
+# the messages of each session are appended to a spool file as they are framed, and read back one by one by the
+# worker checking the session, so the capture is never held in memory
+
+
+# (capture sequence, frame, frame sequence, frame bmp count, timestamp, message) of a message of a session
+Row = tuple[int, int, int, int, float, bytes]
+# spooled row header, the message length follows the timestamp then the message
+_ROW_HEADER = struct.Struct("!IIIIdI")
+
+
+@dataclass
+class Session:
+    stream: int
+    # (src, dst, sport, dport) of the TCP direction carrying the messages
+    session: tuple[str, str, int, int]
+    # spool file of the rows
+    path: str
+    count: int = 0
+
+
+def _write_row(file: BinaryIO, row: Row) -> None:
+    file.write(_ROW_HEADER.pack(*row[:5], len(row[5])))
+    file.write(row[5])
+
+
+def read_rows(session: Session) -> Iterator[Row]:
+    with open(session.path, "rb") as file:
+        while header := file.read(_ROW_HEADER.size):
+            *row, length = _ROW_HEADER.unpack(header)
+            yield *row, file.read(length)
+
+
+@dataclass
+class SessionResult:
+    stream: int
+    # None if no message of the session was checked
+    flow: Optional[Flow]
+    count: int
+    # peers of the session
+    peer_count: int
+    checks: list[CheckResult]
+    # None once merged into the index of the caller
+    index: Optional[PacketIndex]
+
+    def __str__(self):
+        return str(self.flow) if self.flow is not None else f"stream {self.stream}"
+
+
+# messages of a capture by session spooled to files in `directory`, in order of the first message of each session
+# messages not selected by their time or headers are numbered but left out
+def shard(path: str, port: int, directory: str, packet_filter: Optional[PacketFilter] = None) -> list[Session]:
+    sessions: dict[int, Session] = dict()
+    spools: dict[int, BinaryIO] = dict()
+    seq = 0
+    frame_messages: list[BmpMessage] = list()
+
+    # messages are grouped per frame to know the bmp count of each frame
+    def _flush():
+        nonlocal seq
+        for frame_seq, message in enumerate(frame_messages):
+            if packet_filter and not (packet_filter.accepts_time(message.timestamp) and
+                                      packet_filter.accepts_header(message.data)):
+                seq += 1
+                continue
+            if (session := sessions.get(message.stream)) is None:
+                session = sessions[message.stream] = Session(stream=message.stream, session=message.session,
+                                                             path=os.path.join(directory, f"{message.stream}.rows"))
+                spools[message.stream] = open(session.path, "wb")
+            _write_row(spools[message.stream],
+                       (seq, message.frame, frame_seq, len(frame_messages), message.timestamp, message.data))
+            session.count += 1
+            seq += 1
+        frame_messages.clear()
+
+    try:
+        for message in iter_bmp_messages(path, int(port)):
+            if frame_messages and frame_messages[0].frame != message.frame:
+                _flush()
+            frame_messages.append(message)
+        _flush()
+    finally:
+        for spool in spools.values():
+            spool.close()
+    return list(sessions.values())
+
+
+# decode and check the messages of a session with new instances of the checks
+def run_session(check_types: list[type[Check]], session: Session,
+                packet_filter: Optional[PacketFilter] = None) -> SessionResult:
+    flows = FlowTable()
+    checks = [check(output=io.StringIO()) for check in check_types]
+    for check in checks:
+        if isinstance(check, IndicesCheck):
+            # prefix ranges leave out some of the rows
+            if packet_filter:
+                check.filtered = True
+            else:
+                check.expected = (row[0] for row in read_rows(session))
+    index = PacketIndex()
+    pipeline = Pipeline(checks, index=index)
+    for seq, frame, frame_seq, frame_bmp_count, timestamp, data in read_rows(session):
+        packet = BmpPacket(capture_sequence=seq, frame=frame, frame_sequence=frame_seq, frame_bmp_count=frame_bmp_count,
+                           values=project_layer(decode_bmp(data, bgp=False), bgp=False), data=data, timestamp=timestamp)
+        if packet_filter and not packet_filter.accepts_routes(packet):
+            continue
+        packet.flow = flows.observe(session.stream, *session.session, timestamp)
+        pipeline.feed(packet)
+    pipeline.finish()
+    return SessionResult(stream=session.stream, flow=flows.get(session.stream), count=pipeline.count,
+                         peer_count=len(pipeline.registry), checks=[check.result() for check in checks], index=index)
+
+
+def _results(check_types: list[type[Check]], sessions: list[Session], jobs: int,
+             packet_filter: Optional[PacketFilter]) -> Iterator[SessionResult]:
+    if jobs <= 1:
+        yield from (run_session(check_types, session, packet_filter) for session in sessions)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # longest sessions first so that a long session does not start last
+        futures = {session.stream: pool.submit(run_session, check_types, session, packet_filter)
+                   for session in sorted(sessions, key=lambda session: session.count, reverse=True)}
+        yield from (futures[session.stream].result() for session in sessions)
+
+
+# run new instances of the checks over each session of a capture in `jobs` processes and merge their results
+# into the checks, and their indexes into index if given
+def run_sessions(path: str, port: int, checks: list[Check], index: Optional[PacketIndex] = None,
+                 jobs: int = 1, packet_filter: Optional[PacketFilter] = None) -> list[SessionResult]:
+    directory = tempfile.mkdtemp(prefix="bmp-sessions-")
+    try:
+        sessions = shard(path, port, directory, packet_filter)
+        results = list()
+        for result in _results([type(check) for check in checks], sessions, jobs, packet_filter):
+            for check, check_result in zip(checks, result.checks):
+                check.merge(check_result, f"session {result}")
+            if index is not None:
+                index.merge(result.index)
+                result.index = None
+            results.append(result)
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
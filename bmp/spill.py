@@ -0,0 +1,306 @@
+import os
+import sqlite3
+import tempfile
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+import numpy as np
+
+from bmp.bmp import NlriBatch
+from bmp.events import RouteEventLog
+from bmp.rib import ANNOUNCED, NO_ATTRIBUTES, NOT_SEEN, AttributeSets, PrefixNumbers, PrefixTable
+
+# disk spilled RIBs, for captures whose RIBs do not fit in memory
+# the prefix numbers of a PrefixTable and the per prefix state of the RIBs are kept in a SQLite database, with an LRU
+# cache of the recently used entries in memory sized by a memory budget
+# modified entries are written back when evicted from the cache, by batches, missing entries are read back one by one
+# route events are appended to the database by batches and only read back whole, by the analytics at the end of a run
+# the prefix table columns (about 24 bytes per prefix) and the attribute sets stay in memory
+#
+# the database is a temporary file removed as soon as it is opened, it goes away with its store or process
+
+# memory budget of the caches of a store
+DEFAULT_BUDGET = 256 << 20
+# estimated memory of a cached entry: key, value, LRU links and dirty mark
+ENTRY_SIZE = 340
+# evicted entries written at once
+WRITE_BATCH = 4096
+# route events written at once
+EVENT_BATCH = 1 << 16
+
+
+# LRU cache over a table of the database, values are lists of the value columns
+class _SpilledTable:
+
+    def __init__(self, connection: sqlite3.Connection, name: str, keys: tuple[str, ...], values: tuple[str, ...],
+                 capacity: int):
+        self.connection = connection
+        self.name = name
+        self.capacity = max(capacity, 1)
+        self.cache: OrderedDict[tuple, list] = OrderedDict()
+        # cached entries not written yet
+        self.dirty: set[tuple] = set()
+        # evicted entries not written yet
+        self.pending: dict[tuple, tuple] = dict()
+        connection.execute(f"CREATE TABLE {name} ({', '.join(keys + values)}, PRIMARY KEY ({', '.join(keys)})) "
+                           f"WITHOUT ROWID")
+        self._select = f"SELECT {', '.join(values)} FROM {name} WHERE {' AND '.join(f'{key} = ?' for key in keys)}"
+        self._insert = f"INSERT OR REPLACE INTO {name} VALUES ({', '.join('?' * (len(keys) + len(values)))})"
+        self.reads = 0
+        self.writes = 0
+
+    def get(self, key: tuple) -> Optional[list]:
+        cache = self.cache
+        if (value := cache.get(key)) is not None:
+            cache.move_to_end(key)
+            return value
+        if (pending := self.pending.pop(key, None)) is not None:
+            value = list(pending)
+            self.dirty.add(key)
+        elif (row := self.connection.execute(self._select, key).fetchone()) is not None:
+            value = list(row)
+            self.reads += 1
+        else:
+            return None
+        cache[key] = value
+        if len(cache) > self.capacity:
+            self._trim()
+        return value
+
+    # value of an entry to be modified by the caller, `default` is added if the entry does not exist
+    # `new` entries are known not to exist and not looked up
+    def update(self, key: tuple, default: list, new: bool = False) -> list:
+        if new or (value := self.get(key)) is None:
+            value = self.cache[key] = default
+            if len(self.cache) > self.capacity:
+                self._trim()
+        self.dirty.add(key)
+        return value
+
+    def _trim(self) -> None:
+        cache, dirty, pending = self.cache, self.dirty, self.pending
+        while len(cache) > self.capacity:
+            key, value = cache.popitem(last=False)
+            if key in dirty:
+                dirty.remove(key)
+                pending[key] = tuple(value)
+        if len(pending) >= WRITE_BATCH:
+            self._write(pending.items())
+            pending.clear()
+
+    def _write(self, entries) -> None:
+        if not entries:
+            return
+        connection = self.connection
+        connection.execute("BEGIN")
+        connection.executemany(self._insert, (key + tuple(value) for key, value in entries))
+        connection.execute("COMMIT")
+        self.writes += 1
+
+    # writes every modified entry, before the table is read directly
+    def flush(self) -> None:
+        cache = self.cache
+        self._write([*self.pending.items(), *((key, cache[key]) for key in self.dirty)])
+        self.pending.clear()
+        self.dirty.clear()
+
+
+# prefix numbers of a PrefixNumbers, keyed by the packed integer of the prefix
+class _SpilledNumbers:
+
+    def __init__(self, table: _SpilledTable):
+        self.table = table
+
+    @staticmethod
+    def _key(key: int) -> tuple[bytes]:
+        return key.to_bytes((key.bit_length() + 7) // 8, "big"),
+
+    def get(self, key: int) -> Optional[int]:
+        value = self.table.get(self._key(key))
+        return value[0] if value is not None else None
+
+    # only called for keys that are not in the table
+    def __setitem__(self, key: int, number: int) -> None:
+        self.table.update(self._key(key), [number], new=True)
+
+
+class SpilledPrefixNumbers(PrefixNumbers):
+
+    def __init__(self, store: "SpillStore"):
+        super().__init__()
+        self.numbers = _SpilledNumbers(store.numbers)
+
+
+class SpilledPrefixTable(PrefixTable):
+
+    def __init__(self, store: "SpillStore"):
+        super().__init__()
+        self.numbers = _SpilledNumbers(store.numbers)
+
+
+# RIB whose per prefix state is spilled, same interface as bmp.rib.Rib
+class SpilledRib:
+    __slots__ = ("prefixes", "attributes", "table", "id", "seen_count", "route_count", "eor_count",
+                 "unsupported_count")
+
+    def __init__(self, store: "SpillStore", rib_id: int, prefixes: PrefixTable,
+                 attributes: Optional[AttributeSets] = None):
+        self.prefixes = prefixes
+        self.attributes = attributes
+        # rows are [last, update count, withdraw count, duplicate withdraw count, attribute set number]
+        self.table = store.rows
+        self.id = rib_id
+        self.seen_count = 0
+        self.route_count = 0
+        self.eor_count = 0
+        self.unsupported_count = 0
+
+    def apply(self, batch: NlriBatch, attributes: Optional[dict[str, tuple[str, ...]]]) -> Optional[array]:
+        if not len(batch):
+            if batch.eor:
+                self.eor_count += 1
+            else:
+                self.unsupported_count += 1
+            return None
+
+        # prefixes new to the table have no row in any RIB yet, they are numbered from `new` in order of first
+        # appearance in the batch, a prefix repeated in the batch only gets a row at its first appearance
+        new = len(self.prefixes)
+        numbers = self.prefixes.intern(batch)
+        announced = batch.announced_count
+        attribute_number = self.attributes.intern(attributes, announced) \
+            if announced and self.attributes is not None else NO_ATTRIBUTES
+        release = self.attributes.release if self.attributes is not None else None
+        update, rib_id = self.table.update, self.id
+
+        for number, pdu_type in zip(numbers, batch.pdu_types):
+            row = update((rib_id, number), [NOT_SEEN, 0, 0, 0, NO_ATTRIBUTES], number == new)
+            new += number == new
+            previous = row[0]
+            if previous == NOT_SEEN:
+                self.seen_count += 1
+            if row[4] != NO_ATTRIBUTES:
+                release(row[4])
+            if pdu_type == ANNOUNCED:
+                row[1] += 1
+                row[4] = attribute_number
+                self.route_count += previous != ANNOUNCED
+            else:
+                row[2] += 1
+                row[4] = NO_ATTRIBUTES
+                if previous == ANNOUNCED:
+                    self.route_count -= 1
+                else:
+                    row[3] += 1
+            row[0] = pdu_type
+        return numbers
+
+    def rows(self) -> Iterator[tuple[int, int, int, int, int, int]]:
+        self.table.flush()
+        return self.table.connection.execute(
+            f"SELECT number, last, update_count, withdraw_count, duplicate_withdraw_count, attribute_number "
+            f"FROM {self.table.name} WHERE rib = ? ORDER BY number", (self.id,))
+
+    def seen(self) -> Iterator[int]:
+        return (row[0] for row in self.rows())
+
+    def routes(self) -> Iterator[int]:
+        return (row[0] for row in self.rows() if row[1] == ANNOUNCED)
+
+
+# route event log whose events are appended to the database, same interface as bmp.events.RouteEventLog
+# the columns in memory only hold the events not written yet, each batch is a row of the column bytes
+class SpilledRouteEventLog(RouteEventLog):
+
+    def __init__(self, store: "SpillStore"):
+        super().__init__()
+        self.connection = store.connection
+        self.written = 0
+        self.writes = 0
+        self.connection.execute(f"CREATE TABLE events (batch INTEGER PRIMARY KEY, {', '.join(self.columns)})")
+        self._insert = f"INSERT INTO events ({', '.join(self.columns)}) VALUES ({', '.join('?' * len(self.columns))})"
+
+    def __len__(self) -> int:
+        return self.written + len(self.sequences)
+
+    def record(self, *args) -> None:
+        super().record(*args)
+        if len(self.sequences) >= EVENT_BATCH:
+            self._write()
+
+    def _write(self) -> None:
+        columns = [getattr(self, name) for name in self.columns]
+        if not len(columns[0]):
+            return
+        self.connection.execute(self._insert, [column.tobytes() for column in columns])
+        self.written += len(columns[0])
+        self.writes += 1
+        for column in columns:
+            del column[:]
+
+    def arrays(self) -> tuple[np.ndarray, ...]:
+        self._write()
+        types = [np.dtype(getattr(self, name).typecode) for name in self.columns]
+        batches = self.connection.execute(f"SELECT {', '.join(self.columns)} FROM events ORDER BY batch").fetchall()
+        return tuple(np.concatenate([np.frombuffer(batch[index], dtype=dtype) for batch in batches]) if batches
+                     else np.zeros(0, dtype=dtype) for index, dtype in enumerate(types))
+
+
+# database of the prefix table, RIBs and route events of a check, the cache budget is split between the prefix numbers
+# and the RIB rows
+class SpillStore:
+
+    def __init__(self, directory: Optional[str] = None, budget: int = DEFAULT_BUDGET):
+        fd, path = tempfile.mkstemp(prefix="bmp-rib-", suffix=".sqlite", dir=directory)
+        os.close(fd)
+        # transactions are opened by the batched writes only
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        os.unlink(path)
+        # nothing to recover, the database does not outlive the process
+        for pragma in ("journal_mode=OFF", "synchronous=OFF", "locking_mode=EXCLUSIVE", "temp_store=MEMORY"):
+            self.connection.execute(f"PRAGMA {pragma}")
+        capacity = budget // ENTRY_SIZE
+        self.numbers = _SpilledTable(self.connection, "prefixes", ("key",), ("number",), capacity // 2)
+        self.rows = _SpilledTable(self.connection, "ribs", ("rib", "number"),
+                                  ("last", "update_count", "withdraw_count", "duplicate_withdraw_count",
+                                   "attribute_number"), capacity // 2)
+        self._rib_count = 0
+        self.events: Optional[SpilledRouteEventLog] = None
+
+    def prefix_table(self) -> SpilledPrefixTable:
+        return SpilledPrefixTable(self)
+
+    def prefix_numbers(self) -> SpilledPrefixNumbers:
+        return SpilledPrefixNumbers(self)
+
+    def rib(self, prefixes: PrefixTable, attributes: Optional[AttributeSets] = None) -> SpilledRib:
+        self._rib_count += 1
+        return SpilledRib(self, self._rib_count, prefixes, attributes)
+
+    def event_log(self) -> SpilledRouteEventLog:
+        self.events = SpilledRouteEventLog(self)
+        return self.events
+
+    def stats(self) -> dict[str, Any]:
+        stats = {table.name: {"cached": len(table.cache), "reads": table.reads, "writes": table.writes}
+                 for table in (self.numbers, self.rows)}
+        if self.events is not None:
+            stats["events"] = {"cached": len(self.events.sequences), "writes": self.events.writes}
+        return stats
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+# where and how much the checks keeping RIBs spill, see bmp.checks.RibCheck
+@dataclass
+class SpillConfig:
+    # directory of the databases, the system temporary directory if None
+    directory: Optional[str] = None
+    # memory budget of the caches of each check
+    budget: int = DEFAULT_BUDGET
+
+    def store(self) -> SpillStore:
+        return SpillStore(self.directory, self.budget)
@@ -0,0 +1,136 @@
+import math
+from array import array
+from typing import Optional
+
+import numpy as np
+
+from bmp.bmp import BmpPacket, Statistics, StatisticsType
+
+# time series of the statistics reports of a capture
+# each (peer, statistic, afi, safi) is a series, per-AFI/SAFI statistics have one series per AFI/SAFI
+# reports and their values are appended to array columns, the analytics work on numpy copies of the columns
+
+# (peer number, statistic, afi, safi) of a series, afi and safi are None for global statistics
+# peers are numbered by the packets' registry (see bmp/peers.py)
+SeriesKey = tuple[int, Statistics, Optional[int], Optional[int]]
+
+
+class StatsStore:
+
+    def __init__(self):
+        # one row per report
+        self.sequences = array("I")
+        self.timestamps = array("d")
+        self.frames = array("I")
+        self.frame_sequences = array("H")
+        self.frame_bmp_counts = array("H")
+        # one row per value, values are unsigned 64 bits (gauges are, counters are 32 bits)
+        self.reports = array("I")
+        self.series = array("I")
+        self.values = array("Q")
+        self.series_keys: list[SeriesKey] = list()
+        self._series_numbers: dict[SeriesKey, int] = dict()
+
+    def __len__(self) -> int:
+        return len(self.sequences)
+
+    def add(self, packet: BmpPacket) -> None:
+        report = len(self.sequences)
+        self.sequences.append(packet.capture_sequence)
+        self.timestamps.append(math.nan if packet.timestamp is None else packet.timestamp)
+        self.frames.append(packet.frame)
+        self.frame_sequences.append(packet.frame_sequence)
+        self.frame_bmp_counts.append(packet.frame_bmp_count)
+
+        peer = packet.peer
+        for stat, afi, safi, value in packet.stats:
+            key = (peer, stat, afi, safi)
+            if (number := self._series_numbers.get(key)) is None:
+                number = self._series_numbers[key] = len(self.series_keys)
+                self.series_keys.append(key)
+            self.reports.append(report)
+            self.series.append(number)
+            self.values.append(value)
+
+    # location of a report, like BmpPacket.location_str()
+    def location(self, report: int) -> str:
+        return f"{self.sequences[report]} @ (F{self.frames[report] + 1}:P{self.frame_sequences[report] + 1}" \
+               f"/{self.frame_bmp_counts[report]})"
+
+
+# (series, previous report, previous value, report, value) of a change a statistic's type does not allow
+Violation = tuple[SeriesKey, int, int, int, int]
+
+
+# vectorized analytics over a snapshot of a store
+# values are grouped by series with one stable sort, which keeps report order within a series
+class StatsSeries:
+
+    def __init__(self, store: StatsStore):
+        self.store = store
+        self.timestamps = np.array(store.timestamps)
+        self.reports = np.array(store.reports)
+        self.series = np.array(store.series)
+        self.values = np.array(store.values)
+        self.counters = np.array([stat.type == StatisticsType.Counter for _, stat, _, _ in store.series_keys],
+                                 dtype=bool)
+
+        self._order = np.argsort(self.series, kind="stable")
+        series = self.series[self._order]
+        self._bounds = np.searchsorted(series, np.arange(len(store.series_keys) + 1))
+        # positions (in series order) of the values that follow a value of the same series
+        self._followers = np.flatnonzero(series[1:] == series[:-1]) + 1
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    # counter decreases of all the series at once, in report order
+    def violations(self) -> list[Violation]:
+        order, followers = self._order, self._followers
+        current, previous = order[followers], order[followers - 1]
+        decreased = self.counters[self.series[current]] & (self.values[current] < self.values[previous])
+        current, previous = current[decreased], previous[decreased]
+        ordered = np.argsort(current, kind="stable")
+        return [(self.store.series_keys[series], int(previous_report), int(previous_value), int(report), int(value))
+                for series, previous_report, previous_value, report, value in
+                zip(self.series[current[ordered]].tolist(), self.reports[previous[ordered]].tolist(),
+                    self.values[previous[ordered]].tolist(), self.reports[current[ordered]].tolist(),
+                    self.values[current[ordered]].tolist())]
+
+    # report numbers, timestamps and values of a series, in report order
+    def get(self, number: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        rows = self._order[self._bounds[number]:self._bounds[number + 1]]
+        reports = self.reports[rows]
+        return reports, self.timestamps[reports], self.values[rows]
+
+    # change of a series between consecutive reports and its rate per second
+    def deltas(self, number: int) -> tuple[np.ndarray, np.ndarray]:
+        _, timestamps, values = self.get(number)
+        deltas = np.diff(values.astype(np.int64))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return deltas, deltas / np.diff(timestamps)
+
+    # one column per series of a peer, aligned on the peer's reports, NaN where a report lacks the statistic
+    def table(self, peer: int) -> tuple[np.ndarray, dict[SeriesKey, np.ndarray]]:
+        numbers = [number for number, key in enumerate(self.store.series_keys) if key[0] == peer]
+        reports = np.unique(np.concatenate([self.get(number)[0] for number in numbers])) if numbers \
+            else np.zeros(0, dtype=np.int64)
+        columns = dict()
+        for number in numbers:
+            series_reports, _, values = self.get(number)
+            column = np.full(len(reports), np.nan)
+            column[np.searchsorted(reports, series_reports)] = values
+            columns[self.store.series_keys[number]] = column
+        return reports, columns
+
+    # (key, first value, last value, change, change per second) of each series with at least two values
+    def summary(self) -> list[tuple[SeriesKey, int, int, int, float]]:
+        summary = list()
+        for number, key in enumerate(self.store.series_keys):
+            if self._bounds[number + 1] - self._bounds[number] < 2:
+                continue
+            _, timestamps, values = self.get(number)
+            first, last = int(values[0]), int(values[-1])
+            duration = timestamps[-1] - timestamps[0]
+            summary.append((key, first, last, last - first, (last - first) / duration if duration > 0 else math.nan))
+        return summary
@@ -0,0 +1,307 @@
+import argparse
+import random
+import socket
+import struct
+import sys
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from bmp.bmp import MessageType, PeerType, Statistics
+
+# synthetic BMP captures
+# writes pcaps of BMP sessions from simulated routers: initiation, peer up of each peer, a full table dump
+# per peer and AFI, periodic statistics reports, churn rounds (withdraw then re-announce a share of the table),
+# peer down of each peer and termination
+# the output is deterministic for a given configuration and seed
+
+AFI_IPV4 = 1
+AFI_IPV6 = 2
+SAFI_UNICAST = 1
+
+# BGP path attribute flags
+ATTR_OPTIONAL = 0x80
+ATTR_TRANSITIVE = 0x40
+ATTR_EXTENDED_LENGTH = 0x10
+
+PEER_FLAG_LOC_RIB = 0x80
+
+COLLECTOR_ADDRESS = "198.51.100.1"
+PEER_AS = 65001
+ROUTER_AS = 65000
+
+
+@dataclass()
+class SynthConfig:
+    # BMP sessions, one per router
+    routers: int = 1
+    # monitored peers of each router by peer type
+    peers: dict[PeerType, int] = field(default_factory=lambda: {PeerType.GlobalInstance: 2})
+    # prefixes announced by each peer, by AFI (AFI_IPV4, AFI_IPV6)
+    prefixes: dict[int, int] = field(default_factory=lambda: {AFI_IPV4: 1000})
+    # prefixes in each UPDATE
+    nlris_per_update: int = 1
+    # a statistics report is sent by each peer every stats_interval route monitoring messages, never if 0
+    stats_interval: int = 1000
+    # share of the prefixes of each peer withdrawn then re-announced in each churn round
+    churn: float = 0.0
+    churn_rounds: int = 0
+    seed: int = 0
+    # TCP payload size of the segments
+    mss: int = 1400
+    start_time: float = 1700000000.0
+    # capture time between two frames
+    frame_interval: float = 0.0001
+
+
+# BGP / BMP encoding
+
+def _bgp(msg_type: int, body: bytes) -> bytes:
+    return b"\xff" * 16 + struct.pack("!HB", 19 + len(body), msg_type) + body
+
+
+def _attribute(flags: int, type_code: int, value: bytes) -> bytes:
+    if len(value) > 255:
+        return struct.pack("!BBH", flags | ATTR_EXTENDED_LENGTH, type_code, len(value)) + value
+    return struct.pack("!BBB", flags, type_code, len(value)) + value
+
+
+def _prefix(afi: int, index: int) -> bytes:
+    # index-th /24 from 11.0.0.0 or /64 from 2001:db8::/32
+    if afi == AFI_IPV4:
+        return bytes([24]) + struct.pack("!I", (0x0B000000 + (index << 8)) & 0xFFFFFFFF)[:3]
+    return bytes([64]) + struct.pack("!II", 0x20010DB8, index & 0xFFFFFFFF)
+
+
+def _update(afi: int, announced: list[bytes], withdrawn: list[bytes], next_hop: bytes, as_path: list[int],
+            med: int) -> bytes:
+    attributes = b""
+    if announced:
+        path = struct.pack("!BB", 2, len(as_path)) + b"".join(struct.pack("!I", asn) for asn in as_path)
+        attributes += _attribute(ATTR_TRANSITIVE, 1, b"\x00") + _attribute(ATTR_TRANSITIVE, 2, path)
+        if afi == AFI_IPV4:
+            attributes += _attribute(ATTR_TRANSITIVE, 3, next_hop[-4:])
+        attributes += _attribute(ATTR_OPTIONAL, 4, struct.pack("!I", med))
+    if afi == AFI_IPV4:
+        withdrawn = b"".join(withdrawn)
+        return _bgp(2, struct.pack("!H", len(withdrawn)) + withdrawn + struct.pack("!H", len(attributes)) +
+                    attributes + b"".join(announced))
+    if announced:
+        attributes += _attribute(ATTR_OPTIONAL, 14, struct.pack("!HBB", afi, SAFI_UNICAST, len(next_hop)) +
+                                 next_hop + b"\x00" + b"".join(announced))
+    if withdrawn or not announced:  # a MP_UNREACH without prefixes is an EoR
+        attributes += _attribute(ATTR_OPTIONAL, 15, struct.pack("!HB", afi, SAFI_UNICAST) + b"".join(withdrawn))
+    return _bgp(2, struct.pack("!H", 0) + struct.pack("!H", len(attributes)) + attributes)
+
+
+def _end_of_rib(afi: int) -> bytes:
+    if afi == AFI_IPV4:
+        return _bgp(2, struct.pack("!HH", 0, 0))
+    return _update(afi, [], [], b"", [], 0)
+
+
+def _open(asn: int, bgp_id: bytes, afis: list[int]) -> bytes:
+    capabilities = _capability(65, struct.pack("!I", asn)) + \
+        b"".join(_capability(1, struct.pack("!HBB", afi, 0, SAFI_UNICAST)) for afi in afis)
+    parameters = struct.pack("!BB", 2, len(capabilities)) + capabilities
+    return _bgp(1, struct.pack("!BHH", 4, asn if asn < 1 << 16 else 23456, 90) + bgp_id +
+                bytes([len(parameters)]) + parameters)
+
+
+def _capability(code: int, value: bytes) -> bytes:
+    return struct.pack("!BB", code, len(value)) + value
+
+
+def _tlv(tlv_type: int, value: bytes) -> bytes:
+    return struct.pack("!HH", tlv_type, len(value)) + value
+
+
+def _bmp(msg_type: MessageType, body: bytes) -> bytes:
+    return struct.pack("!BIB", 3, 6 + len(body), msg_type.value) + body
+
+
+@dataclass()
+class _Peer:
+    peer_type: PeerType
+    address: bytes
+    rd: bytes
+    vrf: str
+    # announced prefixes by afi
+    routes: dict[int, set[int]]
+    messages: int = 0
+    rejected: int = 0
+
+    def header(self, timestamp: float) -> bytes:
+        flags = PEER_FLAG_LOC_RIB if self.peer_type == PeerType.LocRibInstance else 0
+        seconds = int(timestamp)
+        return struct.pack("!BB", self.peer_type.value, flags) + self.rd + b"\x00" * 12 + self.address + \
+            struct.pack("!I", PEER_AS) + self.address + struct.pack("!II", seconds, int((timestamp - seconds) * 1e6))
+
+
+class _Router:
+
+    def __init__(self, index: int, config: SynthConfig):
+        self.index = index
+        self.config = config
+        self.count = 0
+        self.address = socket.inet_aton(f"10.{index >> 8 & 0xFF}.{index & 0xFF}.1")
+        self.peers: list[_Peer] = list()
+        for peer_type, count in config.peers.items():
+            for _ in range(count):
+                n = len(self.peers)
+                rd = b"\x00" * 8 if peer_type in (PeerType.GlobalInstance, PeerType.LocRibInstance) \
+                    else struct.pack("!HHI", 0, ROUTER_AS, n + 1)
+                self.peers.append(_Peer(peer_type=peer_type,
+                                        address=socket.inet_aton(f"10.{index >> 8 & 0xFF}.{index & 0xFF}.{n + 2}"),
+                                        rd=rd, vrf="" if peer_type == PeerType.GlobalInstance else f"vrf{n + 1}",
+                                        routes={afi: set() for afi in config.prefixes}))
+
+    def _stats(self, peer: _Peer, timestamp: float) -> bytes:
+        loc_rib = peer.peer_type == PeerType.LocRibInstance
+        total = Statistics.LocalRibRouteCount if loc_rib else Statistics.AdjInRouteCount
+        per_afi = Statistics.LocalRibRouteCountPerAfi if loc_rib else Statistics.AdjInRouteCountPerAfi
+        stats = [struct.pack("!HHI", Statistics.AdjInRejectedPrefixes.iana, 4, peer.rejected),
+                 struct.pack("!HHQ", total.iana, 8, sum(len(routes) for routes in peer.routes.values()))]
+        stats += [struct.pack("!HHHBQ", per_afi.iana, 11, afi, SAFI_UNICAST, len(routes))
+                  for afi, routes in peer.routes.items()]
+        return _bmp(MessageType.StatisticsReport, peer.header(timestamp) + struct.pack("!I", len(stats)) +
+                    b"".join(stats))
+
+    # route monitoring messages of a peer changing the given prefixes, followed by periodic statistics reports
+    def _updates(self, peer: _Peer, afi: int, indexes: list[int], withdraw: bool, med: int,
+                 timestamp: float, rng: random.Random) -> Iterator[bytes]:
+        next_hop = peer.address if afi == AFI_IPV4 else \
+            struct.pack("!IIII", 0x20010DB8, 0, 0, int.from_bytes(peer.address, "big"))
+        for start in range(0, len(indexes), self.config.nlris_per_update):
+            batch = indexes[start:start + self.config.nlris_per_update]
+            prefixes = [_prefix(afi, index) for index in batch]
+            if withdraw:
+                peer.routes[afi].difference_update(batch)
+                update = _update(afi, [], prefixes, next_hop, [], 0)
+            else:
+                peer.routes[afi].update(batch)
+                update = _update(afi, prefixes, [], next_hop, [PEER_AS, 64512 + batch[0] % 1000], med)
+            yield _bmp(MessageType.RouteMonitoring, peer.header(timestamp) + update)
+            peer.messages += 1
+            peer.rejected += rng.random() < 0.01
+            if self.config.stats_interval and peer.messages % self.config.stats_interval == 0:
+                yield self._stats(peer, timestamp)
+
+    def messages(self, timestamp: float) -> Iterator[bytes]:
+        for message in self._messages(timestamp):
+            self.count += 1
+            yield message
+
+    def _messages(self, timestamp: float) -> Iterator[bytes]:
+        config = self.config
+        rng = random.Random(config.seed * 1000003 + self.index)
+        yield _bmp(MessageType.Initiation, _tlv(1, b"synthetic BMP router") + _tlv(2, f"router{self.index}".encode()))
+
+        for n, peer in enumerate(self.peers):
+            body = peer.header(timestamp) + b"\x00" * 12 + self.address + struct.pack("!HH", 179, 40000 + n) + \
+                _open(ROUTER_AS, self.address, list(config.prefixes)) + _open(PEER_AS, peer.address,
+                                                                             list(config.prefixes))
+            if peer.vrf:
+                body += _tlv(3, peer.vrf.encode())
+            yield _bmp(MessageType.PeerUp, body)
+
+        for peer in self.peers:
+            for afi, count in config.prefixes.items():
+                yield from self._updates(peer, afi, list(range(count)), False, 0, timestamp, rng)
+                yield _bmp(MessageType.RouteMonitoring, peer.header(timestamp) + _end_of_rib(afi))
+
+        for churn_round in range(config.churn_rounds):
+            for peer in self.peers:
+                for afi, count in config.prefixes.items():
+                    flapped = sorted(rng.sample(range(count), int(count * config.churn)))
+                    yield from self._updates(peer, afi, flapped, True, 0, timestamp, rng)
+                    yield from self._updates(peer, afi, flapped, False, churn_round + 1, timestamp, rng)
+
+        for peer in self.peers:
+            yield self._stats(peer, timestamp)
+            yield _bmp(MessageType.PeerDown, peer.header(timestamp) + b"\x02" + struct.pack("!H", 0))
+        yield _bmp(MessageType.Termination, _tlv(1, struct.pack("!H", 0)))
+
+
+# pcap writing, Ethernet / IPv4 / TCP, one TCP session per router with segments interleaved between routers
+
+def _frame(file, timestamp: float, src: bytes, dst: bytes, sport: int, dport: int, seq: int, flags: int,
+           payload: bytes) -> None:
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, seq & 0xFFFFFFFF, 0, 5 << 4, flags, 65535, 0, 0) + payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(tcp), 0, 0, 64, 6, 0, src, dst) + tcp
+    ethernet = b"\x02\x00\x00\x00\x00\x02" + b"\x02\x00\x00\x00\x00\x01" + b"\x08\x00" + ip
+    seconds = int(timestamp)
+    file.write(struct.pack("<IIII", seconds, int((timestamp - seconds) * 1e6), len(ethernet), len(ethernet)))
+    file.write(ethernet)
+
+
+def _segments(router: _Router, config: SynthConfig) -> Iterator[bytes]:
+    buffer = bytearray()
+    for message in router.messages(config.start_time):
+        buffer += message
+        while len(buffer) >= config.mss:
+            yield bytes(buffer[:config.mss])
+            del buffer[:config.mss]
+    if buffer:
+        yield bytes(buffer)
+
+
+# returns the number of BMP messages written
+def write_pcap(path: str, config: SynthConfig, port: int = 12345) -> int:
+    routers = [_Router(index, config) for index in range(config.routers)]
+    collector = socket.inet_aton(COLLECTOR_ADDRESS)
+    timestamp = config.start_time
+
+    with open(path, "wb") as file:
+        file.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        sessions = list()
+        for router in routers:
+            sport = 50000 + router.index % 10000
+            _frame(file, timestamp, router.address, collector, sport, port, 999, 0x02, b"")
+            timestamp += config.frame_interval
+            sessions.append([router, sport, 1000, _segments(router, config)])
+
+        while sessions:
+            for session in list(sessions):
+                router, sport, seq, segments = session
+                if (segment := next(segments, None)) is None:
+                    _frame(file, timestamp, router.address, collector, sport, port, seq, 0x11, b"")
+                    sessions.remove(session)
+                else:
+                    _frame(file, timestamp, router.address, collector, sport, port, seq, 0x18, segment)
+                    session[2] += len(segment)
+                timestamp += config.frame_interval
+    return sum(router.count for router in routers)
+
+
+PEER_TYPES = {"global": PeerType.GlobalInstance, "rd": PeerType.RDInstance, "local": PeerType.LocalInstance,
+              "locrib": PeerType.LocRibInstance}
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="write a synthetic BMP capture")
+    parser.add_argument('pcap', type=str, help='output pcap file')
+    parser.add_argument('-p', '--port', type=int, default=12345, help="tcp port of the collector")
+    parser.add_argument('--routers', type=int, default=1, help="BMP sessions")
+    parser.add_argument('--peers', type=str, nargs='*', default=["global=2"],
+                        help=f"peers per router by type, <type>=<count> with type in {list(PEER_TYPES)}")
+    parser.add_argument('--ipv4', type=int, default=1000, help="IPv4 prefixes per peer")
+    parser.add_argument('--ipv6', type=int, default=0, help="IPv6 prefixes per peer")
+    parser.add_argument('--nlris', type=int, default=1, help="prefixes per UPDATE")
+    parser.add_argument('--stats-interval', type=int, default=1000,
+                        help="route monitoring messages between statistics reports of a peer, 0 to disable")
+    parser.add_argument('--churn', type=float, default=0.0, help="share of the prefixes flapped per churn round")
+    parser.add_argument('--churn-rounds', type=int, default=0, help="churn rounds after the table dump")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(args)
+
+    peers = {PEER_TYPES[name]: int(count) for name, count in (peer.split("=") for peer in args.peers)}
+    prefixes = {afi: count for afi, count in ((AFI_IPV4, args.ipv4), (AFI_IPV6, args.ipv6)) if count}
+    config = SynthConfig(routers=args.routers, peers=peers, prefixes=prefixes, nlris_per_update=args.nlris,
+                         stats_interval=args.stats_interval, churn=args.churn, churn_rounds=args.churn_rounds,
+                         seed=args.seed)
+    print(f"wrote {write_pcap(args.pcap, config, port=args.port)} BMP messages to {args.pcap}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Iterator, Optional
+
+from bmp.bmp import FieldLayer
+
+# tshark run directly in Elasticsearch JSON (-T ek) mode, one frame per line read through a pipe
+# only the frame, address and bmp protocol trees are written (-J), the BGP PDUs being dissected within the bmp tree,
+# and only the frames with a bmp message (-Y), so tshark neither builds nor writes the rest of the capture and no
+# PDML tree is parsed
+# ek flattens a protocol tree into fields named <protocol>_<field abbreviation>, a protocol found several times in a
+# frame (e.g. several BMP messages) is a list of trees and a field found several times in a tree a list of values
+#
+# -T fields is not used, it aggregates the values of every BMP message of a frame into one line and they can not be
+# told apart when messages do not carry the same fields
+
+PROTOCOLS = ("frame", "ip", "ipv6", "tcp", "bmp")
+
+
+# the bmp fields are named like the pyshark ones (see bmp.bmp.layer_fields), the ones the projection reads
+def _projected(name: str) -> bool:
+    return name in ("type", "version", "length") or name.startswith(("peer_", "stats_", "bgp_"))
+
+
+def _values(value: Any) -> list[str]:
+    values = value if isinstance(value, list) else [value]
+    return [str(value) for value in values]
+
+
+def _flatten(tree: dict[str, Any], fields: dict[str, list[str]]) -> None:
+    for key, value in tree.items():
+        # protocol trees nested by some tshark versions
+        if isinstance(value, dict) or (isinstance(value, list) and value and isinstance(value[0], dict)):
+            for subtree in (value if isinstance(value, list) else [value]):
+                _flatten(subtree, fields)
+            continue
+        protocol, _, name = key.partition("_")
+        name = name.removeprefix(protocol + "_") if protocol == "bmp" else name
+        if _projected(name):
+            fields.setdefault(sys.intern(name), []).extend(_values(value))
+
+
+# fields of a bmp tree in ek, "bmp_bmp_peer_type" is peer_type and "bgp_bgp_prefix_length" is bgp_prefix_length
+def bmp_layer(tree: dict[str, Any]) -> FieldLayer:
+    fields: dict[str, list[str]] = dict()
+    _flatten(tree, fields)
+    return FieldLayer(fields)
+
+
+def _first(layers: dict[str, Any], protocol: str, name: str) -> Optional[str]:
+    if (tree := layers.get(protocol)) is None:
+        return None
+    # the outer header of tunneled frames
+    tree = tree[0] if isinstance(tree, list) else tree
+    value = tree.get(f"{protocol}_{protocol}_{name}")
+    return str(value[0] if isinstance(value, list) else value) if value is not None else None
+
+
+# frame record of an ek line
+class Frame:
+    __slots__ = ("number", "timestamp", "stream", "src", "dst", "sport", "dport", "layers")
+
+    def __init__(self, layers: dict[str, Any]):
+        self.number = int(_first(layers, "frame", "number"))
+        self.timestamp = float(_first(layers, "frame", "time_epoch"))
+        ip = "ip" if "ip" in layers else "ipv6"
+        self.src, self.dst = _first(layers, ip, "src"), _first(layers, ip, "dst")
+        self.stream = int(_first(layers, "tcp", "stream"))
+        self.sport, self.dport = int(_first(layers, "tcp", "srcport")), int(_first(layers, "tcp", "dstport"))
+        trees = layers.get("bmp") or []
+        self.layers = [bmp_layer(tree) for tree in (trees if isinstance(trees, list) else [trees])]
+
+
+# tshark executable, next to tshark_path like pyshark looks for it, otherwise from the PATH
+def executable(tshark_path: Optional[str] = None) -> str:
+    if tshark_path and os.path.isfile(path := os.path.join(os.path.dirname(tshark_path), "tshark")):
+        return path
+    if (path := shutil.which("tshark")) is None:
+        raise FileNotFoundError(f"tshark not found in {tshark_path or ''} nor in the PATH")
+    return path
+
+
+def version(tshark: str) -> str:
+    return subprocess.run([tshark, "--version"], capture_output=True, text=True, check=True).stdout.splitlines()[0]
+
+
+def command(tshark: str, path: str, port: int, display_filter: Optional[str] = None,
+            tshark_args: list[str] = None) -> list[str]:
+    return [tshark, "-r", path, "-n", "-d", f"tcp.port=={port},bmp", "-T", "ek", "-J", " ".join(PROTOCOLS),
+            "-Y", "bmp" if not display_filter else f"bmp && ({display_filter})", *(tshark_args or [])]
+
+
+# frames of the capture with at least one bmp message, in capture order
+def iter_frames(args: list[str]) -> Iterator[Frame]:
+    # stderr is spooled so that warnings do not block tshark
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr, bufsize=1 << 20)
+    try:
+        for line in process.stdout:
+            record = json.loads(line)
+            # index lines of the bulk api precede each frame
+            if (layers := record.get("layers")) is not None:
+                yield Frame(layers)
+        process.stdout.close()
+        if process.wait() != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"tshark failed with code {process.returncode}: "
+                               f"{stderr.read().decode(errors='replace').strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr.close()
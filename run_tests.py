@@ -2,9 +2,18 @@ import argparse
 import os
 import subprocess
 import sys
+import tempfile
 import json
 
+from bmp.bmp import MessageType, PeerType
+from bmp.cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
+from bmp.filters import PacketFilter, parse_time
+from bmp.report import Verbosity
+from bmp.spill import DEFAULT_BUDGET
+
 DEFAULT_BMP_PORT = 12345
+BACKENDS = ["tshark", "tshark-ek", "native"]
+DEFAULT_INSTRUMENT_REPORT = "instrument.json"
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -17,10 +26,81 @@ if __name__ == '__main__':
                         default=DEFAULT_BMP_PORT)
     parser.add_argument('-ta', '--tsharkargs', type=str,
                         help="arguments for tshark", nargs='*')
+    parser.add_argument('-b', '--backend', type=str, choices=BACKENDS, default=BACKENDS[0],
+                        help="capture decoder: tshark through pyshark, tshark JSON output or the built-in native "
+                             "decoder")
+    parser.add_argument('-c', '--cache', type=str, nargs='?', const=DEFAULT_CACHE_DIR,
+                        help=f"cache decoded captures in a directory (default {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE >> 20,
+                        help="cache size limit in MB, least recently used captures are evicted")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="decode the capture in parallel with this many processes (native backend only)")
+    parser.add_argument('-s', '--sessions', action='store_true',
+                        help="check each BMP session apart, in parallel with --jobs processes (native backend only)")
+    parser.add_argument('-r', '--resume', type=str, metavar='CHECKPOINT',
+                        help="resume the checks from the checkpoint of the previous capture of a rotation")
+    parser.add_argument('-w', '--checkpoint', type=str, metavar='CHECKPOINT',
+                        help="write the check state to a checkpoint after the run, may be the resumed one")
+    parser.add_argument('--spill', type=str, nargs='?', const=tempfile.gettempdir(), metavar='DIR',
+                        help="spill the RIBs of the checks to a database in a directory when they do not fit in "
+                             "memory (default the temporary directory)")
+    parser.add_argument('--memory-budget', type=int, default=DEFAULT_BUDGET >> 20, metavar='MB',
+                        help="memory of the RIB entries cached by each check when spilled, in MB")
+    parser.add_argument('--report', type=str, metavar='PATH',
+                        help="stream the records of the checks to an NDJSON report (gzip compressed if .gz) instead "
+                             "of printing them, their summaries are printed")
+    parser.add_argument('--report-verbosity', type=str, choices=[v.name for v in Verbosity],
+                        default=Verbosity.Detail.name, help="records written to the report")
+    parser.add_argument('--timeline-sample', type=int, default=1, metavar='N',
+                        help="write the timeline of one prefix out of N to the report (Timeline verbosity)")
+    parser.add_argument('-i', '--instrument', type=str, nargs='?', const=DEFAULT_INSTRUMENT_REPORT,
+                        help=f"write timings of the ingest, checks and tests to a json report "
+                             f"(default {DEFAULT_INSTRUMENT_REPORT})")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="record the tracemalloc peak in the instrumentation report, slows the run down")
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+                        help="profile one message out of N in the instrumentation report")
+    # filters, each option can be repeated to select any of its values
+    parser.add_argument('--peer', type=str, action='append', default=[], metavar='IP',
+                        help="only check the messages of the peers with this address")
+    parser.add_argument('--peer-rd', type=str, action='append', default=[], metavar='RD',
+                        help="only check the messages of the peers with this distinguisher "
+                             "(e.g. 00:00:fd:e8:00:00:00:01)")
+    parser.add_argument('--peer-type', type=str, action='append', default=[], choices=[t.name for t in PeerType],
+                        help="only check the messages of the peers of this type")
+    parser.add_argument('--message-type', type=str, action='append', default=[],
+                        choices=[t.name for t in MessageType], help="only check the messages of this type")
+    parser.add_argument('--start', type=parse_time, metavar='TIME',
+                        help="only check the messages captured from this time (epoch seconds or ISO 8601, UTC)")
+    parser.add_argument('--end', type=parse_time, metavar='TIME',
+                        help="only check the messages captured until this time (epoch seconds or ISO 8601, UTC)")
+    parser.add_argument('--prefix', type=str, action='append', default=[], metavar='PREFIX',
+                        help="only check the route monitoring messages with a route in this prefix range")
     parser.add_argument('unittest_args', nargs='*')
 
     args = parser.parse_args()
 
+    # the sessions are checked by workers that are neither instrumented nor cached, checkpointed or reported
+    if args.sessions:
+        for option, value in (("-c/--cache", args.cache), ("-r/--resume", args.resume),
+                              ("-w/--checkpoint", args.checkpoint), ("--report", args.report),
+                              ("-i/--instrument", args.instrument), ("--trace-memory", args.trace_memory),
+                              ("--profile", args.profile)):
+            if value:
+                parser.error(f"{option} is not supported with per session processing (-s)")
+    # the TCP streams carried over by a checkpoint are reassembled by the native backend only
+    if (args.resume or args.checkpoint) and (args.backend != "native" or args.cache):
+        parser.error("checkpoints are only supported by the native backend, without cache")
+    if args.spill and args.checkpoint:
+        parser.error("checkpoints are not supported with spilled RIBs")
+
+    try:
+        packet_filter = PacketFilter(peer_ips=args.peer, peer_rds=args.peer_rd, peer_types=args.peer_type,
+                                     message_types=args.message_type, start=args.start, end=args.end,
+                                     prefixes=args.prefix)
+    except ValueError as e:
+        parser.error(f"invalid filter: {e}")
+
     # Now set the sys.argv to the unittest_args (leaving sys.argv[0] alone)
     sys.argv[1:] = args.unittest_args
 
@@ -29,6 +109,23 @@ if __name__ == '__main__':
         "TSHARK_PATH": getattr(args.tshark, "name", ""),
         "TSHARK_ARGS": json.dumps(args.tsharkargs or []),
         "PCAP_PATH": getattr(args.pcap, "name", ""),
-        "BMP_PORT": str(getattr(args, "port", DEFAULT_BMP_PORT))
+        "BMP_PORT": str(getattr(args, "port", DEFAULT_BMP_PORT)),
+        "BMP_BACKEND": args.backend,
+        "BMP_CACHE_DIR": args.cache or "",
+        "BMP_CACHE_SIZE": str(args.cache_size << 20),
+        "BMP_JOBS": str(args.jobs),
+        "BMP_SESSIONS": str(int(args.sessions)),
+        "BMP_INSTRUMENT": args.instrument or ("" if not (args.trace_memory or args.profile)
+                                              else DEFAULT_INSTRUMENT_REPORT),
+        "BMP_TRACE_MEMORY": str(int(args.trace_memory)),
+        "BMP_PROFILE": str(args.profile),
+        "BMP_FILTER": json.dumps(packet_filter.to_dict()),
+        "BMP_RESUME": args.resume or "",
+        "BMP_CHECKPOINT": args.checkpoint or "",
+        "BMP_SPILL_DIR": args.spill or "",
+        "BMP_MEMORY_BUDGET": str(args.memory_budget << 20),
+        "BMP_REPORT": args.report or "",
+        "BMP_REPORT_VERBOSITY": args.report_verbosity,
+        "BMP_TIMELINE_SAMPLE": str(args.timeline_sample)
     }
     subprocess.call([sys.executable, '-m', 'unittest', *args.unittest_args], env=custom_env)
@@ -2,6 +2,8 @@ import os
 import unittest
 import json
 
+from bmp.filters import PacketFilter
+
 BMP_PORT = os.environ.get("BMP_PORT") or 12345
 PCAP_PATH = os.environ.get("PCAP_PATH") or "~/frr-ribout-testing-20230517_1602.pcap"
 PCAP_PATH = PCAP_PATH if "~/" not in PCAP_PATH else os.path.expanduser(PCAP_PATH)
@@ -11,12 +13,62 @@ TSHARK_PATH = TSHARK_PATH if "~/" not in TSHARK_PATH else os.path.expanduser(TSH
 
 TSHARK_ARGS = json.loads(os.environ.get("TSHARK_ARGS") or "[]") or []
 
+# capture backend, see bmp.ingest.BACKENDS
+BACKEND = os.environ.get("BMP_BACKEND") or "tshark"
+
+# decoded capture cache, disabled if no directory is set
+CACHE_DIR = os.environ.get("BMP_CACHE_DIR") or ""
+CACHE_DIR = CACHE_DIR if "~/" not in CACHE_DIR else os.path.expanduser(CACHE_DIR)
+CACHE_SIZE = int(os.environ.get("BMP_CACHE_SIZE") or 4 << 30)
+
+# decoding processes, native backend only
+JOBS = int(os.environ.get("BMP_JOBS") or 1)
+
+# process the capture per BMP session, native backend only, see bmp/sessions.py
+SESSIONS = bool(int(os.environ.get("BMP_SESSIONS") or 0))
+
+# messages checked, all of them if empty, see bmp/filters.py
+FILTER = PacketFilter.from_dict(json.loads(os.environ.get("BMP_FILTER") or "{}"))
+
+# checkpoint resumed before the run and checkpoint written after it, disabled if empty, see bmp/checkpoint.py
+RESUME = os.environ.get("BMP_RESUME") or ""
+CHECKPOINT = os.environ.get("BMP_CHECKPOINT") or ""
+
+# directory the RIBs of the checks are spilled to, kept in memory if empty, see bmp/spill.py
+SPILL_DIR = os.environ.get("BMP_SPILL_DIR") or ""
+SPILL_DIR = SPILL_DIR if "~/" not in SPILL_DIR else os.path.expanduser(SPILL_DIR)
+MEMORY_BUDGET = int(os.environ.get("BMP_MEMORY_BUDGET") or 256 << 20)
+
+# structured report of the checks, disabled if empty, see bmp/report.py
+REPORT = os.environ.get("BMP_REPORT") or ""
+REPORT_VERBOSITY = os.environ.get("BMP_REPORT_VERBOSITY") or "Detail"
+TIMELINE_SAMPLE = int(os.environ.get("BMP_TIMELINE_SAMPLE") or 1)
+
+# instrumentation report path, disabled if empty, see bmp/instrument.py
+INSTRUMENT = os.environ.get("BMP_INSTRUMENT") or ""
+TRACE_MEMORY = bool(int(os.environ.get("BMP_TRACE_MEMORY") or 0))
+# profile one message out of PROFILE, disabled if 0
+PROFILE = int(os.environ.get("BMP_PROFILE") or 0)
+
 print(f"""
 ==== ENV =====
 TSHARK_PATH = {TSHARK_PATH}
 TSHARK_ARGS = {TSHARK_ARGS}
 TESTDATA_FILENAME = {PCAP_PATH}
 BMP_PORT = {BMP_PORT}
+BACKEND = {BACKEND}
+CACHE_DIR = {CACHE_DIR}
+CACHE_SIZE = {CACHE_SIZE}
+JOBS = {JOBS}
+SESSIONS = {SESSIONS}
+FILTER = {FILTER}
+RESUME = {RESUME}
+CHECKPOINT = {CHECKPOINT}
+SPILL_DIR = {SPILL_DIR}
+MEMORY_BUDGET = {MEMORY_BUDGET}
+REPORT = {REPORT}
+REPORT_VERBOSITY = {REPORT_VERBOSITY}
+INSTRUMENT = {INSTRUMENT}
 ==== ENV =====
 """)
 
@@ -0,0 +1,118 @@
+import ipaddress
+import socket
+import struct
+
+from bmp import synth
+from bmp.bmp import BmpPacket, MessageType, PeerType, Statistics
+from bmp.decoder import decode_bmp
+
+# hand built BMP messages for the focused tests, encoded with the helpers of bmp/synth.py
+
+TIMESTAMP = 1700000000.0
+
+
+def peer(address: str = "10.0.0.2", peer_type: PeerType = PeerType.GlobalInstance, rd: bytes = b"\x00" * 8,
+         vrf: str = "") -> synth._Peer:
+    return synth._Peer(peer_type=peer_type, address=socket.inet_aton(address), rd=rd, vrf=vrf, routes=dict())
+
+
+def prefix(network: str) -> bytes:
+    network = ipaddress.ip_network(network)
+    return bytes([network.prefixlen]) + network.network_address.packed[:(network.prefixlen + 7) // 8]
+
+
+# path attributes of an IPv4 UPDATE: ORIGIN, AS_PATH, NEXT_HOP, then COMMUNITIES if any
+def attributes(as_path: tuple[int, ...] = (synth.PEER_AS,), next_hop: str = "10.0.0.2",
+               communities: tuple[str, ...] = ()) -> bytes:
+    path = struct.pack("!BB", 2, len(as_path)) + b"".join(struct.pack("!I", asn) for asn in as_path)
+    encoded = synth._attribute(synth.ATTR_TRANSITIVE, 1, b"\x00") + \
+        synth._attribute(synth.ATTR_TRANSITIVE, 2, path) + \
+        synth._attribute(synth.ATTR_TRANSITIVE, 3, socket.inet_aton(next_hop))
+    if communities:
+        values = b"".join(struct.pack("!HH", *map(int, community.split(":"))) for community in communities)
+        encoded += synth._attribute(synth.ATTR_OPTIONAL | synth.ATTR_TRANSITIVE, 8, values)
+    return encoded
+
+
+# IPv4 route monitoring message, an End-of-RIB if it has no prefixes
+def route_monitoring(announced: tuple[str, ...] = (), withdrawn: tuple[str, ...] = (), monitored: synth._Peer = None,
+                     **kwargs) -> bytes:
+    monitored = monitored if monitored is not None else peer()
+    withdrawn = b"".join(prefix(network) for network in withdrawn)
+    path_attributes = attributes(**kwargs) if announced else b""
+    update = synth._bgp(2, struct.pack("!H", len(withdrawn)) + withdrawn + struct.pack("!H", len(path_attributes)) +
+                        path_attributes + b"".join(prefix(network) for network in announced))
+    return synth._bmp(MessageType.RouteMonitoring, monitored.header(TIMESTAMP) + update)
+
+
+# IPv6 route monitoring message, prefixes in MP_REACH_NLRI and MP_UNREACH_NLRI
+def mp_route_monitoring(announced: tuple[str, ...] = (), withdrawn: tuple[str, ...] = (),
+                        monitored: synth._Peer = None, next_hop: str = "2001:db8::2") -> bytes:
+    monitored = monitored if monitored is not None else peer()
+    update = synth._update(synth.AFI_IPV6, [prefix(network) for network in announced],
+                           [prefix(network) for network in withdrawn], socket.inet_pton(socket.AF_INET6, next_hop),
+                           [synth.PEER_AS], 10)
+    return synth._bmp(MessageType.RouteMonitoring, monitored.header(TIMESTAMP) + update)
+
+
+# route monitoring message of an UPDATE made of raw withdrawn routes, path attributes and NLRI
+def raw_update(withdrawn: bytes = b"", path_attributes: bytes = b"", nlri: bytes = b"",
+               monitored: synth._Peer = None) -> bytes:
+    monitored = monitored if monitored is not None else peer()
+    update = synth._bgp(2, struct.pack("!H", len(withdrawn)) + withdrawn + struct.pack("!H", len(path_attributes)) +
+                        path_attributes + nlri)
+    return synth._bmp(MessageType.RouteMonitoring, monitored.header(TIMESTAMP) + update)
+
+
+def initiation(sys_descr: str = "synthetic BMP router", sys_name: str = "router0") -> bytes:
+    return synth._bmp(MessageType.Initiation, synth._tlv(1, sys_descr.encode()) + synth._tlv(2, sys_name.encode()))
+
+
+def peer_up(monitored: synth._Peer = None, local: str = "10.0.0.1", vrf: str = "") -> bytes:
+    monitored = monitored if monitored is not None else peer()
+    local = socket.inet_aton(local)
+    body = monitored.header(TIMESTAMP) + b"\x00" * 12 + local + struct.pack("!HH", 179, 40000) + \
+        synth._open(synth.ROUTER_AS, local, [synth.AFI_IPV4]) + \
+        synth._open(synth.PEER_AS, monitored.address, [synth.AFI_IPV4])
+    if vrf:
+        body += synth._tlv(3, vrf.encode())
+    return synth._bmp(MessageType.PeerUp, body)
+
+
+# statistics report of (statistic, value) counters and gauges, and (statistic, afi, value) per AFI gauges
+def statistics(*stats: tuple, monitored: synth._Peer = None) -> bytes:
+    monitored = monitored if monitored is not None else peer()
+    encoded = list()
+    for stat, *value in stats:
+        if len(value) == 2:
+            encoded.append(struct.pack("!HHHBQ", stat.iana, 11, value[0], synth.SAFI_UNICAST, value[1]))
+        elif stat.iana in (Statistics.AdjInRouteCount.iana, Statistics.LocalRibRouteCount.iana):
+            encoded.append(struct.pack("!HHQ", stat.iana, 8, value[0]))
+        else:
+            encoded.append(struct.pack("!HHI", stat.iana, 4, value[0]))
+    return synth._bmp(MessageType.StatisticsReport,
+                      monitored.header(TIMESTAMP) + struct.pack("!I", len(encoded)) + b"".join(encoded))
+
+
+def peer_down(monitored: synth._Peer = None, reason: int = 2, event: int = 0) -> bytes:
+    monitored = monitored if monitored is not None else peer()
+    return synth._bmp(MessageType.PeerDown, monitored.header(TIMESTAMP) + bytes([reason]) + struct.pack("!H", event))
+
+
+def termination(reason: int = 0) -> bytes:
+    return synth._bmp(MessageType.Termination, synth._tlv(1, struct.pack("!H", reason)))
+
+
+# route mirroring message carrying a BGP message (TLV 0)
+def route_mirroring(bgp: bytes, monitored: synth._Peer = None) -> bytes:
+    monitored = monitored if monitored is not None else peer()
+    return synth._bmp(MessageType.RouteMirroring, monitored.header(TIMESTAMP) + synth._tlv(0, bgp))
+
+
+def packet(data: bytes, sequence: int = 0) -> BmpPacket:
+    return BmpPacket(capture_sequence=sequence, frame=sequence, frame_sequence=0, frame_bmp_count=1,
+                     packet=decode_bmp(data), timestamp=TIMESTAMP)
+
+
+def packets(*messages: bytes) -> list[BmpPacket]:
+    return [packet(data, sequence) for sequence, data in enumerate(messages)]
@@ -1,318 +1,166 @@
-import json
+import shutil
+import sys
+import tempfile
 import unittest
 
-import pyshark
-
 import tests.common as common
-from bmp import bmp
-from bmp.bmp import BmpPacket, Nlri, BgpPduType
+from bmp import ingest, sessions
+from bmp.cache import Cache
+from bmp.checkpoint import Checkpoint, load_checkpoint, save_checkpoint
+from bmp.checks import CHECKS, IndicesCheck, RibCheck
+from bmp.engine import Check
+from bmp.index import PacketIndex
+from bmp.instrument import Instrumentation
+from bmp.report import ReportSink, Verbosity, read_records
+from bmp.spill import SpillConfig
 
 
 class BMP(unittest.TestCase):
     file_path: str = None
-    pcap: pyshark.FileCapture = None
-    bmp: list[BmpPacket] = None
+    # checks by name, all fed by a single pass over the capture in setUpClass
+    checks: dict[str, Check] = None
+    # packets by message type, peer and monitoring type, built by the same pass
+    index: PacketIndex = None
+    # timings of the run, if enabled
+    instrumentation: Instrumentation = None
 
     # print test name before running each
     def setUp(self) -> None:
         common.print_test_header(self)
+        if self.instrumentation is not None:
+            self.instrumentation.start_test(self._testMethodName)
 
     @classmethod
     def setUpClass(cls) -> None:
 
         cls.file_path = common.PCAP_PATH
-        cls.pcap = pyshark.FileCapture(common.PCAP_PATH, tshark_path=common.TSHARK_PATH,
-                                       decode_as={f"tcp.port=={common.BMP_PORT}": "bmp"},
-                                       custom_parameters=common.TSHARK_ARGS)
-        print(f"Running TShark {cls.pcap._get_tshark_version()} from {cls.pcap._get_tshark_path()}")
-        cls.bmp = list()
-
-        seq = 0
-        for frame_id, frame in enumerate(cls.pcap):
-            if (packets := frame.get_multiple_layers("bmp")) is not None and len(packets) > 0:
-                for frame_seq, packet in enumerate(packets):
-                    cls.bmp.append(
-                        BmpPacket(capture_sequence=seq, frame=frame_id, frame_sequence=frame_seq,
-                                  frame_bmp_count=len(packets), packet=packet))
-                    seq += 1
+        if common.SPILL_DIR:
+            RibCheck.spill = SpillConfig(common.SPILL_DIR, common.MEMORY_BUDGET)
+        # logs of each check are spooled to disk and printed by its test
+        cls.checks = {check.name: check(output=tempfile.TemporaryFile("w+")) for check in CHECKS}
+        cls.index = PacketIndex()
+        if common.FILTER:
+            print(f"Checking the messages with {common.FILTER}")
+
+        if common.SESSIONS:
+            print(f"Running per session processing with {common.JOBS} jobs")
+            results = sessions.run_sessions(common.PCAP_PATH, common.BMP_PORT, list(cls.checks.values()),
+                                            index=cls.index, jobs=common.JOBS, packet_filter=common.FILTER)
+            print("=== SETUP LOGS ====")
+            print(f"BMP Packet count: {cls.index.count}")
+            print(cls.index.type_counts())
+            print(cls.index.monitoring_type_counts())
+            for result in results:
+                print(f"Session {result}: {result.count} packets, {result.peer_count} peers")
+            print("=== SETUP LOGS ====")
+            print("=== TEST LOGS ====")
+            return
+
+        checkpoint = load_checkpoint(common.RESUME) if common.RESUME else Checkpoint()
+        cache = Cache(common.CACHE_DIR, max_size=common.CACHE_SIZE) if common.CACHE_DIR else None
+        # the TCP streams go on from the previous capture and over to the next one
+        rotated = bool(common.RESUME or common.CHECKPOINT)
+        capture = ingest.open_capture(common.BACKEND, common.PCAP_PATH, port=common.BMP_PORT,
+                                      tshark_path=common.TSHARK_PATH, tshark_args=common.TSHARK_ARGS, cache=cache,
+                                      jobs=common.JOBS, packet_filter=common.FILTER,
+                                      reassembly=checkpoint.reassembly if rotated else None)
+        print(f"Running {capture.describe()}")
+        if common.FILTER:
+            cls.checks[IndicesCheck.name].filtered = True
+        sink = ReportSink(common.REPORT, Verbosity[common.REPORT_VERBOSITY], common.TIMELINE_SAMPLE) \
+            if common.REPORT else None
+        for check in cls.checks.values():
+            check.sink = sink
+
+        if common.RESUME:
+            print(f"Resuming after {checkpoint.count} packets of {', '.join(checkpoint.captures)}")
+        pipeline = checkpoint.resume(list(cls.checks.values()), index=cls.index)
+        packets = checkpoint.renumber(capture) if checkpoint.count else capture
+        if common.INSTRUMENT:
+            cls.instrumentation = Instrumentation(common.INSTRUMENT, trace_memory=common.TRACE_MEMORY,
+                                                  profile_interval=common.PROFILE,
+                                                  info={"pcap": common.PCAP_PATH, "capture": capture.describe()})
+            count = cls.instrumentation.run(pipeline, packets)
+        else:
+            count = pipeline.run(packets)
 
         print("=== SETUP LOGS ====")
-        print(f"BMP Packet count: {seq}")
-        # this is disgustingly inefficient
-        types: dict[bmp.MessageType, int] = {
-            msg_type.name: len(list(filter(lambda bmp_packet: int(bmp_packet.packet.type) == msg_type, cls.bmp))) for
-            msg_type in bmp.MessageType}
-        print(types)
+        print(f"BMP Packet count: {count}")
+        print(cls.index.type_counts())
+        print(cls.index.monitoring_type_counts())
+        print(f"Peers: {len(cls.index.by_peer)}")
+        if common.CHECKPOINT:
+            saved = save_checkpoint(common.CHECKPOINT, pipeline, common.PCAP_PATH, checkpoint, capture.reassembly)
+            print(f"Checkpoint written to {common.CHECKPOINT}, {saved.reassembly.pending_bytes} bytes pending in "
+                  f"{len(saved.reassembly.streams)} TCP streams")
+        if sink is not None:
+            sink.close()
+            print(f"Report of {sink.count} records written to {sink.path}")
+            # summaries are read back from the report, printed with the logs of their check
+            for check in cls.checks.values():
+                for line in check.summary(read_records(sink.path, check.name)):
+                    check.log(line)
         print("=== SETUP LOGS ====")
 
         print("=== TEST LOGS ====")
 
+    # print the logs of a check and report its result
+    def _check(self, name: str) -> None:
+        check = self.checks[name]
+        check.output.seek(0)
+        shutil.copyfileobj(check.output, sys.stdout)
+
+        if check.error is not None:
+            raise check.error
+        self.assertTrue(check.passed, msg=f"{check.failure_count} failures:\n" + "\n".join(check.failures))
+
     # ensure that preprocessing didn't duplicate packets
     def test_indices(self) -> None:
-        # check if list is going from 0 to len(lst) monotonically, incr of 1
-        def _assert_monotone(lst: list):
-            self.assertEqual(len(set(lst)), len(lst))
-            self.assertListEqual(list(range(len(lst))), lst)
-
-        capture_sequences = list(map(lambda p: p.capture_sequence, self.bmp))
-        _assert_monotone(capture_sequences)
+        self._check("indices")
 
     # ensure that the bmp version is the same for the same sessions
     def test_version(self) -> None:
-
-        fail = False
-        sessions = dict()
-        for packet in self.bmp:
-            if packet.type == bmp.MessageType.Initiation:
-                frame = self.pcap[packet.frame]
-                session_id = (frame.ip.dst, frame.ip.src, frame.tcp.port, frame.tcp.dstport)
-                bmp_version = int(packet.version)
-                if sessions.get(session_id) is None:
-                    sessions[session_id] = (packet.capture_sequence, bmp_version)
-
-                # if version changed
-                if sessions[session_id][1] != bmp_version:
-                    print(
-                        f"Version changed from {sessions[session_id][1]} to {bmp_version} on session {str(session_id)}")
-                    fail = True
-
-        self.assertFalse(fail)
+        self._check("version")
 
     def test_peerflags(self) -> None:
-
-        for packet in self.bmp:
-            if packet.peer_header is None:
-                continue
-
-            self.assertTrue(int(packet.peer_flags_reserved or packet.peer_flags_loc_rib_res) == 0)
+        self._check("peerflags")
 
     def test_stats(self) -> None:
+        self._check("stats")
 
-        for packet in self.bmp:
-            if packet.type != bmp.MessageType.StatisticsReport:
-                continue
-
-            peers: dict[
-                bmp.PeerId,
-                dict[str, (bmp.Statistics, int)]
-            ] = dict()
-
-            def _get_stats(peer_id: bmp.PeerId):
-                return peers.setdefault(peer_id, {
-                    stat.name: (stat, None) for stat in bmp.Statistics
-                })
-
-            peer_id = bmp.PeerId.from_packet(packet)
-            peer_stats = _get_stats(peer_id=peer_id)
-            for stat_name in [stat_name for stat_name in peer_stats if stat_name in packet.field_names]:
-                stat = peer_stats[stat_name][0]
-                previous = peer_stats[stat_name][1]
-                next = int(packet.__getattr__(stat_name))
-                if stat.type.check(previous, next):
-                    peer_stats[stat_name] = (stat, next)
-                else:
-                    self.fail(
-                        f"Stat {stat_name} went from {previous} to {next} which is forbidden by its type {stat.type}")
+    # ensure that the reported route counts match the routes announced over route monitoring
+    def test_route_count(self) -> None:
+        self._check("route_count")
 
     # summarize peer up/down state and count ignored messages (received before peer up / after peer down)
     def test_peerup(self) -> None:
-
-        # peer stores
-        # peer ids as key are dataclasses of (Type: bmp.PeerType, IP: str, RD: str) from module bmp
-        # values are dicts with id, type, state, stats etc.
-        peers: dict[
-            bmp.PeerId,
-            dict[str, any]
-        ] = dict()
-
-        vrfs: dict[
-            bmp.PeerId,
-            dict[str, any]
-        ] = dict()
-
-        # get a peer from one of the local peer stores
-        def _get_peer(peer_id: bmp.PeerId):
-            store = vrfs if peer_id.peer_type == bmp.PeerType.LocRibInstance else peers
-            return store.setdefault(peer_id, {
-                "id": peer_id,
-                "type": peer_id.peer_type,
-                "type_name": peer_id.peer_type.name,
-                "state": None,
-                "state_msgs": list(),
-                "stats": dict()
-            })
-
-        # increment a stat for a peer, create it if missing
-        def _incr_stat(peer, stat_name: str):
-            peer["stats"][stat_name] = peer["stats"].setdefault(stat_name, 0) + 1
-
-        print("====== TIMELINE ======")
-        # play the bmp pcap
-        for packet in self.bmp:
-
-            # if a state message this is a new peer state
-            packet_type = packet.type
-
-            # ignore messages with no per-peer header
-            if packet.peer_header is None:
-                continue
-
-            peer_id = bmp.PeerId.from_packet(packet=packet)
-            peer = _get_peer(peer_id)
-            peer_state = peer["state"]
-
-            # got a peer state message, update peer state
-            if packet_type in [bmp.MessageType.PeerUp, bmp.MessageType.PeerDown]:
-                if peer_state == packet_type:
-                    _incr_stat(peer, f"{packet_type.name}_duplicate")
-                    print(f"peer {peer_id} duplicate state {peer_state} {packet.location_str()}")
-                else:
-                    peer["state_msgs"].append(packet.capture_sequence)
-                    peer["state"] = packet_type
-                    _incr_stat(peer, packet_type.name)
-                    print(f"{peer['type_name']} {peer_id} changed state {peer_state} -> {packet_type}")
-
-            # got any other message
-            else:
-                not_up = peer_state != bmp.MessageType.PeerUp
-                _incr_stat(peer, f"{packet_type.name}_ignored" if not_up else packet_type.name)
-
-        print("====== TIMELINE ======\n"
-              "====== SUMMARY PRETTY ======")
-
-        def _pretty_print_peer(peer_id: bmp.PeerId, peer_data: dict[str, any]):
-            print(f"Peer: Type={peer_id.peer_type} IP={peer_id.peer_ip} RD={peer_id.peer_rd}")
-            print(json.dumps(peer_data, default=str, indent=4))
-
-        for peer_id, peer_data in peers.items():
-            _pretty_print_peer(peer_id, peer_data)
-
-        print("====== SUMMARY PRETTY ======\n"
-              "====== SUMMARY RAW ======")
-        print(peers)
-        print(vrfs)
-        print("====== SUMMARY RAW ======")
+        self._check("peerup")
 
     # ensure that the peer type is never 0 when the peer RD is not zero and vice-versa
     def test_peer_type(self) -> None:
-
-        fail = False
-        for packet in self.bmp:
-            if not all(field in packet.field_names for field in ["peer_type", "peer_distinguisher"]):
-                continue
-
-            can_rd = int(packet.peer_type) != bmp.PeerType.GlobalInstance
-            need_rd = int(packet.peer_type) in [bmp.PeerType.RDInstance, bmp.PeerType.LocalInstance]
-            has_rd = packet.peer_distinguisher != "00:00:00:00:00:00:00:00"
-            if (has_rd and not can_rd) or (need_rd and not has_rd):
-                print(f"Packet {packet.capture_sequence} {packet.location_str()}"
-                      f"has invalid type / rd combination")
-                print(f"Message type: {packet.type}, "
-                      f"peer type: {packet.packet.peer_type}. "
-                      f"out: {packet.packet.peer_flags_adj_rib_out}, "
-                      f"post: {packet.packet.peer_flags_post_policy}")
-                fail = True
-
-        self.assertFalse(fail)
+        self._check("peer_type")
 
     def test_monitoring_summary(self) -> None:
-
-        peers: dict[bmp.PeerId, dict[str, any]] = dict()
-
-        def _get_peer(peer_id: bmp.PeerId):
-            return peers.setdefault(peer_id, {
-                "id": peer_id,
-            } | {str(mon_type): dict() for mon_type in bmp.MonitoringType})
-
-        def _update_rib(rib: dict[str, dict[str, any]], packet: bmp.BmpPacket) -> None:
-
-            def _get_prefix(nlri: Nlri) -> dict[str, any]:
-                prefix = f"{nlri.prefix}/{nlri.prefix_len}, id={nlri.prefix_id}, rd=n{nlri.prefix_rd}"
-                return rib.setdefault(prefix, {
-                    # immutable
-                    "prefix": prefix,
-                    "prefix_len": nlri.prefix_len,
-                    "id": nlri.prefix_id,
-                    "rd": nlri.prefix_rd,
-                    # mutable
-                    "update_count": 0,
-                    "withdraw_count": 0,
-                    "duplicate_withdraw_count": 0,
-                    "last": None,  # 0 is withdrawn, 1 is updated
-                    "last_attr": None,  # current attributes if last is 1
-                    "timeline": list(),  # list of (capture_sequence, pdu_type) from packets affecting the prefix
-                })
-
-            nlri, pdu_type = Nlri.from_packet(packet=packet)
-            prefix_info = _get_prefix(nlri=nlri)
-
-            prefix_info["timeline"] += [(packet.capture_sequence, pdu_type)]
-
-            match pdu_type:
-                case BgpPduType.EoR:
-                    prefix_info["update_count"] += 1
-
-                case BgpPduType.Withdraw:
-                    prefix_info["duplicate_withdraw_count"] += 1 if prefix_info["last"] in [0, None] else 0
-                    prefix_info["withdraw_count"] += 1
-                    prefix_info["last"] = 0
-                    prefix_info["last_attr"] = None
-
-                case BgpPduType.Update:
-                    prefix_info["update_count"] += 1
-                    prefix_info["last"] = 1
-                    prefix_info["last_attr"]: dict[str, any] = {
-                        k.replace("bgp_update_path_attribute_", ""): getattr(packet, k, None) for k in
-                        packet.field_names if
-                        k.startswith("bgp_update_path_attribute")
-                    }
-
-        for packet in self.bmp:
-            if packet.type != bmp.MessageType.RouteMonitoring:
-                continue
-
-            peer_id = bmp.PeerId.from_packet(packet=packet)
-            mon_type = bmp.MonitoringType.from_packet(packet=packet)
-            peer = _get_peer(peer_id=peer_id)
-            rib = peer[str(mon_type)]
-            _update_rib(rib=rib, packet=packet)
-
-        print(json.dumps({str(k): v for k, v in peers.items()}, indent=2, default=str))
+        self._check("monitoring_summary")
 
     def test_vrf_table_name_tlv(self) -> None:
+        self._check("vrf_table_name_tlv")
 
-        tlvs = set()
-        rds: dict[str, (str, BmpPacket)] = dict()
-
-        def _get_rd(rd: str, name: str, packet: BmpPacket) -> (str, BmpPacket):
-            return rds.setdefault(rd, (name, packet))
-
-        for packet in self.bmp:
-            rd = packet.peer_distinguisher
-            new = packet.peer_up_tlv_vrf_table_name
-
-            # skip messages that do not contain the tlv
-            if new is None:
-                continue
-
-            current_name, current_packet = _get_rd(rd=rd, name=new, packet=packet)
-
-            self.assertEqual(new, current_name,
-                             msg=f"RD {rd} changed name from {current_name}({current_packet}) to {new}({packet})")
-            tlvs.update(set([field for field in packet.field_names if "tlv" in field]))
-
-        print(rds)
-        print(tlvs)
-
-    # TODO record peer up RD/VRF_NAME and check that all other messages with the same tlv value has the same RD
     # print test name after running each
     def tearDown(self) -> None:
+        if self.instrumentation is not None:
+            self.instrumentation.stop_test(self._testMethodName)
         common.print_test_header(self)
 
     # ran at the end of the test suite
     @classmethod
     def tearDownClass(cls) -> None:
+        for check in cls.checks.values():
+            check.output.close()
         print("==== TEST LOGS ====")
+        if cls.instrumentation is not None:
+            cls.instrumentation.write()
+            print(f"Instrumentation report written to {cls.instrumentation.path}")
 
     if __name__ == '__main__':
         unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from bmp import synth
+from bmp.bmp import BmpPacket, PeerType
+from bmp.cache import CACHE_SUFFIX, Cache, CachedCapture
+from bmp.filters import PacketFilter
+from bmp.ingest import open_capture
+
+PORT = 12345
+
+
+def summary(packet: BmpPacket) -> tuple:
+    return packet.capture_sequence, packet.frame, packet.type, packet.peer_ip, list(packet.nlri or ()), \
+        packet.flow.stream
+
+
+class Caching(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.pcap")
+        self.cache = Cache(os.path.join(self.directory, "cache"))
+        self.write(routes=4)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def write(self, routes: int) -> None:
+        synth.write_pcap(self.path, synth.SynthConfig(peers={PeerType.GlobalInstance: 1},
+                                                      prefixes={synth.AFI_IPV4: routes}, stats_interval=0), PORT)
+
+    def read(self, **kwargs) -> tuple[list[tuple], bool]:
+        capture = open_capture("native", self.path, PORT, cache=self.cache, **kwargs)
+        return [summary(packet) for packet in capture], capture.hit is not None
+
+    def entries(self) -> list[str]:
+        return sorted(name for name in os.listdir(self.cache.directory) if name.endswith(CACHE_SUFFIX))
+
+    def test_hit(self):
+        decoded, hit = self.read()
+        self.assertEqual((len(decoded), hit), (10, False))
+        self.assertEqual(self.read(), (decoded, True))
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_modified_capture(self):
+        self.read()
+        stale = self.entries()
+        self.write(routes=5)
+        decoded, hit = self.read()
+        self.assertEqual((len(decoded), hit), (11, False))
+        # the entry of the previous content is replaced
+        self.assertEqual(len(self.entries()), 1)
+        self.assertNotEqual(self.entries(), stale)
+        self.assertEqual(self.read(), (decoded, True))
+
+    def test_signature(self):
+        self.read()
+        decoded, hit = self.read(packet_filter=PacketFilter(message_types=["PeerUp"]))
+        self.assertEqual(([packet[0] for packet in decoded], hit), ([1], False))
+        # entries of other filters are kept
+        self.assertEqual(len(self.entries()), 2)
+        self.assertTrue(self.read()[1])
+
+    def test_filter_signature(self):
+        # a backend whose signature does not cover the filter, like the tshark ones for the prefixes and time window
+        filters = [PacketFilter(), PacketFilter(peer_ips=["10.0.0.2"]),
+                   PacketFilter(peer_rds=["00:00:fd:e8:00:00:00:02"]), PacketFilter(peer_types=["GlobalInstance"]),
+                   PacketFilter(message_types=["PeerUp"]), PacketFilter(start=0), PacketFilter(end=0),
+                   PacketFilter(prefixes=["10.0.0.0/8"])]
+        keys = {CachedCapture(SimpleNamespace(path=self.path, packet_filter=packet_filter, flows=None,
+                                              signature=lambda: {"backend": "stub"}), self.cache).key
+                for packet_filter in filters}
+        self.assertEqual(len(keys), len(filters))
+
+    def test_size_limit(self):
+        self.cache.max_size = 100
+        self.assertEqual(len(self.read()[0]), 10)
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+    def test_evict(self):
+        self.read()
+        self.read(packet_filter=PacketFilter(message_types=["PeerUp"]))
+        oldest, newest = (os.path.join(self.cache.directory, name) for name in self.entries())
+        os.utime(oldest, (0, 0))
+        self.cache.max_size = os.path.getsize(newest)
+        self.cache.evict()
+        self.assertEqual(self.entries(), [os.path.basename(newest)])
+
+if __name__ == '__main__':
+    unittest.main()
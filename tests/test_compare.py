@@ -0,0 +1,125 @@
+import io
+import socket
+import struct
+import unittest
+from contextlib import redirect_stderr
+from unittest import mock
+
+from bmp import ingest, synth
+from bmp.bmp import AFI_IPV4, BmpPacket, MonitoringType, PeerType
+from bmp.compare import Comparison, RibDigest, main, read_ribs
+from bmp.decoder import decode_bmp
+from tests.messages import packets, peer, prefix, raw_update, route_monitoring
+
+RD = "00:00:00:00:00:00:00:00"
+# routes in 16 /8 blocks of 16 /16 blocks
+ROUTES = tuple(f"{10 + i}.{j}.0.0/24" for i in range(16) for j in range(16))
+
+
+class Compare(unittest.TestCase):
+
+    @staticmethod
+    def digest(*messages: bytes, ignored: tuple[str, ...] = ()) -> RibDigest:
+        return RibDigest(read_ribs(packets(*messages)), ignored)
+
+    def test_community_difference(self):
+        a = self.digest(route_monitoring(("10.1.0.0/24", "10.2.0.0/24"), communities=("65000:1", "65000:2")))
+        b = self.digest(route_monitoring(("10.1.0.0/24", "10.2.0.0/24"), communities=("65000:1", "65000:3")))
+        self.assertNotEqual(a.digest, b.digest)
+        differences = list(Comparison(a, b))
+        self.assertEqual([difference.route[:2] for difference in differences],
+                         [(0x0A010000, 24), (0x0A020000, 24)])
+        self.assertEqual(differences[0].a["community"], ("65000:1", "65000:2"))
+        self.assertEqual(differences[0].b["community"], ("65000:1", "65000:3"))
+
+    def test_community_order(self):
+        a = self.digest(route_monitoring(("10.1.0.0/24",), communities=("65000:1", "65000:2")))
+        b = self.digest(route_monitoring(("10.1.0.0/24",), communities=("65000:2", "65000:1")))
+        self.assertEqual(len(list(Comparison(a, b))), 1)
+
+    def test_same_routes(self):
+        a = self.digest(route_monitoring(("10.1.0.0/24",), communities=("65000:1",)),
+                        route_monitoring(("10.2.0.0/24",)))
+        b = self.digest(route_monitoring(("10.2.0.0/24",)),
+                        route_monitoring(("10.1.0.0/24",), communities=("65000:1",)))
+        self.assertEqual(a.digest, b.digest)
+        self.assertEqual(list(Comparison(a, b)), [])
+
+    def test_attribute_framing(self):
+        path = struct.pack("!BBII", 2, 2, 65001, 64512)
+        a = route_monitoring(("10.1.0.0/24",), as_path=(65001, 64512), communities=("65000:1",))
+
+        # the same route, its attributes in another order, the AS_PATH with an extended length and an
+        # MP_UNREACH_NLRI in the same UPDATE
+        def b(monitored=None) -> bytes:
+            community = struct.pack("!HH", 65000, 1)
+            attributes = synth._attribute(synth.ATTR_OPTIONAL | synth.ATTR_TRANSITIVE, 8, community) + \
+                synth._attribute(synth.ATTR_TRANSITIVE, 3, socket.inet_aton("10.0.0.2")) + \
+                struct.pack("!BBH", synth.ATTR_TRANSITIVE | synth.ATTR_EXTENDED_LENGTH, 2, len(path)) + path + \
+                synth._attribute(synth.ATTR_TRANSITIVE, 1, b"\x00") + \
+                synth._attribute(synth.ATTR_OPTIONAL, 15, struct.pack("!HB", 2, 1) + prefix("2001:db8::/32"))
+            return raw_update(path_attributes=attributes, nlri=prefix("10.1.0.0/24"), monitored=monitored)
+
+        self.assertEqual(self.digest(a).digest, self.digest(b()).digest)
+        self.assertEqual(list(Comparison(self.digest(a), self.digest(b()))), [])
+        # one attribute set for both peers
+        ribs = read_ribs(packets(a, b(peer("10.0.0.3"))))
+        self.assertEqual(len(ribs.attributes), 1)
+        self.assertEqual(ribs.attributes.get(0), {"origin": ("0",), "as_path": ("65001 64512",),
+                                                  "next_hop": ("10.0.0.2",), "community": ("65000:1",)})
+
+    def test_interned_sets(self):
+        ribs = read_ribs(packets(route_monitoring(("10.1.0.0/24",), communities=("65000:1", "65000:2")),
+                                 route_monitoring(("10.2.0.0/24",), communities=("65000:1", "65000:3"))))
+        self.assertEqual(len(ribs.attributes), 2)
+
+    def test_only_in_one(self):
+        a = self.digest(route_monitoring(("10.1.0.0/24", "10.2.0.0/24")), route_monitoring(withdrawn=("10.2.0.0/24",)),
+                        route_monitoring(("10.2.0.0/24",), monitored=peer("10.0.0.3")))
+        b = self.digest(route_monitoring(("10.1.0.0/24", "10.3.0.0/24")))
+        differences = list(Comparison(a, b))
+        self.assertEqual([(difference.peer, difference.monitoring_type, difference.afi, difference.route,
+                           difference.a is None, difference.b is None) for difference in differences],
+                         [((PeerType.GlobalInstance.value, "10.0.0.2", RD), MonitoringType.AdjInPre, AFI_IPV4,
+                           (0x0A030000, 24, 0, ""), True, False),
+                          ((PeerType.GlobalInstance.value, "10.0.0.3", RD), MonitoringType.AdjInPre, AFI_IPV4,
+                           (0x0A020000, 24, 0, ""), False, True)])
+        self.assertEqual(str(differences[0]), f"only in b: 10.0.0.2 (GlobalInstance, rd={RD}) AdjInPre: 10.3.0.0/24 "
+                                              "path_id=0 rd=None")
+
+    def test_ignored_attribute(self):
+        a = route_monitoring(("10.1.0.0/24",), next_hop="10.0.0.2")
+        b = route_monitoring(("10.1.0.0/24",), next_hop="10.0.0.4")
+        self.assertEqual(len(list(Comparison(self.digest(a), self.digest(b)))), 1)
+        self.assertEqual(self.digest(a, ignored=("next_hop",)).digest, self.digest(b, ignored=("next_hop",)).digest)
+
+    def test_visited(self):
+        a = self.digest(route_monitoring(ROUTES))
+        b = self.digest(route_monitoring(ROUTES[:100]), route_monitoring((ROUTES[100],), communities=("65000:1",)),
+                        route_monitoring(ROUTES[101:]))
+        comparison = Comparison(a, b)
+        self.assertEqual([difference.route[:2] for difference in comparison], [(0x10040000, 24)])
+        # root, peer, monitoring type, afi, the 16 /8 blocks, the 16 /16 blocks of the route's /8 and the route
+        self.assertEqual(comparison.visited, 4 + 16 + 16 + 1)
+        self.assertEqual(a.route_count, 256)
+
+
+class Cli(unittest.TestCase):
+
+    def test_loc_rib_flags(self):
+        # a Loc-RIB peer with the adj-rib-out flag in the second capture, like the tshark backends may decode it
+        layer = decode_bmp(route_monitoring(("10.1.0.0/24",), monitored=peer(peer_type=PeerType.LocRibInstance)))
+        layer.fields["peer_flags_adj_rib_out"] = ["1"]
+        captures = {"a.pcap": packets(route_monitoring(("10.1.0.0/24",))),
+                    "b.pcap": [BmpPacket(capture_sequence=2, frame=0, frame_sequence=0, frame_bmp_count=1,
+                                         packet=layer)]}
+        stderr = io.StringIO()
+        with mock.patch.object(ingest, "open_capture", side_effect=lambda _, path, **__: captures[path]), \
+                redirect_stderr(stderr), self.assertRaises(SystemExit) as exit:
+            main(["a.pcap", "b.pcap"])
+        self.assertEqual(exit.exception.code, 2)
+        self.assertIn("b.pcap: route monitoring message 2 of peer 10.0.0.2", stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
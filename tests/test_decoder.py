@@ -0,0 +1,146 @@
+import struct
+import unittest
+
+from bmp import synth
+from bmp.bmp import BgpPduType, BmpPacket, MessageType, NlriBatch, PeerType, Statistics, project_layer
+from bmp.decoder import decode_bmp
+from tests.messages import TIMESTAMP, initiation, mp_route_monitoring, packet, peer, peer_down, peer_up, \
+    raw_update, route_mirroring, route_monitoring, statistics, termination
+
+SAFI_FLOWSPEC = 133
+# flowspec NLRI of a destination prefix component, 10.1.0.0/16
+FLOWSPEC_NLRI = bytes([5, 1, 16, 10, 1])
+
+
+class Decoding(unittest.TestCase):
+
+    def assertPeer(self, decoded: BmpPacket, msg_type: MessageType) -> None:
+        self.assertEqual((decoded.type, decoded.version, decoded.peer_type, decoded.peer_ip, decoded.peer_asn,
+                          decoded.peer_bgp_id, decoded.peer_distinguisher, decoded.peer_timestamp),
+                         (msg_type, 3, PeerType.GlobalInstance.value, "10.0.0.2", 65001, "10.0.0.2",
+                          "00:00:00:00:00:00:00:00", TIMESTAMP))
+
+    def test_initiation(self):
+        layer = decode_bmp(initiation())
+        self.assertEqual(layer.fields["init_tlv_sys_descr"], ["synthetic BMP router"])
+        self.assertEqual(layer.fields["init_tlv_sys_name"], ["router0"])
+        decoded = packet(initiation())
+        self.assertEqual((decoded.type, decoded.length, decoded.peer_ip), (MessageType.Initiation, 41, None))
+
+    def test_peer_up(self):
+        decoded = packet(peer_up(vrf="blue"))
+        self.assertPeer(decoded, MessageType.PeerUp)
+        self.assertEqual(decoded.peer_up_tlv_vrf_table_name, "blue")
+        layer = decode_bmp(peer_up())
+        self.assertEqual(layer.fields["peer_up_ip_addr"], ["10.0.0.1"])
+        self.assertEqual(layer.fields["bgp_open_myas"], ["65000", "65001"])
+        self.assertEqual(layer.fields["bgp_open_identifier"], ["10.0.0.1", "10.0.0.2"])
+        self.assertNotIn("peer_up_tlv_type", layer.fields)
+
+    def test_route_monitoring(self):
+        decoded = packet(route_monitoring(("10.1.0.0/24", "10.2.0.0/23"), ("10.9.0.0/16",),
+                                          communities=("65000:1", "65000:2"), as_path=(65001, 64512)))
+        self.assertPeer(decoded, MessageType.RouteMonitoring)
+        self.assertEqual(list(decoded.nlri), [(BgpPduType.Withdraw, "10.9.0.0", 16, 0, None),
+                                              (BgpPduType.Update, "10.1.0.0", 24, 0, None),
+                                              (BgpPduType.Update, "10.2.0.0", 23, 0, None)])
+        self.assertEqual((decoded.nlri.announced_count, decoded.nlri.withdrawn_count), (2, 1))
+        self.assertEqual(decoded.get_field_values("bgp_update_path_attribute_type_code"), ["1", "2", "3", "8"])
+        self.assertEqual(decoded.bgp_update_path_attribute_as_path, "65001 64512")
+        self.assertEqual(decoded.bgp_update_path_attribute_next_hop, "10.0.0.2")
+        self.assertEqual(decoded.get_field_values("bgp_update_path_attribute_community"), ["65000:1", "65000:2"])
+
+    def test_mp_route_monitoring(self):
+        decoded = packet(mp_route_monitoring(("2001:db8:1::/48",), ("2001:db8:2::/48",)))
+        self.assertEqual(list(decoded.nlri), [(BgpPduType.Update, "2001:db8:1::", 48, 0, None),
+                                              (BgpPduType.Withdraw, "2001:db8:2::", 48, 0, None)])
+        self.assertEqual(decoded.bgp_update_path_attribute_mp_reach_nlri_next_hop, "2001:db8::2")
+        self.assertEqual(decoded.bgp_update_path_attribute_multi_exit_disc, "10")
+
+    def test_end_of_rib(self):
+        for data in (route_monitoring(), mp_route_monitoring(),
+                     raw_update(path_attributes=synth._attribute(synth.ATTR_OPTIONAL, 15,
+                                                                 struct.pack("!HB", 1, SAFI_FLOWSPEC)))):
+            decoded = packet(data)
+            self.assertEqual((len(decoded.nlri), decoded.nlri.eor), (0, True))
+        self.assertFalse(packet(route_monitoring(("10.1.0.0/24",))).nlri.eor)
+
+    def test_not_end_of_rib(self):
+        # prefixes of an AFI/SAFI the decoder does not support
+        flowspec = synth._attribute(synth.ATTR_OPTIONAL, 14, struct.pack("!HBBB", 1, SAFI_FLOWSPEC, 0, 0) +
+                                    FLOWSPEC_NLRI)
+        withdrawn = synth._attribute(synth.ATTR_OPTIONAL, 15, struct.pack("!HB", 1, SAFI_FLOWSPEC) + FLOWSPEC_NLRI)
+        # an MP_UNREACH_NLRI without prefixes next to other attributes
+        mp_eor = synth._attribute(synth.ATTR_OPTIONAL, 15, struct.pack("!HB", 2, 1))
+        for data in (raw_update(path_attributes=flowspec), raw_update(path_attributes=withdrawn),
+                     raw_update(path_attributes=synth._attribute(synth.ATTR_TRANSITIVE, 1, b"\x00") + mp_eor)):
+            decoded = packet(data)
+            self.assertEqual((len(decoded.nlri), decoded.nlri.eor), (0, False))
+
+    def test_tshark_end_of_rib(self):
+        # fields of the tshark backends, the MP_UNREACH_NLRI of an End-of-RIB then of a flowspec withdraw
+        for length, eor in (("3", True), ("8", False)):
+            batch = NlriBatch.from_fields({"bgp_update_withdrawn_routes_length": ["0"],
+                                           "bgp_update_path_attributes_length": [str(3 + int(length))],
+                                           "bgp_update_path_attribute_type_code": ["15"],
+                                           "bgp_update_path_attribute_length": [length]})
+            self.assertEqual((len(batch), batch.eor), (0, eor))
+        self.assertTrue(NlriBatch.from_fields({"bgp_update_withdrawn_routes_length": ["0"],
+                                               "bgp_update_path_attributes_length": ["0"]}).eor)
+
+    def test_statistics(self):
+        decoded = packet(statistics((Statistics.AdjInRejectedPrefixes, 3), (Statistics.AdjInRouteCount, 12),
+                                    (Statistics.AdjInRouteCountPerAfi, 2, 5)))
+        self.assertPeer(decoded, MessageType.StatisticsReport)
+        self.assertEqual(decoded.stats, ((Statistics.AdjInRejectedPrefixes, None, None, 3),
+                                         (Statistics.AdjInRouteCount, None, None, 12),
+                                         (Statistics.AdjInRouteCountPerAfi, 2, 1, 5)))
+
+    def test_peer_down(self):
+        decoded = packet(peer_down(reason=2, event=7))
+        self.assertPeer(decoded, MessageType.PeerDown)
+        layer = decode_bmp(peer_down(reason=2, event=7))
+        self.assertEqual((layer.fields["peer_down_reason"], layer.fields["peer_down_data"]), (["2"], ["7"]))
+
+    def test_termination(self):
+        layer = decode_bmp(termination(1))
+        self.assertEqual((layer.fields["type"], layer.fields["term_tlv_reason"]), (["5"], ["1"]))
+
+    def test_route_mirroring(self):
+        # the BGP UPDATE of a route monitoring message, after its common and per-peer headers
+        layer = decode_bmp(route_mirroring(route_monitoring(("10.1.0.0/24",))[48:]))
+        self.assertEqual((layer.fields["type"], layer.fields["route_mirroring_type"], layer.fields["bgp_type"]),
+                         (["6"], ["0"], ["2"]))
+        self.assertEqual(list(layer.nlri), [(BgpPduType.Update, "10.1.0.0", 24, 0, None)])
+
+    def test_rd_peer(self):
+        monitored = peer("10.0.0.3", PeerType.RDInstance, struct.pack("!HHI", 0, 65000, 1))
+        decoded = packet(route_monitoring(("10.1.0.0/24",), monitored=monitored))
+        self.assertEqual((decoded.peer_type, decoded.peer_ip, decoded.peer_distinguisher),
+                         (PeerType.RDInstance.value, "10.0.0.3", "00:00:fd:e8:00:00:00:01"))
+
+    def test_truncated(self):
+        data = route_monitoring(("10.1.0.0/24",))
+        layer = decode_bmp(data[:60])
+        self.assertIn("malformed", layer.fields)
+        self.assertEqual(layer.fields["peer_ip_addr"], ["10.0.0.2"])
+
+
+class LazyDecoding(unittest.TestCase):
+
+    def setUp(self) -> None:
+        data = route_monitoring(("10.1.0.0/24",), communities=("65000:1",))
+        self.packet = BmpPacket(capture_sequence=0, frame=0, frame_sequence=0, frame_bmp_count=1,
+                                values=project_layer(decode_bmp(data, bgp=False), bgp=False), data=data)
+
+    def test_other_fields(self):
+        self.assertIsNone(self.packet.peer_up_tlv_vrf_table_name)
+        self.assertIsNone(self.packet._fields)
+
+    def test_bgp_fields(self):
+        self.assertEqual(self.packet.bgp_update_path_attribute_community, "65000:1")
+        self.assertEqual(self.packet.nlri.prefix(0), "10.1.0.0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from bmp import ingest, synth, tshark
+from bmp.bmp import MessageType, PeerType
+from bmp.decoder import decode_bmp
+from bmp.filters import PacketFilter, parse_time
+from bmp.pcap import iter_bmp_messages
+from tests.messages import TIMESTAMP, initiation, packet, peer, route_monitoring, statistics
+
+PORT = 12345
+RD = "00:00:fd:e8:00:00:00:02"
+
+
+class Headers(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.other = peer("10.0.0.3", PeerType.RDInstance, bytes.fromhex(RD.replace(":", "")))
+
+    def test_message_types(self):
+        packet_filter = PacketFilter(message_types=["RouteMonitoring", "Initiation"])
+        self.assertEqual([packet_filter.accepts_header(data) for data in (initiation(), route_monitoring(),
+                                                                          statistics())], [True, True, False])
+
+    def test_peers(self):
+        packet_filter = PacketFilter(peer_ips=["10.0.0.3"])
+        self.assertEqual([packet_filter.accepts_header(data) for data in (
+            initiation(), route_monitoring(), route_monitoring(monitored=self.other))], [False, False, True])
+        self.assertTrue(PacketFilter(peer_rds=[RD]).accepts_header(statistics(monitored=self.other)))
+        self.assertFalse(PacketFilter(peer_types=["GlobalInstance"]).accepts_header(statistics(monitored=self.other)))
+        self.assertFalse(packet_filter.accepts_header(route_monitoring()[:20]))
+
+    def test_time(self):
+        packet_filter = PacketFilter(start=parse_time("2023-11-14T22:13:20"), end=TIMESTAMP + 10)
+        self.assertEqual(packet_filter.start, TIMESTAMP)
+        self.assertEqual([packet_filter.accepts_time(time) for time in (TIMESTAMP - 1, TIMESTAMP, TIMESTAMP + 10,
+                                                                        TIMESTAMP + 11, None)],
+                         [False, True, True, False, True])
+
+    def test_routes(self):
+        packet_filter = PacketFilter(prefixes=["10.1.0.0/16", "2001:db8::/32"])
+        self.assertTrue(packet_filter.accepts_routes(packet(route_monitoring(("10.9.0.0/16", "10.1.2.0/24")))))
+        self.assertTrue(packet_filter.accepts_routes(packet(route_monitoring(withdrawn=("10.1.0.0/16",)))))
+        self.assertFalse(packet_filter.accepts_routes(packet(route_monitoring(("10.0.0.0/8",)))))
+        self.assertFalse(packet_filter.accepts_routes(packet(route_monitoring())))
+        self.assertTrue(packet_filter.accepts_routes(packet(statistics())))
+
+    def test_dict(self):
+        packet_filter = PacketFilter(peer_ips=["10.0.0.3"], start=0.0, prefixes=["10.1.0.0/16"])
+        self.assertEqual(packet_filter.to_dict(), {"peer_ips": ["10.0.0.3"], "start": 0.0, "prefixes": ["10.1.0.0/16"]})
+        self.assertEqual(PacketFilter.from_dict(packet_filter.to_dict()), packet_filter)
+        self.assertFalse(PacketFilter())
+
+    def test_display_filter(self):
+        packet_filter = PacketFilter(peer_ips=["10.0.0.3", "2001:db8::1"], message_types=["PeerUp"], end=10.0)
+        self.assertEqual(packet_filter.display_filter(),
+                         "frame.time_epoch <= 10.0 && bmp.type == 3 && "
+                         "(bmp.peer.ip.addr == 10.0.0.3 || bmp.peer.ipv6.addr == 2001:db8::1)")
+
+
+# the native backend tests the headers before decoding, messages keep their capture sequence
+class Pushdown(unittest.TestCase):
+    directory: str = None
+    path: str = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, "filters.pcap")
+        # initiation, 2 peer up, 5 route monitoring for each peer, then statistics and peer down of each, termination
+        synth.write_pcap(cls.path, synth.SynthConfig(peers={PeerType.GlobalInstance: 1, PeerType.RDInstance: 1},
+                                                     prefixes={synth.AFI_IPV4: 4}, stats_interval=0), PORT)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.directory)
+
+    def read(self, packet_filter: PacketFilter) -> tuple[list[tuple[int, MessageType]], int]:
+        with mock.patch.object(ingest, "decode_bmp", wraps=ingest.decode_bmp) as decode:
+            packets = [(packet.capture_sequence, packet.type)
+                       for packet in ingest.open_capture("native", self.path, PORT, packet_filter=packet_filter)]
+        return packets, decode.call_count
+
+    def test_unfiltered(self):
+        packets, decoded = self.read(PacketFilter())
+        self.assertEqual((len(packets), decoded), (18, 18))
+
+    def test_peer(self):
+        packets, decoded = self.read(PacketFilter(peer_rds=[RD]))
+        self.assertEqual([sequence for sequence, _ in packets], [2, 8, 9, 10, 11, 12, 15, 16])
+        self.assertEqual(decoded, 8)
+
+    def test_tshark_sequence(self):
+        packet_filter = PacketFilter(peer_rds=[RD])
+        # small segments, the display filter drops the frames with only messages of the other peer
+        path = os.path.join(self.directory, "segments.pcap")
+        synth.write_pcap(path, synth.SynthConfig(peers={PeerType.GlobalInstance: 1, PeerType.RDInstance: 1},
+                                                 prefixes={synth.AFI_IPV4: 4}, stats_interval=0, mss=100), PORT)
+        frames = dict()
+        for message in iter_bmp_messages(path, PORT):
+            frames.setdefault(message.frame, []).append(message)
+        # the frames the display filter keeps, with every message they carry
+        kept = [SimpleNamespace(number=number + 1, timestamp=messages[0].timestamp, stream=0, src="10.0.0.1",
+                                dst="192.0.2.1", sport=50000, dport=PORT,
+                                layers=[decode_bmp(message.data) for message in messages])
+                for number, messages in frames.items()
+                if any(packet_filter.accepts_header(message.data) for message in messages)]
+        with mock.patch.object(tshark, "executable", return_value="tshark"), \
+                mock.patch.object(tshark, "iter_frames", return_value=iter(kept)):
+            packets = [(packet.capture_sequence, packet.type)
+                       for packet in ingest.open_capture("tshark-ek", path, PORT, packet_filter=packet_filter)]
+        native = ingest.open_capture("native", path, PORT, packet_filter=packet_filter)
+        self.assertEqual(packets, [(packet.capture_sequence, packet.type) for packet in native])
+
+    def test_message_type_and_prefix(self):
+        packets, decoded = self.read(PacketFilter(message_types=["RouteMonitoring"], prefixes=["11.0.1.0/24"]))
+        self.assertEqual(packets, [(4, MessageType.RouteMonitoring), (9, MessageType.RouteMonitoring)])
+        # every route monitoring message is decoded, the prefixes are tested on the decoded NLRI
+        self.assertEqual(decoded, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from bmp import synth
+from bmp.pcap import LINKTYPE_ETHERNET, MAX_PENDING_SEGMENTS, TCP_ACK, TCP_FIN, TCP_SYN, TcpReassembly, TcpSegment, \
+    TcpStream, iter_bmp_messages, parse_tcp
+from tests.messages import initiation, peer_down, route_monitoring, termination
+
+PORT = 12345
+ROUTER, COLLECTOR = b"\x0a\x00\x00\x01", b"\xc0\x00\x02\x01"
+PSH_ACK = 0x18
+
+
+def segment(seq: int, payload: bytes = b"", flags: int = PSH_ACK) -> TcpSegment:
+    return TcpSegment(src=ROUTER, dst=COLLECTOR, sport=50000, dport=PORT, seq=seq, flags=flags,
+                      payload=memoryview(payload))
+
+
+# capture of (seq, flags, payload) segments sent by the router, one frame each
+def write_pcap(path: str, segments: list[tuple[int, int, bytes]]) -> None:
+    with open(path, "wb") as file:
+        file.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+        for index, (seq, flags, payload) in enumerate(segments):
+            synth._frame(file, 1700000000.0 + index, ROUTER, COLLECTOR, 50000, PORT, seq, flags, payload)
+
+
+class Segments(unittest.TestCase):
+
+    def test_parse_tcp(self):
+        file = io.BytesIO()
+        synth._frame(file, 1700000000.0, ROUTER, COLLECTOR, 50000, PORT, 1000, TCP_FIN | TCP_ACK, b"payload")
+        parsed = parse_tcp(LINKTYPE_ETHERNET, memoryview(file.getvalue()[16:]))
+        self.assertEqual((parsed.src, parsed.dst, parsed.sport, parsed.dport, parsed.seq, parsed.flags),
+                         (ROUTER, COLLECTOR, 50000, PORT, 1000, TCP_FIN | TCP_ACK))
+        self.assertEqual(bytes(parsed.payload), b"payload")
+
+    def test_not_tcp(self):
+        self.assertIsNone(parse_tcp(LINKTYPE_ETHERNET, memoryview(b"\x00" * 12 + b"\x08\x06" + b"\x00" * 28)))
+
+
+class Reassembly(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.stream = TcpStream()
+        self.first, self.second = initiation(), route_monitoring(("10.1.0.0/24",))
+        self.data = self.first + self.second
+        self.assertEqual(self.stream.feed(segment(999, flags=TCP_SYN)), [])
+
+    def test_in_order(self):
+        self.assertEqual(self.stream.feed(segment(1000, self.data[:30])), [])
+        self.assertEqual(self.stream.feed(segment(1030, self.data[30:])), [self.first, self.second])
+        self.assertEqual((self.stream.buffer, self.stream.next_seq), (bytearray(), 1000 + len(self.data)))
+
+    def test_gap(self):
+        self.assertEqual(self.stream.feed(segment(1050, self.data[50:])), [])
+        self.assertEqual(list(self.stream.pending), [1050])
+        self.assertEqual(self.stream.feed(segment(1000, self.data[:50])), [self.first, self.second])
+        self.assertEqual(self.stream.pending, dict())
+
+    def test_retransmission(self):
+        self.assertEqual(self.stream.feed(segment(1000, self.data[:30])), [])
+        self.assertEqual(self.stream.feed(segment(1000, self.data[:30])), [])
+        # overlaps the bytes already received, only the last 10 are new
+        self.assertEqual(self.stream.feed(segment(1020, self.data[20:50])), [self.first])
+        self.assertEqual(self.stream.feed(segment(1050, self.data[50:])), [self.second])
+        self.assertEqual(self.stream.feed(segment(1000, self.data)), [])
+
+    def test_sequence_wrap(self):
+        stream = TcpStream()
+        stream.feed(segment(0xFFFFFFF0 - 1, flags=TCP_SYN))
+        self.assertEqual(stream.feed(segment(0xFFFFFFF0, self.data[:41])), [self.first])
+        self.assertEqual(stream.feed(segment(0x19, self.data[41:])), [self.second])
+
+    def test_mid_stream(self):
+        # the capture starts inside a message, resync on the next header
+        stream = TcpStream()
+        self.assertEqual(stream.feed(segment(5000, self.data[10:])), [self.second])
+
+    def test_lost_segment(self):
+        data = b"".join(peer_down(event=n) for n in range(MAX_PENDING_SEGMENTS + 2))
+        size = len(peer_down())
+        messages = [self.stream.feed(segment(1000 + n * size, data[n * size:(n + 1) * size]))
+                    for n in range(1, MAX_PENDING_SEGMENTS + 2)]
+        self.assertEqual(messages[:-1], [[]] * MAX_PENDING_SEGMENTS)
+        self.assertEqual(len(messages[-1]), MAX_PENDING_SEGMENTS + 1)
+        self.assertEqual(messages[-1][0], peer_down(event=1))
+
+
+class Messages(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "capture.pcap")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_frames(self):
+        data = initiation() + route_monitoring(("10.1.0.0/24",)) + termination()
+        write_pcap(self.path, [(999, TCP_SYN, b""), (1060, PSH_ACK, data[60:]), (1000, PSH_ACK, data[:60]),
+                               (1000, PSH_ACK, data[:60]), (1000 + len(data), TCP_FIN | TCP_ACK, b"")])
+        reassembly = TcpReassembly()
+        messages = list(iter_bmp_messages(self.path, PORT, reassembly))
+        self.assertEqual([(message.frame, message.stream, message.data) for message in messages],
+                         [(2, 0, initiation()), (2, 0, route_monitoring(("10.1.0.0/24",))), (2, 0, termination())])
+        self.assertEqual(messages[0].session, ("10.0.0.1", "192.0.2.1", 50000, PORT))
+        self.assertEqual(reassembly.streams, dict())
+
+    def test_carried_over(self):
+        data = initiation() + termination()
+        write_pcap(self.path, [(999, TCP_SYN, b""), (1000, PSH_ACK, data[:50])])
+        reassembly = TcpReassembly()
+        self.assertEqual([message.data for message in iter_bmp_messages(self.path, PORT, reassembly)], [initiation()])
+        self.assertEqual(reassembly.pending_bytes, 9)
+        write_pcap(self.path, [(1050, PSH_ACK, data[50:])])
+        self.assertEqual([message.data for message in iter_bmp_messages(self.path, PORT, reassembly)], [termination()])
+        self.assertEqual(reassembly.pending_bytes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
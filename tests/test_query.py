@@ -0,0 +1,103 @@
+import io
+import unittest
+from contextlib import redirect_stderr
+from unittest import mock
+
+from bmp import ingest
+from bmp.bmp import BmpPacket, MonitoringType, PeerType
+from bmp.decoder import decode_bmp
+from bmp.query import PrefixTrie, RouteIndex, main, read_history
+from tests.messages import mp_route_monitoring, packets, peer, route_monitoring
+
+
+def value(address: str) -> int:
+    return int.from_bytes(bytes(map(int, address.split("."))), "big")
+
+
+class Trie(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.trie = PrefixTrie(32)
+        for number, (address, length) in enumerate((("10.0.0.0", 8), ("10.1.0.0", 16), ("10.1.2.0", 24),
+                                                    ("10.1.3.0", 24), ("192.0.2.0", 24), ("0.0.0.0", 0))):
+            self.trie.insert(value(address), length, number)
+
+    def match(self, address: str, length: int = None) -> list[int]:
+        node = self.trie.longest_match(value(address), length)
+        return node.values if node is not None else None
+
+    def test_longest_match(self):
+        self.assertEqual(len(self.trie), 6)
+        self.assertEqual(self.match("10.1.2.7"), [2])
+        self.assertEqual(self.match("10.1.3.255"), [3])
+        self.assertEqual(self.match("10.1.4.1"), [1])
+        self.assertEqual(self.match("10.2.0.1"), [0])
+        self.assertEqual(self.match("11.0.0.1"), [5])
+        self.assertEqual(self.match("10.1.2.0", 23), [1])
+
+    def test_no_match(self):
+        trie = PrefixTrie(32)
+        trie.insert(value("10.1.2.0"), 24, 0)
+        self.assertIsNone(trie.longest_match(value("10.1.3.0")))
+        self.assertIsNone(trie.longest_match(value("10.1.2.0"), 16))
+
+    def test_same_prefix(self):
+        self.trie.insert(value("10.1.0.0"), 16, 6)
+        self.assertEqual(self.match("10.1.9.9"), [1, 6])
+        self.assertEqual(len(self.trie), 7)
+
+    def test_covering(self):
+        self.assertEqual([node.values for node in self.trie.covering(value("10.1.2.128"), 25)], [[5], [0], [1], [2]])
+
+    def test_covered(self):
+        self.assertEqual([node.values for node in self.trie.covered(value("10.1.0.0"), 16)], [[1], [2], [3]])
+        self.assertEqual([node.values for node in self.trie.covered(value("10.1.2.0"), 23)], [[2], [3]])
+        self.assertEqual(self.trie.covered(value("172.16.0.0"), 12), [])
+
+
+class Index(unittest.TestCase):
+
+    def setUp(self) -> None:
+        other = peer("10.0.0.3")
+        history, registry = read_history(packets(
+            route_monitoring(("10.0.0.0/8", "10.1.0.0/16")),
+            route_monitoring(("10.1.0.0/16",), monitored=other),
+            mp_route_monitoring(("2001:db8::/32", "2001:db8:1::/48")),
+            route_monitoring(withdrawn=("10.1.0.0/16",))))
+        self.index, self.at = RouteIndex(history, registry), RouteIndex(history, registry, 1)
+
+    def lookup(self, index: RouteIndex, address: str, **kwargs) -> list[tuple[str, str, int]]:
+        return [(route.peer_id.peer_ip, route.prefix, route.prefix_len)
+                for route in index.longest_match(address, **kwargs)]
+
+    def test_longest_match(self):
+        self.assertEqual(self.index.route_count, 4)
+        self.assertEqual(self.lookup(self.index, "10.1.2.3"),
+                         [("10.0.0.2", "10.0.0.0", 8), ("10.0.0.3", "10.1.0.0", 16)])
+        self.assertEqual(self.lookup(self.index, "10.1.2.3", peer_ip="10.0.0.3"), [("10.0.0.3", "10.1.0.0", 16)])
+        self.assertEqual(self.lookup(self.index, "2001:db8:1::1"), [("10.0.0.2", "2001:db8:1::", 48)])
+        self.assertEqual(self.lookup(self.index, "10.1.2.3", mon_type=MonitoringType.AdjInPost), [])
+
+    def test_at_sequence(self):
+        self.assertEqual(self.at.route_count, 3)
+        self.assertEqual(self.lookup(self.at, "10.1.2.3"), [("10.0.0.2", "10.1.0.0", 16), ("10.0.0.3", "10.1.0.0", 16)])
+        self.assertEqual(self.lookup(self.at, "2001:db8:1::1"), [])
+
+
+class Cli(unittest.TestCase):
+
+    def test_loc_rib_flags(self):
+        # a Loc-RIB peer with the post-policy flag, like the tshark backends may decode it
+        layer = decode_bmp(route_monitoring(("10.1.0.0/24",), monitored=peer(peer_type=PeerType.LocRibInstance)))
+        layer.fields["peer_flags_post_policy"] = ["1"]
+        capture = [BmpPacket(capture_sequence=3, frame=0, frame_sequence=0, frame_bmp_count=1, packet=layer)]
+        stderr = io.StringIO()
+        with mock.patch.object(ingest, "open_capture", return_value=capture), redirect_stderr(stderr), \
+                self.assertRaises(SystemExit) as exit:
+            main(["capture.pcap", "lookup", "10.1.0.1"])
+        self.assertEqual(exit.exception.code, 2)
+        self.assertIn("capture.pcap: route monitoring message 3 of peer 10.0.0.2", stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import struct
+import unittest
+
+from bmp import synth
+from bmp.bmp import BgpPduType
+from bmp.events import RouteHistory
+from bmp.rib import ANNOUNCED, NO_ATTRIBUTES, PAGE_SIZE, WITHDRAWN, AttributeSets, PrefixNumbers, PrefixTable, Rib, \
+    RouteCounter, path_attributes
+from tests.messages import packet, raw_update, route_monitoring
+from tests.test_decoder import FLOWSPEC_NLRI, SAFI_FLOWSPEC
+
+
+def apply(rib: Rib, **kwargs) -> None:
+    update = packet(route_monitoring(**kwargs))
+    rib.apply(update.nlri, path_attributes(update))
+
+
+class Ribs(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.prefixes = PrefixTable()
+        self.attributes = AttributeSets()
+        self.a = Rib(self.prefixes, self.attributes)
+        self.b = Rib(self.prefixes, self.attributes)
+
+    def test_rows(self):
+        apply(self.a, announced=("10.1.0.0/24", "10.2.0.0/24"))
+        apply(self.b, announced=("10.3.0.0/24", "10.1.0.0/24"), communities=("65000:1",))
+        apply(self.a, withdrawn=("10.1.0.0/24", "10.4.0.0/24"))
+        self.assertEqual(list(self.a.rows()), [(0, WITHDRAWN, 1, 1, 0, NO_ATTRIBUTES), (1, ANNOUNCED, 1, 0, 0, 0),
+                                               (3, WITHDRAWN, 0, 1, 1, NO_ATTRIBUTES)])
+        self.assertEqual(list(self.b.rows()), [(0, ANNOUNCED, 1, 0, 0, 1), (2, ANNOUNCED, 1, 0, 0, 1)])
+        self.assertEqual((self.a.seen_count, self.a.route_count), (3, 1))
+        self.assertEqual(list(self.a.routes()), [1])
+        self.assertEqual(list(self.b.seen()), [0, 2])
+        self.assertEqual(len(self.attributes), 2)
+
+    def test_sparse_pages(self):
+        apply(self.a, announced=tuple(f"10.{n >> 8}.{n & 0xFF}.0/24" for n in range(PAGE_SIZE + 1)))
+        apply(self.b, announced=(f"10.{PAGE_SIZE >> 8}.{PAGE_SIZE & 0xFF}.0/24",))
+        self.assertEqual([page is not None for page in self.b.pages], [False, True])
+        self.assertEqual(len(self.b.last), 1)
+        self.assertEqual(list(self.b.routes()), [PAGE_SIZE])
+        self.assertEqual(self.a.route_count, PAGE_SIZE + 1)
+
+    def test_end_of_rib(self):
+        self.assertIsNone(self.a.apply(packet(route_monitoring()).nlri, None))
+        self.assertEqual((self.a.eor_count, self.a.unsupported_count, self.a.pages), (1, 0, []))
+
+    def test_unsupported(self):
+        flowspec = packet(raw_update(path_attributes=synth._attribute(
+            synth.ATTR_OPTIONAL, 14, struct.pack("!HBBB", 1, SAFI_FLOWSPEC, 0, 0) + FLOWSPEC_NLRI)))
+        self.assertIsNone(self.a.apply(flowspec.nlri, path_attributes(flowspec)))
+        self.assertEqual((self.a.eor_count, self.a.unsupported_count), (0, 1))
+        history = RouteHistory(self.prefixes)
+        history.add(flowspec, 0)
+        history.add(packet(route_monitoring()), 0)
+        self.assertEqual(list(history.log.pdu_types), [BgpPduType.EoR.value])
+
+
+class RouteCounters(unittest.TestCase):
+
+    def test_counts(self):
+        prefixes = PrefixNumbers()
+        a, b = RouteCounter(prefixes), RouteCounter(prefixes)
+        a.apply(packet(route_monitoring(("10.1.0.0/24", "10.2.0.0/24", "10.1.0.0/24"))).nlri)
+        b.apply(packet(route_monitoring(("10.2.0.0/24", "10.3.0.0/24"))).nlri)
+        a.apply(packet(route_monitoring(withdrawn=("10.2.0.0/24", "10.3.0.0/24"))).nlri)
+        a.apply(packet(route_monitoring()).nlri)
+        b.apply(packet(raw_update(path_attributes=synth._attribute(
+            synth.ATTR_OPTIONAL, 15, struct.pack("!HB", 1, SAFI_FLOWSPEC) + FLOWSPEC_NLRI))).nlri)
+        self.assertEqual((a.route_count, a.eor_count, b.route_count, b.eor_count, b.unsupported_count),
+                         (1, 1, 2, 0, 1))
+        self.assertEqual((bytes(a.announced), bytes(b.announced), len(prefixes)), (b"\x01", b"\x06", 3))
+        self.assertFalse(hasattr(prefixes, "lengths"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from bmp import sessions, synth
+from bmp.bmp import PeerType
+from bmp.checks import IndicesCheck, PeerUpCheck
+from bmp.filters import PacketFilter
+
+PORT = 12345
+
+
+class Sessions(unittest.TestCase):
+    directory: str = None
+    path: str = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, "sessions.pcap")
+        synth.write_pcap(cls.path, synth.SynthConfig(routers=2, peers={PeerType.GlobalInstance: 1},
+                                                     prefixes={synth.AFI_IPV4: 20}, stats_interval=0), PORT)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.directory)
+
+    def test_spooled_rows(self):
+        spool = tempfile.mkdtemp(dir=self.directory)
+        shards = sessions.shard(self.path, PORT, spool)
+        self.assertEqual([session.count for session in shards], [26, 26])
+        rows = [row for session in shards for row in sessions.read_rows(session)]
+        self.assertEqual(sorted(row[0] for row in rows), list(range(52)))
+        self.assertEqual(rows[0][5][:6], b"\x03\x00\x00\x00\x29\x04")
+
+    def test_results(self):
+        checks = [IndicesCheck(output=io.StringIO()), PeerUpCheck(output=io.StringIO())]
+        results = sessions.run_sessions(self.path, PORT, checks)
+        self.assertEqual([(result.count, result.peer_count) for result in results], [(26, 1), (26, 1)])
+        self.assertEqual(str(results[0]), f"stream 0 10.0.0.1:50000 -> {synth.COLLECTOR_ADDRESS}:{PORT}")
+        self.assertEqual([check.passed for check in checks], [True, True])
+
+    def test_filtered_session(self):
+        packet_filter = PacketFilter(message_types=["RouteMonitoring"], prefixes=["192.0.2.0/24"])
+        results = sessions.run_sessions(self.path, PORT, [IndicesCheck(output=io.StringIO())],
+                                        packet_filter=packet_filter)
+        self.assertEqual([(result.flow, result.count, str(result)) for result in results],
+                         [(None, 0, "stream 0"), (None, 0, "stream 1")])
+
+
+if __name__ == '__main__':
+    unittest.main()
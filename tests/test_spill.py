@@ -0,0 +1,68 @@
+import unittest
+from array import array
+from unittest import mock
+
+import numpy as np
+
+from bmp import spill
+from bmp.bmp import BgpPduType
+from bmp.events import RouteEventLog
+from bmp.rib import ANNOUNCED, NO_ATTRIBUTES, WITHDRAWN, AttributeSets, PrefixTable, Rib, path_attributes
+from bmp.spill import SpillStore
+from tests.messages import packet, route_monitoring
+
+
+class SpilledEvents(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.store = SpillStore(budget=1 << 16)
+
+    def tearDown(self) -> None:
+        self.store.close()
+
+    @staticmethod
+    def fill(log: RouteEventLog) -> None:
+        for sequence in range(100):
+            if sequence % 10 == 9:
+                log.record_eor(sequence, None, sequence % 3, 0)
+            else:
+                log.record(sequence, 1700000000.0 + sequence, sequence % 3, 1, array("i", (sequence, sequence + 1)),
+                           array("b", (BgpPduType.Update.value, BgpPduType.Withdraw.value)))
+
+    def test_batches(self):
+        memory, spilled = RouteEventLog(), self.store.event_log()
+        with mock.patch.object(spill, "EVENT_BATCH", 16):
+            self.fill(memory)
+            self.fill(spilled)
+        self.assertEqual(len(spilled), 190)
+        self.assertLess(len(spilled.sequences), 16)
+        self.assertEqual(spilled.writes, 11)
+        for expected, column in zip(memory.arrays(), spilled.arrays()):
+            self.assertEqual(expected.dtype, column.dtype)
+            np.testing.assert_array_equal(expected, column)
+
+    def test_empty(self):
+        self.assertEqual([len(column) for column in self.store.event_log().arrays()], [0] * 6)
+
+
+class SpilledRibs(unittest.TestCase):
+
+    def test_repeated_prefixes(self):
+        store = SpillStore(budget=1 << 16)
+        memory = Rib(PrefixTable(), AttributeSets())
+        spilled = store.rib(store.prefix_table(), AttributeSets())
+        # prefixes new to the table, withdrawn and announced again or listed twice in the same UPDATE
+        for update in (packet(route_monitoring(("10.1.0.0/24", "10.2.0.0/24", "10.2.0.0/24"), ("10.1.0.0/24",))),
+                       packet(route_monitoring(("10.3.0.0/24",), ("10.3.0.0/24", "10.2.0.0/24")))):
+            for rib in (memory, spilled):
+                rib.apply(update.nlri, path_attributes(update))
+        self.assertEqual([tuple(row) for row in spilled.rows()], list(memory.rows()))
+        self.assertEqual(list(memory.rows()), [(0, ANNOUNCED, 1, 1, 1, 0), (1, WITHDRAWN, 2, 1, 0, NO_ATTRIBUTES),
+                                               (2, ANNOUNCED, 1, 1, 1, 0)])
+        self.assertEqual((spilled.seen_count, spilled.route_count), (memory.seen_count, memory.route_count))
+        self.assertEqual((memory.seen_count, memory.route_count), (3, 2))
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()